@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 
 import math
+import os
 import sys
 import time
 from threading import Thread, Event
@@ -78,7 +79,8 @@ def sample_fps(clock, warmup_time, stats_all, stats_warmup, stats_postwarmup):
         stats_postwarmup.add_sample(fps)
 
 
-def run(module, sampling_interval, max_runtime, warmup_time, output_all, args=()):
+def run(module, sampling_interval, max_runtime, warmup_time, output_all,
+        args=(), record=None, replay=None):
     clock = pygame.time.Clock()
     stop_flag = Event()
     stats_all = Stats()
@@ -89,9 +91,17 @@ def run(module, sampling_interval, max_runtime, warmup_time, output_all, args=()
                                 stats_warmup, stats_postwarmup))
     benchmark = module.benchmark_class(*args)
     benchmark.setUp()
+    if record:
+        pygame.event.start_recording(record)
+    if replay:
+        # Replaying a recorded input trace also replays the recorded
+        # pygame.time.get_ticks() values, which gives repeatable runs
+        pygame.event.start_replay(replay)
     timer.start()
     benchmark.main(clock)
     stop_flag.set()
+    pygame.event.stop_recording()
+    pygame.event.stop_replay()
     benchmark.tearDown()
     if output_all:
         sys.stdout.write('All,%s\nWarmup,%s\nPost-warmup,%s\n' % (stats_all, stats_warmup, stats_postwarmup))
@@ -109,6 +119,8 @@ if __name__ == '__main__':
     max_runtime = DEFAULT_MAX_RUNTIME
     warmup_time = DEFAULT_WARMUP_TIME
     output_all = False
+    record = None
+    replay = None
     non_option_args = []
     i = 1  # skip script argument
     while i < len(sys.argv):
@@ -124,6 +136,15 @@ if __name__ == '__main__':
         elif arg == '-w':
             i += 1
             warmup_time = float(sys.argv[i])
+        elif arg == '--record':
+            i += 1
+            record = sys.argv[i]
+        elif arg == '--replay':
+            i += 1
+            replay = sys.argv[i]
+        elif arg == '--headless':
+            # render without a window, see pygame.display.set_mode
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
         else:
             try:
                 non_option_args.append(float(arg))
@@ -133,4 +154,4 @@ if __name__ == '__main__':
 
     module = __import__(non_option_args[0])
     run(module, sampling_interval, max_runtime, warmup_time,
-        output_all, args=non_option_args[1:])
+        output_all, args=non_option_args[1:], record=record, replay=replay)
@@ -8,8 +8,12 @@ ffi.cdef("""
 
 // functions
 
-int write_jpeg (const char *file_name, unsigned char** image_buffer,
+int write_jpeg (const char *file_name, unsigned char* pixels, int pitch,
     int image_width, int image_height, int quality, char** error);
+int write_jpeg_mem (unsigned char* pixels, int pitch, int image_width,
+    int image_height, int quality, unsigned char** data, size_t* size,
+    char** error);
+void free(void *ptr);
 
 """)
 
@@ -118,80 +122,160 @@ jpglib = ffi.set_source(
     /* End borrowed code
      */
 
-    int write_jpeg (const char *file_name, unsigned char** image_buffer,
-                int image_width, int image_height, int quality, char** error) {
+    /* Memory destination, a malloc'd buffer that doubles in size
+     * whenever it fills up.
+     */
+    typedef struct {
+        struct jpeg_destination_mgr pub; /* public fields */
 
-        struct jpeg_compress_struct cinfo;
-        struct jpeg_error_mgr jerr;
-        FILE * outfile;
-        JSAMPROW row_pointer[NUM_LINES_TO_WRITE];
-        int row_stride;
-        int num_lines_to_write;
-        int lines_written;
-        int i;
+        JOCTET *buffer;   /* start of buffer */
+        size_t allocated; /* size of buffer */
+    } j_mem_mgr;
 
-        row_stride = image_width * 3;
+    static void
+    j_mem_init_destination (j_compress_ptr cinfo)
+    {
+        j_mem_mgr *dest = (j_mem_mgr *) cinfo->dest;
 
-        num_lines_to_write = NUM_LINES_TO_WRITE;
+        dest->buffer = (JOCTET *) malloc (OUTPUT_BUF_SIZE);
+        if (dest->buffer == NULL) {
+            ERREXIT1(cinfo, JERR_OUT_OF_MEMORY, 0);
+        }
+        dest->allocated = OUTPUT_BUF_SIZE;
+        dest->pub.next_output_byte = dest->buffer;
+        dest->pub.free_in_buffer = OUTPUT_BUF_SIZE;
+    }
 
+    static boolean
+    j_mem_empty_output_buffer (j_compress_ptr cinfo)
+    {
+        j_mem_mgr *dest = (j_mem_mgr *) cinfo->dest;
+        JOCTET *buffer;
 
-        cinfo.err = jpeg_std_error (&jerr);
-        jpeg_create_compress (&cinfo);
+        /* libjpeg only calls this once the whole buffer is full */
+        buffer = (JOCTET *) realloc (dest->buffer, dest->allocated * 2);
+        if (buffer == NULL) {
+            ERREXIT1(cinfo, JERR_OUT_OF_MEMORY, 0);
+        }
+        dest->buffer = buffer;
+        dest->pub.next_output_byte = buffer + dest->allocated;
+        dest->pub.free_in_buffer = dest->allocated;
+        dest->allocated *= 2;
 
-        if ((outfile = fopen (file_name, "wb")) == NULL) {
-            *error = malloc(100);
-            snprintf(*error, 100, "SaveJPEG: could not open %s", file_name);
-            return -1;
+        return TRUE;
+    }
+
+    static void
+    j_mem_term_destination (j_compress_ptr cinfo)
+    {
+    }
+
+    static void
+    j_mem_dest (j_compress_ptr cinfo)
+    {
+        j_mem_mgr *dest;
+
+        if (cinfo->dest == NULL) {  /* first time for this JPEG object? */
+            cinfo->dest = (struct jpeg_destination_mgr *)
+                (*cinfo->mem->alloc_small) ((j_common_ptr) cinfo, JPOOL_PERMANENT,
+                                            sizeof(j_mem_mgr));
         }
-        j_stdio_dest (&cinfo, outfile);
 
-        cinfo.image_width = image_width;
-        cinfo.image_height = image_height;
-        cinfo.input_components = 3;
-        cinfo.in_color_space = JCS_RGB;
-        /* cinfo.optimize_coding = FALSE;
-         */
-        /* cinfo.optimize_coding = FALSE;
-         */
+        dest = (j_mem_mgr *) cinfo->dest;
+        dest->pub.init_destination = j_mem_init_destination;
+        dest->pub.empty_output_buffer = j_mem_empty_output_buffer;
+        dest->pub.term_destination = j_mem_term_destination;
+        dest->buffer = NULL;
+        dest->allocated = 0;
+    }
 
-        jpeg_set_defaults (&cinfo);
-        jpeg_set_quality (&cinfo, quality, TRUE);
+    /* Compress the image to the destination of cinfo. The RGB rows of
+     * the image start pitch bytes apart from pixels.
+     */
+    static void
+    jpeg_encode (j_compress_ptr cinfo, unsigned char* pixels, int pitch,
+                 int image_width, int image_height, int quality)
+    {
+        JSAMPROW row_pointer[NUM_LINES_TO_WRITE];
+        JDIMENSION num_lines_to_write;
+        JDIMENSION i;
 
-        jpeg_start_compress (&cinfo, TRUE);
+        cinfo->image_width = image_width;
+        cinfo->image_height = image_height;
+        cinfo->input_components = 3;
+        cinfo->in_color_space = JCS_RGB;
 
+        jpeg_set_defaults (cinfo);
+        jpeg_set_quality (cinfo, quality, TRUE);
 
+        jpeg_start_compress (cinfo, TRUE);
 
         /* try and write many scanlines at once.  */
-        while (cinfo.next_scanline < cinfo.image_height) {
-            if (num_lines_to_write > (cinfo.image_height - cinfo.next_scanline) -1) {
-                num_lines_to_write = (cinfo.image_height - cinfo.next_scanline);
+        while (cinfo->next_scanline < cinfo->image_height) {
+            num_lines_to_write = cinfo->image_height - cinfo->next_scanline;
+            if (num_lines_to_write > NUM_LINES_TO_WRITE) {
+                num_lines_to_write = NUM_LINES_TO_WRITE;
             }
-            /* copy the memory from the buffers */
-            for(i =0; i < num_lines_to_write; i++) {
-                row_pointer[i] = image_buffer[cinfo.next_scanline + i];
+            for (i = 0; i < num_lines_to_write; i++) {
+                row_pointer[i] = pixels +
+                    (size_t) pitch * (cinfo->next_scanline + i);
             }
+            jpeg_write_scanlines (cinfo, row_pointer, num_lines_to_write);
+        }
 
+        jpeg_finish_compress (cinfo);
+    }
 
-            /*
-            num_lines_to_write = 1;
-            row_pointer[0] = image_buffer[cinfo.next_scanline];
-               printf("num_lines_to_write:%d:   cinfo.image_height:%d:  cinfo.next_scanline:%d:\n", num_lines_to_write, cinfo.image_height, cinfo.next_scanline);
-            */
-
+    int write_jpeg (const char *file_name, unsigned char* pixels, int pitch,
+                int image_width, int image_height, int quality, char** error) {
 
-            lines_written = jpeg_write_scanlines (&cinfo, row_pointer, num_lines_to_write);
+        struct jpeg_compress_struct cinfo;
+        struct jpeg_error_mgr jerr;
+        FILE * outfile;
 
-            /*
-               printf("lines_written:%d:\n", lines_written);
-            */
+        cinfo.err = jpeg_std_error (&jerr);
+        jpeg_create_compress (&cinfo);
 
+        if ((outfile = fopen (file_name, "wb")) == NULL) {
+            jpeg_destroy_compress (&cinfo);
+            *error = malloc(100);
+            snprintf(*error, 100, "SaveJPEG: could not open %s", file_name);
+            return -1;
         }
+        j_stdio_dest (&cinfo, outfile);
+
+        jpeg_encode (&cinfo, pixels, pitch, image_width, image_height,
+                     quality);
 
-        jpeg_finish_compress (&cinfo);
         fclose (outfile);
         jpeg_destroy_compress (&cinfo);
         return 0;
     }
+
+    /* Like write_jpeg, but the JPEG is stored in *data, which is
+     * allocated with malloc, and its length in *size.
+     */
+    int write_jpeg_mem (unsigned char* pixels, int pitch, int image_width,
+                int image_height, int quality, unsigned char** data,
+                size_t* size, char** error) {
+
+        struct jpeg_compress_struct cinfo;
+        struct jpeg_error_mgr jerr;
+        j_mem_mgr *dest;
+
+        cinfo.err = jpeg_std_error (&jerr);
+        jpeg_create_compress (&cinfo);
+        j_mem_dest (&cinfo);
+
+        jpeg_encode (&cinfo, pixels, pitch, image_width, image_height,
+                     quality);
+
+        dest = (j_mem_mgr *) cinfo.dest;
+        *data = dest->buffer;
+        *size = dest->allocated - dest->pub.free_in_buffer;
+        jpeg_destroy_compress (&cinfo);
+        return 0;
+    }
     """
 )
 
@@ -0,0 +1,106 @@
+/*
+ Helpers for pygame.display
+
+ pygame_cffi - a cffi implementation of the pygame library
+
+ This library is free software; you can redistribute it and/or
+ modify it under the terms of the GNU Lesser General Public
+ License as published by the Free Software Foundation; either
+ version 2.1 of the License, or (at your option) any later version.
+
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Library General Public
+ License along with this library; if not, write to the Free
+ Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+ MA  02110-1301  USA
+*/
+
+#ifndef MIN
+#define MIN(a, b) ((a) < (b) ? (a) : (b))
+#endif
+#ifndef MAX
+#define MAX(a, b) ((a) > (b) ? (a) : (b))
+#endif
+
+/* Merge a and b if updating their union costs no more than updating
+   both, where each rect passed to SDL_UpdateRects costs rect_cost
+   pixels on top of its area. Returns 1 and stores the union in a if
+   they were merged. */
+static int
+_display_merge_rect (SDL_Rect *a, const SDL_Rect *b, long rect_cost)
+{
+    int left, top, right, bottom;
+    long area;
+
+    left = MIN (a->x, b->x);
+    top = MIN (a->y, b->y);
+    right = MAX (a->x + a->w, b->x + b->w);
+    bottom = MAX (a->y + a->h, b->y + b->h);
+    area = (long) (right - left) * (bottom - top);
+    if (area > (long) a->w * a->h + (long) b->w * b->h + rect_cost)
+        return 0;
+    a->x = left;
+    a->y = top;
+    a->w = right - left;
+    a->h = bottom - top;
+    return 1;
+}
+
+/* Crop the n rects stored as x, y, w, h in coords to a screen_w by
+   screen_h screen and store the visible ones in out, which must have
+   room for n rects. Unless rect_cost is negative, rects are then merged
+   while _display_merge_rect finds a cheaper update. Returns the number
+   of rects in out. */
+static int
+display_update_rects (const int *coords, int n, int screen_w, int screen_h,
+                      long rect_cost, SDL_Rect *out)
+{
+    int i, j, merged;
+    int x, y, right, bottom;
+    int count = 0;
+
+    for (i = 0; i < n; i++)
+    {
+        x = coords[i * 4];
+        y = coords[i * 4 + 1];
+        right = MIN (x + coords[i * 4 + 2], screen_w);
+        bottom = MIN (y + coords[i * 4 + 3], screen_h);
+        x = MAX (x, 0);
+        y = MAX (y, 0);
+        if (right <= x || bottom <= y)
+            continue;
+        out[count].x = x;
+        out[count].y = y;
+        out[count].w = right - x;
+        out[count].h = bottom - y;
+        count++;
+    }
+
+    if (rect_cost < 0)
+        return count;
+
+    /* A merged rect may now be worth merging with rects that were
+       already checked, so rescan until nothing changes */
+    do
+    {
+        merged = 0;
+        for (i = 0; i < count; i++)
+        {
+            for (j = i + 1; j < count; j++)
+            {
+                if (_display_merge_rect (&out[i], &out[j], rect_cost))
+                {
+                    out[j] = out[--count];
+                    merged = 1;
+                    j--;
+                }
+            }
+        }
+    }
+    while (merged);
+    return count;
+}
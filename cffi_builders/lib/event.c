@@ -0,0 +1,103 @@
+/*
+ Helpers for pygame.event
+
+ pygame_cffi - a cffi implementation of the pygame library
+
+ This library is free software; you can redistribute it and/or
+ modify it under the terms of the GNU Lesser General Public
+ License as published by the Free Software Foundation; either
+ version 2.1 of the License, or (at your option) any later version.
+
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Library General Public
+ License along with this library; if not, write to the Free
+ Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+ MA  02110-1301  USA
+*/
+
+static Sint16
+_event_clamp_rel (int rel)
+{
+    if (rel > 32767)
+        return 32767;
+    if (rel < -32768)
+        return -32768;
+    return (Sint16) rel;
+}
+
+/* Events posted from python carry these markers in their SDL_UserEvent
+   fields, see _USEROBJECT_CHECK1 and _USEROBJECT_CHECK2 in
+   pygame/event.py. Their attributes are kept in python, so they must
+   never be merged. */
+#define _EVENT_IS_POSTED(e) \
+    ((e)->user.code == (int) 0xDEADBEEF && \
+     (e)->user.data1 == (void *) (size_t) 0xFEEDF00D)
+
+/* Merge runs of motion events in events[0..n) in place and return the
+   new number of events. mask selects the event types to coalesce using
+   SDL_EVENTMASK bits:
+
+   - consecutive MOUSEMOTION events from the same mouse become a single
+     event with the latest position and button state and the summed
+     relative motion.
+   - within a run of consecutive JOYAXISMOTION events, later values for
+     an axis replace the earlier event for the same joystick and axis.
+
+   Events posted from python are left alone and end a run.
+*/
+static int
+event_coalesce (SDL_Event *events, int n, Uint32 mask)
+{
+    SDL_Event *ev, *prev;
+    int i, j;
+    int xrel, yrel;
+    int out = 0;
+
+    for (i = 0; i < n; i++)
+    {
+        ev = &events[i];
+        if (out > 0 && !_EVENT_IS_POSTED (ev))
+        {
+            prev = &events[out - 1];
+            if (ev->type == SDL_MOUSEMOTION &&
+                (mask & SDL_EVENTMASK (SDL_MOUSEMOTION)) &&
+                prev->type == SDL_MOUSEMOTION &&
+                !_EVENT_IS_POSTED (prev) &&
+                prev->motion.which == ev->motion.which)
+            {
+                xrel = prev->motion.xrel + ev->motion.xrel;
+                yrel = prev->motion.yrel + ev->motion.yrel;
+                prev->motion = ev->motion;
+                prev->motion.xrel = _event_clamp_rel (xrel);
+                prev->motion.yrel = _event_clamp_rel (yrel);
+                continue;
+            }
+            if (ev->type == SDL_JOYAXISMOTION &&
+                (mask & SDL_EVENTMASK (SDL_JOYAXISMOTION)))
+            {
+                for (j = out - 1;
+                     j >= 0 && events[j].type == SDL_JOYAXISMOTION &&
+                     !_EVENT_IS_POSTED (&events[j]); j--)
+                {
+                    if (events[j].jaxis.which == ev->jaxis.which &&
+                        events[j].jaxis.axis == ev->jaxis.axis)
+                        break;
+                }
+                if (j >= 0 && events[j].type == SDL_JOYAXISMOTION &&
+                    !_EVENT_IS_POSTED (&events[j]))
+                {
+                    events[j].jaxis.value = ev->jaxis.value;
+                    continue;
+                }
+            }
+        }
+        if (out != i)
+            events[out] = *ev;
+        out++;
+    }
+    return out;
+}
@@ -0,0 +1,214 @@
+/*
+ Helpers for pygame.image
+
+ pygame_cffi - a cffi implementation of the pygame library
+
+ This library is free software; you can redistribute it and/or
+ modify it under the terms of the GNU Lesser General Public
+ License as published by the Free Software Foundation; either
+ version 2.1 of the License, or (at your option) any later version.
+
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Library General Public
+ License along with this library; if not, write to the Free
+ Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+ MA  02110-1301  USA
+*/
+
+
+/* Copy h rows of row_bytes bytes from src to dst, where rows start
+   src_pitch and dst_pitch bytes apart, starting from the last source
+   row if flipped. Tightly packed, unflipped rows are copied at once. */
+static void
+image_copy_rows (const char *src, int src_pitch, char *dst, int dst_pitch,
+                 int row_bytes, int h, int flipped)
+{
+    int y;
+
+    if (h <= 0)
+        return;
+    if (!flipped && src_pitch == row_bytes && dst_pitch == row_bytes)
+    {
+        memmove (dst, src, (size_t) row_bytes * h);
+        return;
+    }
+    if (flipped)
+    {
+        src += (ptrdiff_t) src_pitch * (h - 1);
+        src_pitch = -src_pitch;
+    }
+    for (y = 0; y < h; y++)
+    {
+        memmove (dst, src, row_bytes);
+        src += src_pitch;
+        dst += dst_pitch;
+    }
+}
+
+/* Convert the pixels of surf to 8 bit RGB, RGBA or ARGB bytes in dst,
+   which must have room for channels * w * h bytes. With premult, the
+   color channels are multiplied by alpha. With use_colorkey, pixels
+   matching the colorkey get an alpha of 0 and the rest 255. Returns -1
+   if the surface depth isn't supported. */
+static int
+image_tostring (SDL_Surface *surf, Uint8 *dst, int channels, int argb,
+                int premult, int use_colorkey, int flipped)
+{
+    SDL_PixelFormat *format = surf->format;
+    SDL_Color *colors = NULL;
+    int bpp = format->BytesPerPixel;
+    int w = surf->w, h = surf->h;
+    int x, y;
+    int ri = 0, gi = 1, bi = 2, ai = 3;
+    Uint8 *row, *p;
+    Uint32 color;
+    Uint32 r, g, b, a;
+
+    if (bpp < 1 || bpp > 4)
+        return -1;
+    if (bpp == 1)
+    {
+        if (!format->palette)
+            return -1;
+        colors = format->palette->colors;
+    }
+    if (argb)
+    {
+        ri = 1;
+        gi = 2;
+        bi = 3;
+        ai = 0;
+    }
+
+    for (y = 0; y < h; y++)
+    {
+        row = (Uint8 *) surf->pixels +
+            (ptrdiff_t) surf->pitch * (flipped ? h - 1 - y : y);
+        for (x = 0; x < w; x++)
+        {
+            p = row + x * bpp;
+            switch (bpp)
+            {
+            case 1:
+                color = *p;
+                break;
+            case 2:
+                color = *(Uint16 *) p;
+                break;
+            case 3:
+#if SDL_BYTEORDER == SDL_LIL_ENDIAN
+                color = p[0] | (p[1] << 8) | (p[2] << 16);
+#else
+                color = p[2] | (p[1] << 8) | (p[0] << 16);
+#endif
+                break;
+            default:
+                color = *(Uint32 *) p;
+                break;
+            }
+
+            if (bpp == 1)
+            {
+                r = colors[color].r;
+                g = colors[color].g;
+                b = colors[color].b;
+                a = 255;
+            }
+            else
+            {
+                r = ((color & format->Rmask) >> format->Rshift) <<
+                    format->Rloss;
+                g = ((color & format->Gmask) >> format->Gshift) <<
+                    format->Gloss;
+                b = ((color & format->Bmask) >> format->Bshift) <<
+                    format->Bloss;
+                a = format->Amask ?
+                    ((color & format->Amask) >> format->Ashift) <<
+                    format->Aloss : 255;
+            }
+            if (use_colorkey)
+                a = color == format->colorkey ? 0 : 255;
+            if (premult)
+            {
+                r = r * a / 255;
+                g = g * a / 255;
+                b = b * a / 255;
+            }
+
+            dst[ri] = (Uint8) r;
+            dst[gi] = (Uint8) g;
+            dst[bi] = (Uint8) b;
+            if (channels == 4)
+                dst[ai] = (Uint8) a;
+            dst += channels;
+        }
+    }
+    return 0;
+}
+
+/* Make count frame_w by frame_h surfaces from the frames of src, taken
+   left to right and top to bottom, and store them in out. With copy,
+   each frame gets its own copy of the pixels, otherwise it shares the
+   pixels of src like a subsurface. The frames keep the palette, alpha
+   and colorkey of src. src must be locked. Returns -1 with the SDL
+   error set if a surface can't be created, after freeing the frames
+   made so far. */
+static int
+image_slice_frames (SDL_Surface *src, int frame_w, int frame_h, int count,
+                    int copy, SDL_Surface **out)
+{
+    SDL_PixelFormat *format = src->format;
+    int columns = src->w / frame_w;
+    int i;
+    Uint8 *pixels;
+    SDL_Surface *frame;
+
+    for (i = 0; i < count; i++)
+    {
+        pixels = (Uint8 *) src->pixels +
+            (ptrdiff_t) src->pitch * (i / columns) * frame_h +
+            (i % columns) * frame_w * format->BytesPerPixel;
+        if (copy)
+        {
+            frame = SDL_CreateRGBSurface (SDL_SWSURFACE, frame_w, frame_h,
+                                          format->BitsPerPixel,
+                                          format->Rmask, format->Gmask,
+                                          format->Bmask, format->Amask);
+            if (frame)
+                image_copy_rows ((const char *) pixels, src->pitch,
+                                 (char *) frame->pixels, frame->pitch,
+                                 frame_w * format->BytesPerPixel, frame_h,
+                                 0);
+        }
+        else
+        {
+            frame = SDL_CreateRGBSurfaceFrom (pixels, frame_w, frame_h,
+                                              format->BitsPerPixel,
+                                              src->pitch, format->Rmask,
+                                              format->Gmask, format->Bmask,
+                                              format->Amask);
+        }
+        if (!frame)
+        {
+            while (i--)
+                SDL_FreeSurface (out[i]);
+            return -1;
+        }
+
+        if (format->BytesPerPixel == 1 && format->palette)
+            SDL_SetPalette (frame, SDL_LOGPAL, format->palette->colors, 0,
+                            format->palette->ncolors);
+        if (src->flags & SDL_SRCALPHA)
+            SDL_SetAlpha (frame, SDL_SRCALPHA, format->alpha);
+        if (src->flags & SDL_SRCCOLORKEY)
+            SDL_SetColorKey (frame,
+                             src->flags & (SDL_SRCCOLORKEY | SDL_RLEACCEL),
+                             format->colorkey);
+        out[i] = frame;
+    }
+    return 0;
+}
@@ -0,0 +1,194 @@
+/*
+ Helpers for pygame.rwobject
+
+ pygame_cffi - a cffi implementation of the pygame library
+
+ This library is free software; you can redistribute it and/or
+ modify it under the terms of the GNU Lesser General Public
+ License as published by the Free Software Foundation; either
+ version 2.1 of the License, or (at your option) any later version.
+
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Library General Public
+ License along with this library; if not, write to the Free
+ Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+ MA  02110-1301  USA
+*/
+
+/* The Python callbacks, defined by cffi after this code */
+static int obj_readinto (void *handle, void *output, int size);
+static int obj_seek (void *handle, int offset, int whence);
+static int obj_write (void *handle, const void *input, int size);
+static int obj_close (void *handle);
+
+/* The state of an SDL_RWops for a Python file object. Reads are served
+   from a read-ahead buffer, so the decoders' small reads don't each
+   call into Python. */
+typedef struct
+{
+    void *handle;   /* ffi handle of the file object */
+    Uint8 *buffer;
+    int size;       /* size of buffer */
+    int pos;        /* buffer[pos:end] hasn't been read yet */
+    int end;
+    long offset;    /* file offset of buffer[end], or -1 if unknown */
+} _rwobject_file;
+
+static int
+_rwobject_seek (SDL_RWops *context, int offset, int whence)
+{
+    _rwobject_file *rw = (_rwobject_file *) context->hidden.unknown.data1;
+    long start, pos = -1;
+
+    if (rw->offset >= 0)
+    {
+        /* Seeks within the buffer, including the SEEK_CUR seeks SDL
+           uses to tell the position, don't need the file object */
+        start = rw->offset - rw->end;
+        if (whence == SEEK_CUR)
+            pos = rw->pos + (long) offset;
+        else if (whence == SEEK_SET)
+            pos = offset - start;
+        if (pos >= 0 && pos <= rw->end)
+        {
+            rw->pos = (int) pos;
+            return (int) (start + pos);
+        }
+    }
+    if (whence == SEEK_CUR)
+        offset -= rw->end - rw->pos;
+    /* Only drop the read-ahead once the file has really moved, so a
+       failed seek leaves the unread data in place */
+    pos = obj_seek (rw->handle, offset, whence);
+    if (pos < 0)
+        return -1;
+    rw->pos = rw->end = 0;
+    rw->offset = pos;
+    return (int) pos;
+}
+
+static int
+_rwobject_read (SDL_RWops *context, void *ptr, int size, int maxnum)
+{
+    _rwobject_file *rw = (_rwobject_file *) context->hidden.unknown.data1;
+    Uint8 *dst = (Uint8 *) ptr;
+    int want, got = 0, n = 0;
+
+    if (size <= 0 || maxnum <= 0)
+        return 0;
+    want = size * maxnum;
+    while (got < want)
+    {
+        if (rw->pos < rw->end)
+        {
+            n = rw->end - rw->pos;
+            if (n > want - got)
+                n = want - got;
+            memcpy (dst + got, rw->buffer + rw->pos, n);
+            rw->pos += n;
+            got += n;
+            continue;
+        }
+        if (want - got >= rw->size)
+        {
+            /* Too big for the buffer, so read straight into ptr */
+            n = obj_readinto (rw->handle, dst + got, want - got);
+            if (n <= 0)
+                break;
+            rw->pos = rw->end = 0;
+            got += n;
+        }
+        else
+        {
+            n = obj_readinto (rw->handle, rw->buffer, rw->size);
+            if (n <= 0)
+                break;
+            rw->pos = 0;
+            rw->end = n;
+        }
+        if (rw->offset >= 0)
+            rw->offset += n;
+    }
+    if (got == 0 && n < 0)
+        return -1;
+    return got / size;
+}
+
+static int
+_rwobject_write (SDL_RWops *context, const void *ptr, int size, int num)
+{
+    _rwobject_file *rw = (_rwobject_file *) context->hidden.unknown.data1;
+
+    if (rw->pos < rw->end)
+    {
+        /* Move the file back to where the reader got to */
+        rw->offset = obj_seek (rw->handle, rw->pos - rw->end, SEEK_CUR);
+    }
+    rw->pos = rw->end = 0;
+    if (size <= 0 || num <= 0)
+        return 0;
+    if (obj_write (rw->handle, ptr, size * num) < 0)
+        return -1;
+    if (rw->offset >= 0)
+        rw->offset += size * num;
+    return num;
+}
+
+static int
+_rwobject_close (SDL_RWops *context)
+{
+    _rwobject_file *rw = (_rwobject_file *) context->hidden.unknown.data1;
+    int result = obj_close (rw->handle);
+
+    free (rw->buffer);
+    free (rw);
+    SDL_FreeRW (context);
+    return result;
+}
+
+/* Create an SDL_RWops for the Python file object behind handle, reading
+   ahead by buffer_size bytes. With a buffer_size of 0, every read goes
+   straight to the file object. Returns NULL if out of memory. */
+static SDL_RWops *
+rwobject_from_handle (void *handle, int buffer_size)
+{
+    SDL_RWops *context;
+    _rwobject_file *rw;
+
+    rw = (_rwobject_file *) calloc (1, sizeof (_rwobject_file));
+    if (rw == NULL)
+    {
+        SDL_OutOfMemory ();
+        return NULL;
+    }
+    if (buffer_size > 0)
+    {
+        rw->buffer = (Uint8 *) malloc (buffer_size);
+        if (rw->buffer == NULL)
+        {
+            free (rw);
+            SDL_OutOfMemory ();
+            return NULL;
+        }
+    }
+    context = SDL_AllocRW ();
+    if (context == NULL)
+    {
+        free (rw->buffer);
+        free (rw);
+        return NULL;
+    }
+    rw->handle = handle;
+    rw->size = buffer_size > 0 ? buffer_size : 0;
+    rw->offset = -1;
+    context->seek = _rwobject_seek;
+    context->read = _rwobject_read;
+    context->write = _rwobject_write;
+    context->close = _rwobject_close;
+    context->hidden.unknown.data1 = rw;
+    return context;
+}
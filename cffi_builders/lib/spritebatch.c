@@ -0,0 +1,119 @@
+/*
+ Helpers for pygame.sprite.SpriteBatch
+
+ pygame_cffi - a cffi implementation of the pygame library
+
+ This library is free software; you can redistribute it and/or
+ modify it under the terms of the GNU Lesser General Public
+ License as published by the Free Software Foundation; either
+ version 2.1 of the License, or (at your option) any later version.
+
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Library General Public
+ License along with this library; if not, write to the Free
+ Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+ MA  02110-1301  USA
+*/
+
+/* The batch stores one entry per slot in parallel arrays; slots whose
+   alive flag is 0 are skipped by every helper. */
+
+static void
+spritebatch_integrate (double *x, double *y, const double *vx,
+                       const double *vy, const Uint8 *alive, int n,
+                       double dt)
+{
+    int i;
+    for (i = 0; i < n; i++)
+    {
+        if (alive[i])
+        {
+            x[i] += vx[i] * dt;
+            y[i] += vy[i] * dt;
+        }
+    }
+}
+
+/* Mirrors the choice between pygame_Blit and SDL_BlitSurface made by
+   Surface.blit for the simple (no special flags) case. */
+static int
+_spritebatch_needs_pygame_blit (SDL_Surface *src, SDL_Surface *dst)
+{
+    return (dst->format->Amask && (dst->flags & SDL_SRCALPHA) &&
+            !(src->format->Amask && !(src->flags & SDL_SRCALPHA)) &&
+            (dst->format->BytesPerPixel == 2 ||
+             dst->format->BytesPerPixel == 4));
+}
+
+/* Blit every live slot onto dst. Returns the number of blits done, or
+   -1 (with the SDL error set) if a blit failed. */
+static int
+spritebatch_blit (SDL_Surface **images, int nimages, const int *image,
+                  const double *x, const double *y, const Uint8 *alive,
+                  int n, SDL_Surface *dst)
+{
+    SDL_Rect dstrect;
+    SDL_Surface *src;
+    double px, py;
+    int i, idx, res;
+    int count = 0;
+
+    for (i = 0; i < n; i++)
+    {
+        if (!alive[i])
+            continue;
+        idx = image[i];
+        if (idx < 0 || idx >= nimages)
+            continue;
+        px = x[i];
+        py = y[i];
+        /* SDL_Rect uses 16 bit coordinates */
+        if (px <= -32768.0 || px >= 32768.0 ||
+            py <= -32768.0 || py >= 32768.0)
+            continue;
+        src = images[idx];
+        dstrect.x = (Sint16) px;
+        dstrect.y = (Sint16) py;
+        dstrect.w = src->w;
+        dstrect.h = src->h;
+        if (_spritebatch_needs_pygame_blit (src, dst))
+            res = pygame_Blit (src, NULL, dst, &dstrect, 0);
+        else
+            res = SDL_BlitSurface (src, NULL, dst, &dstrect);
+        if (res < 0)
+            return -1;
+        count++;
+    }
+    return count;
+}
+
+/* Store the slots whose rect intersects (rx, ry, rw, rh) in out and
+   return how many were found. out must have room for n entries. */
+static int
+spritebatch_collide_rect (const int *widths, const int *heights,
+                          int nimages, const int *image, const double *x,
+                          const double *y, const Uint8 *alive, int n,
+                          int rx, int ry, int rw, int rh, int *out)
+{
+    int i, idx, sx, sy;
+    int found = 0;
+
+    for (i = 0; i < n; i++)
+    {
+        if (!alive[i])
+            continue;
+        idx = image[i];
+        if (idx < 0 || idx >= nimages)
+            continue;
+        sx = (int) x[i];
+        sy = (int) y[i];
+        if (sx < rx + rw && sy < ry + rh &&
+            sx + widths[idx] > rx && sy + heights[idx] > ry)
+            out[found++] = i;
+    }
+    return found;
+}
@@ -13,8 +13,12 @@ ffi.cdef("""
 
 // functions
 
-static int write_png(const char *file_name, unsigned char **rows, int w, int h,
-    int colortype, int bitdepth, char** error);
+static int write_png(const char *file_name, unsigned char *pixels, int pitch,
+    int w, int h, int colortype, int bitdepth, int compression, char** error);
+static int write_png_mem(unsigned char *pixels, int pitch, int w, int h,
+    int colortype, int bitdepth, int compression, unsigned char **data,
+    size_t *size, char** error);
+void free(void *ptr);
 
 """)
 
@@ -26,6 +30,7 @@ pnglib = ffi.set_source(
     source="""
     #define PNG_SKIP_SETJMP_CHECK 1
     #include <stdlib.h>
+    #include <string.h>
     #include <png.h>
 
     static void
@@ -33,7 +38,6 @@ pnglib = ffi.set_source(
     {
         FILE *fp = (FILE *)png_get_io_ptr(png_ptr);
         if (fwrite(data, 1, length, fp) != length) {
-            fclose(fp);
             png_error(png_ptr, "Error while writing to the PNG file (fwrite)");
         }
     }
@@ -43,28 +47,62 @@ pnglib = ffi.set_source(
     {
         FILE *fp = (FILE *)png_get_io_ptr(png_ptr);
         if (fflush(fp) == EOF) {
-            fclose(fp);
             png_error(png_ptr, "Error while writing to PNG file (fflush)");
         }
     }
 
-    static int write_png(const char *file_name,
-                         png_bytep *rows,
-                         int w,
-                         int h,
-                         int colortype,
-                         int bitdepth,
-                         char** error)
+    /* A malloc'd buffer that grows as the PNG is written to it */
+    typedef struct {
+        png_bytep data;
+        png_size_t size;
+        png_size_t allocated;
+    } png_mem_buffer;
+
+    static void
+    png_mem_write_fn (png_structp png_ptr, png_bytep data, png_size_t length)
+    {
+        png_mem_buffer *buf = (png_mem_buffer *)png_get_io_ptr(png_ptr);
+        png_size_t allocated = buf->allocated ? buf->allocated : 4096;
+        png_bytep grown;
+
+        while (allocated - buf->size < length)
+            allocated *= 2;
+        if (allocated != buf->allocated) {
+            if (!(grown = realloc(buf->data, allocated)))
+                png_error(png_ptr, "Out of memory while writing the PNG");
+            buf->data = grown;
+            buf->allocated = allocated;
+        }
+        memcpy(buf->data + buf->size, data, length);
+        buf->size += length;
+    }
+
+    static void
+    png_mem_flush_fn (png_structp png_ptr)
+    {
+    }
+
+    /* Write the image through write_fn. The rows of the image start
+       pitch bytes apart from pixels. compression is the zlib level,
+       0 to 9, or -1 for the default. */
+    static int png_encode(png_voidp io_ptr,
+                          png_rw_ptr write_fn,
+                          png_flush_ptr flush_fn,
+                          png_bytep pixels,
+                          int pitch,
+                          int w,
+                          int h,
+                          int colortype,
+                          int bitdepth,
+                          int compression,
+                          char** error)
     {
         png_structp png_ptr = NULL;
         png_infop info_ptr =  NULL;
-        FILE *fp = NULL;
-        char *doing = "open for writing";
+        /* volatile, since it's changed between setjmp and longjmp */
+        const char * volatile doing = "create png write struct";
+        int y;
 
-        if (!(fp = fopen (file_name, "wb")))
-            goto fail;
-
-        doing = "create png write struct";
         if (!(png_ptr = png_create_write_struct
               (PNG_LIBPNG_VER_STRING, NULL, NULL, NULL)))
             goto fail;
@@ -76,25 +114,25 @@ pnglib = ffi.set_source(
             goto fail;
 
         doing = "init IO";
-        png_set_write_fn (png_ptr, fp, png_write_fn, png_flush_fn);
+        png_set_write_fn (png_ptr, io_ptr, write_fn, flush_fn);
 
         doing = "write header";
         png_set_IHDR (png_ptr, info_ptr, w, h, bitdepth, colortype,
                       PNG_INTERLACE_NONE, PNG_COMPRESSION_TYPE_BASE,
                       PNG_FILTER_TYPE_BASE);
+        if (compression >= 0)
+            png_set_compression_level (png_ptr, compression);
 
         doing = "write info";
         png_write_info (png_ptr, info_ptr);
 
         doing = "write image";
-        png_write_image (png_ptr, rows);
+        for (y = 0; y < h; y++)
+            png_write_row (png_ptr, pixels + (size_t) pitch * y);
 
         doing = "write end";
         png_write_end (png_ptr, NULL);
 
-        doing = "closing file";
-        if(0 != fclose (fp))
-            goto fail;
         png_destroy_write_struct(&png_ptr, &info_ptr);
         return 0;
 
@@ -113,6 +151,60 @@ pnglib = ffi.set_source(
         sprintf(*error, "SavePNG: could not %s", doing);
         return -1;
     }
+
+    static int write_png(const char *file_name,
+                         png_bytep pixels,
+                         int pitch,
+                         int w,
+                         int h,
+                         int colortype,
+                         int bitdepth,
+                         int compression,
+                         char** error)
+    {
+        FILE *fp = NULL;
+        int result;
+
+        if (!(fp = fopen (file_name, "wb"))) {
+            *error = malloc(50);
+            sprintf(*error, "SavePNG: could not open for writing");
+            return -1;
+        }
+        result = png_encode (fp, png_write_fn, png_flush_fn, pixels, pitch,
+                             w, h, colortype, bitdepth, compression, error);
+        if (0 != fclose (fp) && result == 0) {
+            *error = malloc(50);
+            sprintf(*error, "SavePNG: could not close file");
+            return -1;
+        }
+        return result;
+    }
+
+    /* Like write_png, but the PNG is stored in *data, which is
+       allocated with malloc, and its length in *size. */
+    static int write_png_mem(png_bytep pixels,
+                             int pitch,
+                             int w,
+                             int h,
+                             int colortype,
+                             int bitdepth,
+                             int compression,
+                             png_bytep *data,
+                             size_t *size,
+                             char** error)
+    {
+        png_mem_buffer buf = {NULL, 0, 0};
+
+        if (png_encode (&buf, png_mem_write_fn, png_mem_flush_fn, pixels,
+                        pitch, w, h, colortype, bitdepth, compression,
+                        error) == -1) {
+            free (buf.data);
+            return -1;
+        }
+        *data = buf.data;
+        *size = buf.size;
+        return 0;
+    }
     """
 )
 
@@ -522,12 +522,18 @@ SDL_Cursor *SDL_CreateCursor(Uint8  *data,  Uint8 *mask, int w, int h,
     int hot_x, int hot_y);
 void SDL_FreeCursor(SDL_Cursor *cursor);
 
+#define IMG_INIT_JPG ...
+#define IMG_INIT_PNG ...
+#define IMG_INIT_TIF ...
+
+int IMG_Init(int flags);
 SDL_Surface * IMG_LoadTyped_RW(SDL_RWops *src, int freesrc, char *type);
 SDL_Surface * IMG_Load(const char *file);
 char *IMG_GetError();
 SDL_Surface* SDL_LoadBMP_RW(SDL_RWops* src, int freesrc);
 SDL_Surface* SDL_LoadBMP(const char* file);
 int SDL_SaveBMP(SDL_Surface *surface, const char *file);
+int SDL_SaveBMP_RW(SDL_Surface *surface, SDL_RWops *dst, int freedst);
 static int _pygame_SaveTGA_RW (SDL_Surface *surface, SDL_RWops *out, int rle);
 
 typedef struct _TTF_Font TTF_Font;
@@ -576,6 +582,7 @@ typedef struct _Mix_Music Mix_Music;
 
 SDL_RWops * SDL_RWFromFile(const char *file, const char *mode);
 SDL_RWops * SDL_RWFromFP(FILE *fp, int autoclose);
+SDL_RWops * SDL_RWFromConstMem(const void *mem, int size);
 SDL_RWops * SDL_AllocRW(void);
 void SDL_FreeRW(SDL_RWops * area);
 int SDL_RWclose(struct SDL_RWops* context);
@@ -585,10 +592,10 @@ extern "Python" void _endsound_callback(int);
 extern "Python" void _endmusic_callback(void);
 extern "Python" void _mixmusic_callback(void*, uint8_t*, int);
 
-extern "Python" int obj_seek(SDL_RWops*, int, int);
-extern "Python" int obj_read(SDL_RWops*, void*, int, int);
-extern "Python" int obj_write(SDL_RWops*, const void*, int, int);
-extern "Python" int obj_close(SDL_RWops*);
+extern "Python" int obj_readinto(void*, void*, int);
+extern "Python" int obj_seek(void*, int, int);
+extern "Python" int obj_write(void*, const void*, int);
+extern "Python" int obj_close(void*);
 
 int Mix_PlayChannelTimed(int channel, Mix_Chunk *chunk, int loops, int ticks);
 int Mix_FadeInChannelTimed(int channel, Mix_Chunk *chunk, int loops, int ms, int ticks);
@@ -706,6 +713,39 @@ unsigned int cc_label(bitmask_t *input, unsigned int* image, unsigned int* ufind
 int get_connected_components(bitmask_t *mask, bitmask_t ***components, int min);
 int largest_connected_comp(bitmask_t* input, bitmask_t* output, int ccx, int ccy);
 int internal_get_bounding_rects(bitmask_t *input, int *num_bounding_boxes, SDL_Rect** ret_rects);
+
+/* sprite batch helpers */
+
+static void spritebatch_integrate(double *x, double *y, const double *vx,
+    const double *vy, const Uint8 *alive, int n, double dt);
+static int spritebatch_blit(SDL_Surface **images, int nimages,
+    const int *image, const double *x, const double *y, const Uint8 *alive,
+    int n, SDL_Surface *dst);
+static int spritebatch_collide_rect(const int *widths, const int *heights,
+    int nimages, const int *image, const double *x, const double *y,
+    const Uint8 *alive, int n, int rx, int ry, int rw, int rh, int *out);
+
+/* event helpers */
+
+static int event_coalesce(SDL_Event *events, int n, Uint32 mask);
+
+/* display helpers */
+
+static int display_update_rects(const int *coords, int n, int screen_w,
+    int screen_h, long rect_cost, SDL_Rect *out);
+
+/* image helpers */
+
+static void image_copy_rows(const char *src, int src_pitch, char *dst,
+    int dst_pitch, int row_bytes, int h, int flipped);
+static int image_tostring(SDL_Surface *surf, Uint8 *dst, int channels,
+    int argb, int premult, int use_colorkey, int flipped);
+static int image_slice_frames(SDL_Surface *src, int frame_w, int frame_h,
+    int count, int copy, SDL_Surface **out);
+
+/* rwobject helpers */
+
+static SDL_RWops *rwobject_from_handle(void *handle, int buffer_size);
 """ % {'windows_struct': windows_struct})
 
 sdl = ffi.set_source(
@@ -1007,6 +1047,16 @@ sdl = ffi.set_source(
     %(rotozoom)s
 
     %(bitmask)s
+
+    %(spritebatch)s
+
+    %(event)s
+
+    %(display)s
+
+    %(image)s
+
+    %(rwobject)s
     """ % {
         'surface_h': get_c_lib('surface.h'),
         'bitmask_h': get_c_lib('bitmask.h'),
@@ -1018,6 +1068,11 @@ sdl = ffi.set_source(
         'smoothscale': get_c_lib('smoothscale.c'),
         'rotozoom': get_c_lib('rotozoom.c'),
         'bitmask': get_c_lib('bitmask.c'),
+        'spritebatch': get_c_lib('spritebatch.c'),
+        'event': get_c_lib('event.c'),
+        'display': get_c_lib('display.c'),
+        'image': get_c_lib('image.c'),
+        'rwobject': get_c_lib('rwobject.c'),
     }
 )
 
@@ -21,17 +21,29 @@
 
 """pygame module to control the display window and screen"""
 
+import array
+import collections
+import os
+
 from pygame._sdl import sdl, ffi, get_sdl_version
 from pygame._error import SDLError, unpack_rect
 from pygame.base import video_autoinit, video_autoquit, register_quit
 from pygame.compat import unicode_, string_types
 from pygame.rect import game_rect_from_obj
 from pygame.surface import SurfaceNoFree, Surface
+from pygame.surflock import locked
 
 
 # the global display surface approach comes from pygame
 _display_surface = None
 
+# Headless mode state, see set_mode and set_capture
+_headless = False
+_dummy_driver_forced = False
+_capture_frames = None
+_capture_raw = False
+_capture_callback = None
+
 
 class VidInfo(object):
     _c_vidinfo = None
@@ -144,8 +156,12 @@ def autoinit():
 
 
 def autoquit():
-    global _display_surface
+    global _display_surface, _headless, _dummy_driver_forced
     _display_surface = None
+    _headless = False
+    _dummy_driver_forced = False
+    if _capture_frames is not None:
+        _capture_frames.clear()
 
 
 def init():
@@ -197,6 +213,10 @@ def flip():
     if not screen:
         raise SDLError("Display mode not set")
 
+    if _headless:
+        _capture_frame(screen)
+        return
+
     if screen.flags & sdl.SDL_OPENGL:
         sdl.SDL_GL_SwapBuffers()
         status = 0
@@ -207,11 +227,67 @@ def flip():
         raise SDLError.from_sdl_error()
 
 
+# Each rect passed to SDL_UpdateRects costs about as much as copying this
+# many extra pixels, see set_update_rect_cost
+_update_rect_cost = 1024
+
+# Grow-only buffers reused by update()
+_update_coords = ffi.new('int[]', 64)
+_update_rects = ffi.new('SDL_Rect[]', 16)
+
+
+def _int_buffer(obj):
+    """Return a flat int buffer of rect coordinates as a cffi buffer and
+    the number of ints, or None if obj isn't one"""
+    if isinstance(obj, array.array):
+        if obj.typecode != 'i':
+            return None
+        count = len(obj)
+    elif isinstance(obj, memoryview):
+        if obj.format != 'i':
+            return None
+        count = 1
+        for dim in obj.shape:
+            count *= dim
+    else:
+        return None
+    if count % 4:
+        raise ValueError("int buffer length must be a multiple of 4")
+    return ffi.from_buffer(obj), count
+
+
+def _rects_to_coords(rects):
+    """Store the rect style objects in the coordinate buffer"""
+    global _update_coords
+    needed = len(rects) * 4
+    if len(_update_coords) < needed:
+        _update_coords = ffi.new('int[]', max(needed, len(_update_coords) * 2))
+    coords = _update_coords
+    count = 0
+    for obj in rects:
+        if not obj:
+            continue
+        rect = game_rect_from_obj(obj)
+        coords[count] = rect.x
+        coords[count + 1] = rect.y
+        coords[count + 2] = rect.w
+        coords[count + 3] = rect.h
+        count += 4
+    return coords, count
+
+
 def update(rectangle=None):
     """ update(rectangle=None) -> None
     update(rectangle_list) -> None
+    update(int_buffer) -> None
     Update portions of the screen for software displays
+
+    The rects are cropped to the screen and overlapping or nearby rects
+    are merged when that is cheaper, see set_update_rect_cost. Instead of
+    a sequence of rects, an array.array('i') or memoryview of ints with
+    x, y, w, h for each rect can be passed.
     """
+    global _update_rects
     check_video()
 
     screen = sdl.SDL_GetVideoSurface()
@@ -221,52 +297,151 @@ def update(rectangle=None):
     if (screen.flags & sdl.SDL_OPENGL):
         raise SDLError("Cannot update an OPENGL display")
 
+    if _headless:
+        # the whole screen is captured, so there's nothing to crop
+        _capture_frame(screen)
+        return
+
     if not rectangle:
         sdl.SDL_UpdateRect(screen, 0, 0, 0, 0)
         return
 
     try:
-        if hasattr(rectangle, '__iter__'):
-            # it can either be a rect style 4-tuple or
-            # a sequence of rects or rect styles
-            try:
-                int(rectangle[0])
-                rects = (rectangle, )
-            except (ValueError, TypeError):
-                rects = rectangle
+        buf = _int_buffer(rectangle)
+        if buf is not None:
+            coords, count = buf
         else:
-            rects = (rectangle, )
+            if hasattr(rectangle, '__iter__'):
+                # it can either be a rect style 4-tuple or
+                # a sequence of rects or rect styles
+                try:
+                    int(rectangle[0])
+                    rects = (rectangle, )
+                except (ValueError, TypeError):
+                    rects = rectangle
+            else:
+                rects = (rectangle, )
+            coords, count = _rects_to_coords(rects)
+    except (NotImplementedError, TypeError):
+        raise ValueError("update requires a rectstyle or sequence of recstyles")
+
+    nrects = count // 4
+    if len(_update_rects) < nrects:
+        _update_rects = ffi.new('SDL_Rect[]',
+                                max(nrects, len(_update_rects) * 2))
+    nrects = sdl.display_update_rects(ffi.cast('int *', coords), nrects,
+                                      screen.w, screen.h, _update_rect_cost,
+                                      _update_rects)
+    if nrects:
+        sdl.SDL_UpdateRects(screen, nrects, _update_rects)
+
+
+def set_update_rect_cost(pixels):
+    """ set_update_rect_cost(pixels) -> None
+    set how eagerly update() merges rects
+
+    Two rects are merged into their bounding rect when it has at most
+    pixels more pixels than the two rects together, so pixels should be
+    about the cost of updating one more rect. With 0, only rects that
+    merge without waste, such as aligned neighbours, are merged; a
+    negative value turns merging off.
+    """
+    global _update_rect_cost
+    _update_rect_cost = int(pixels)
+
+
+def get_update_rect_cost():
+    """ get_update_rect_cost() -> pixels
+    get how eagerly update() merges rects
+    """
+    return _update_rect_cost
 
-        if len(rects) == 1:
-            rect = game_rect_from_obj(rects[0])
-            if screen_crop_rect(rect, screen.w, screen.h):
-                sdl.SDL_UpdateRect(screen, rect.x, rect.y, rect.w, rect.h)
+
+def _capture_frame(screen):
+    """Capture the headless screen for get_frames and the capture callback"""
+    if _capture_frames is None and _capture_callback is None:
+        return
+    if _capture_raw:
+        with locked(screen):
+            frame = ffi.buffer(screen.pixels, screen.pitch * screen.h)[:]
+    else:
+        frame = _display_surface.copy()
+    if _capture_frames is not None:
+        _capture_frames.append(frame)
+    if _capture_callback is not None:
+        _capture_callback(frame)
+
+
+def _init_dummy_driver():
+    """Initialize the display with SDL's dummy video driver"""
+    global _dummy_driver_forced
+    if get_init():
+        if get_driver() == b'dummy':
             return
+        # the video driver can only be picked when the display is set
+        # up, and quit() forgets the display surface SDL is about to free
+        quit()
+    old_driver = os.environ.get('SDL_VIDEODRIVER')
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    try:
+        init()
+    finally:
+        if old_driver is None:
+            del os.environ['SDL_VIDEODRIVER']
+        else:
+            os.environ['SDL_VIDEODRIVER'] = old_driver
+    _dummy_driver_forced = True
 
-        rect_array = ffi.new('SDL_Rect[]', len(rects))
-        count = 0
-        for obj in rects:
-            if not obj:
-                continue
-            rect = game_rect_from_obj(obj)
-            if screen_crop_rect(rect, screen.w, screen.h):
-                sdlrect = rect_array[count]
-                sdlrect.x = rect.x
-                sdlrect.y = rect.y
-                sdlrect.w = rect.w
-                sdlrect.h = rect.h
-                count += 1
-
-        sdl.SDL_UpdateRects(screen, count, rect_array)
 
-    except (NotImplementedError, TypeError):
-        raise ValueError("update requires a rectstyle or sequence of recstyles")
+def set_capture(frames=0, raw=False, callback=None):
+    """ set_capture(frames=0, raw=False, callback=None) -> None
+    set how frames are captured in headless mode
+
+    In headless mode flip() and update() capture the whole display
+    Surface instead of presenting it. The last frames captured are kept
+    for get_frames(), and callback, if given, is called with every
+    captured frame. Frames are copies of the display Surface, or with
+    raw the bytes of its pixels, get_surface().get_pitch() bytes per row.
+    This discards the frames captured so far.
+    """
+    global _capture_frames, _capture_raw, _capture_callback
+    if frames < 0:
+        raise ValueError("frames must not be negative")
+    if callback is not None and not callable(callback):
+        raise TypeError("callback must be callable")
+    _capture_frames = collections.deque(maxlen=frames) if frames else None
+    _capture_raw = bool(raw)
+    _capture_callback = callback
+
+
+def get_frames():
+    """ get_frames() -> list
+    get the frames captured in headless mode, oldest first
+    """
+    if _capture_frames is None:
+        return []
+    return list(_capture_frames)
+
+
+def get_headless():
+    """ get_headless() -> bool
+    Returns True if the display mode was set up headless
+    """
+    return _headless
 
 
-def set_mode(resolution=(0, 0), flags=0, depth=0):
-    """ set_mode(resolution=(0,0), flags=0, depth=0) -> Surface
+def set_mode(resolution=(0, 0), flags=0, depth=0, headless=False):
+    """ set_mode(resolution=(0,0), flags=0, depth=0, headless=False) -> Surface
     Initialize a window or screen for display
+
+    With headless, the display uses SDL's dummy video driver, restarting
+    the display module if another driver is in use, so no window is
+    opened and a display isn't needed. flip() and update() then capture
+    frames as set up by set_capture() instead of presenting them. The
+    display is also headless when the dummy driver was picked with the
+    SDL_VIDEODRIVER environment variable. OpenGL isn't supported.
     """
+    global _display_surface, _headless, _dummy_driver_forced
     w, h = unpack_rect(resolution)
     if w < 0 or h < 0:
         raise SDLError("Cannot set negative sized display mode")
@@ -274,8 +449,17 @@ def set_mode(resolution=(0, 0), flags=0, depth=0):
     if flags == 0:
         flags = sdl.SDL_SWSURFACE
 
-    if not get_init():
-        init()
+    if headless:
+        if flags & sdl.SDL_OPENGL:
+            raise SDLError("Cannot set an OPENGL display headless")
+        _init_dummy_driver()
+    else:
+        if _dummy_driver_forced:
+            # go back to the driver SDL picks by itself
+            quit()
+        if not get_init():
+            init()
+        _dummy_driver_forced = False
 
     # depth and double buffering attributes need to be set specially for OpenGL
     if flags & sdl.SDL_OPENGL:
@@ -308,8 +492,10 @@ def set_mode(resolution=(0, 0), flags=0, depth=0):
     # pygame does this, so it's possibly a good idea
     sdl.SDL_PumpEvents()
 
-    global _display_surface
     _display_surface = SurfaceNoFree._from_sdl_surface(c_surface)
+    _headless = get_driver() == b'dummy'
+    if _capture_frames is not None:
+        _capture_frames.clear()
     # TODO: set icon stuff
     return _display_surface
 
@@ -397,18 +583,6 @@ def set_icon(icon):
     sdl.SDL_WM_SetIcon(icon._c_surface, ffi.NULL)
 
 
-def screen_crop_rect(r, w, h):
-    if (r.x > w) or (r.y > h) or (r.x + r.w <= 0) or (r.y + r.h <= 0):
-        return None
-    right = min(r.x + r.w, w)
-    bottom = min(r.y + r.h, h)
-    r.x = max(r.x, 0)
-    r.y = max(r.y, 0)
-    r.w = right - r.x
-    r.h = bottom - r.y
-    return r
-
-
 def get_driver():
     """ get_driver() -> name
     Get the name of the pygame display backend
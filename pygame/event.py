@@ -20,10 +20,17 @@
 
 """ The pygame event module """
 
+import pickle
+import struct
+import warnings
+from collections import deque
+
 from pygame._sdl import sdl, ffi
 from pygame._error import SDLError
 from pygame.display import check_video
 from pygame.compat import unichr_
+from pygame.time import (
+    get_ticks, _set_virtual_ticks, _get_event_loop, _new_future)
 
 from pygame.constants import (
     ACTIVEEVENT, KEYDOWN, KEYUP, MOUSEMOTION, MOUSEBUTTONDOWN, MOUSEBUTTONUP,
@@ -36,9 +43,18 @@ from pygame.constants import (
 _USEROBJECT_CHECK1 = ffi.cast('int', 0xDEADBEEF)
 _USEROBJECT_CHECK2 = ffi.cast('void*', 0xFEEDF00D)
 
-# I'm not wild about this global dict, but it's the same idea as the linked
-# list pygame uses and I don't have a better approach right now
-_user_events = {}
+# Python events posted to the SDL queue are kept in a slot table. The
+# SDL_Event only carries the index of the slot plus one in user.data2,
+# and slots are recycled once the event is read back or discarded.
+_MAX_USER_EVENTS = 1024
+_user_events = []
+_free_user_slots = []
+
+# Size of the SDL 1.2 event queue
+_SDL_MAXEVENTS = 128
+
+# Event mask of the types merged by get(), see set_coalesced
+_coalesce_mask = 0
 
 
 def _button_state(state, button):
@@ -47,108 +63,117 @@ def _button_state(state, button):
     return 0
 
 
+def _motion_buttons(sdlevent):
+    state = sdlevent.motion.state
+    return (_button_state(state, 1), _button_state(state, 2),
+            _button_state(state, 3))
+
+
+def _hat_value(sdlevent):
+    hx = hy = 0
+    if sdlevent.jhat.value & sdl.SDL_HAT_UP:
+        hy = 1
+    elif sdlevent.jhat.value & sdl.SDL_HAT_DOWN:
+        hy = -1
+    if sdlevent.jhat.value & sdl.SDL_HAT_RIGHT:
+        hx = 1
+    elif sdlevent.jhat.value & sdl.SDL_HAT_LEFT:
+        hx = -1
+    return (hx, hy)
+
+
+def _is_user_object(sdlevent):
+    return (sdlevent.user.code == int(_USEROBJECT_CHECK1) and
+            sdlevent.user.data1 == _USEROBJECT_CHECK2)
+
+
+def _user_event_slot(sdlevent):
+    return int(ffi.cast("intptr_t", sdlevent.user.data2)) - 1
+
+
+def _store_user_event(sdl_event, event, purge=True):
+    """Put event in a free slot and point sdl_event at it. Without purge,
+    the slots of events that aren't queued are left alone, as they may
+    still be about to be posted."""
+    if not _free_user_slots:
+        if len(_user_events) < _MAX_USER_EVENTS:
+            _free_user_slots.append(len(_user_events))
+            _user_events.append(None)
+        else:
+            if purge:
+                _purge_user_events()
+            if not _free_user_slots:
+                raise SDLError("Too many posted events")
+    slot = _free_user_slots.pop()
+    _user_events[slot] = event
+    sdl_event.type = event.type
+    sdl_event.user.code = _USEROBJECT_CHECK1
+    sdl_event.user.data1 = _USEROBJECT_CHECK2
+    sdl_event.user.data2 = ffi.cast("void*", slot + 1)
+
+
+def _release_user_slot(slot):
+    _user_events[slot] = None
+    _free_user_slots.append(slot)
+
+
+def _get_user_event(sdlevent):
+    """Return the event posted with sdlevent. If its slot was already
+    freed, the event's attributes are lost, and an event with just its
+    type is returned instead."""
+    slot = _user_event_slot(sdlevent)
+    if 0 <= slot < len(_user_events) and _user_events[slot] is not None:
+        return _user_events[slot]
+    return Event(sdlevent.type)
+
+
+def _take_user_event(sdlevent):
+    """Return the event posted with sdlevent and free its slot"""
+    slot = _user_event_slot(sdlevent)
+    event = _get_user_event(sdlevent)
+    if 0 <= slot < len(_user_events) and _user_events[slot] is event:
+        _release_user_slot(slot)
+    return event
+
+
+def _purge_user_events():
+    """Free the slots of posted events that are no longer on the queue,
+    because SDL dropped them, for example when their type was blocked"""
+    if len(_free_user_slots) == len(_user_events):
+        return
+    events = ffi.new("SDL_Event[]", _SDL_MAXEVENTS)
+    # This fails if the event queue isn't running, in which case none of
+    # the events are queued any more
+    count = sdl.SDL_PeepEvents(events, _SDL_MAXEVENTS, sdl.SDL_PEEKEVENT,
+                               sdl.SDL_ALLEVENTS)
+    queued = set()
+    for i in range(count):
+        if _is_user_object(events[i]):
+            queued.add(_user_event_slot(events[i]))
+    for slot, event in enumerate(_user_events):
+        if event is not None and slot not in queued:
+            _release_user_slot(slot)
+
+
 class EventType(object):
-    """An event object"""
+    """An event object
 
-    def __init__(self, sdlevent, d=None, **kwargs):
-        self._sdlevent = sdlevent
-        if isinstance(sdlevent, int):
-            # User specificed event with kwargs
-            self.type = sdlevent
-            # XXX: Pygame manipulates __dict__, we're currently don't
-            # this causes a failure in test_Event
-            if d:
-                self._dict = d.copy()
+    EventType(type, dict) creates an event with the given attributes.
+    EventType(sdlevent) wraps an SDL_Event read from the queue; the
+    instance is of a per-type subclass that only decodes attributes from
+    its copy of the SDL_Event when they are first accessed. Any event
+    can be given other attributes, as in pygame.
+    """
+
+    __slots__ = ('type', '__dict__')
+
+    def __new__(cls, sdlevent=None, d=None, **kwargs):
+        if cls is EventType:
+            if isinstance(sdlevent, int):
+                cls = _DictEventType
             else:
-                self._dict = {}
-            if kwargs:
-                self._dict.update(kwargs)
-            for attr, value in self._dict.items():
-                setattr(self, attr, value)
-            return
-        if not sdlevent:
-            self.type = sdl.SDL_NOEVENT
-            return
-        self.type = self._sdlevent.type
-
-        if (sdlevent.user.code == int(_USEROBJECT_CHECK1) and
-                sdlevent.user.data1 == _USEROBJECT_CHECK2):
-            eventkey = ffi.cast("SDL_Event *", sdlevent.user.data2)
-            if eventkey in _user_events:
-                self._dict = _user_events[eventkey]._dict
-                del _user_events[eventkey]
-                for attr, value in self._dict.items():
-                    setattr(self, attr, value)
-                return
-            raise NotImplementedError("TODO: Error handling for user-posted events.")
-
-        if self.type == ACTIVEEVENT:
-            self.gain = sdlevent.active.gain
-            self.state = sdlevent.active.state
-
-        elif self.type == KEYDOWN:
-            self.unicode = unichr_(sdlevent.key.keysym.unicode)
-            self.key = sdlevent.key.keysym.sym
-            self.mod = sdlevent.key.keysym.mod
-            self.scancode = sdlevent.key.keysym.scancode
-        elif self.type == KEYUP:
-            self.key = sdlevent.key.keysym.sym
-            self.mod = sdlevent.key.keysym.mod
-            self.scancode = sdlevent.key.keysym.scancode
-
-        elif self.type == MOUSEMOTION:
-            self.pos = (sdlevent.motion.x, sdlevent.motion.y)
-            self.rel = (sdlevent.motion.xrel, sdlevent.motion.yrel)
-            self.buttons = (_button_state(sdlevent.motion.state, 1),
-                            _button_state(sdlevent.motion.state, 2),
-                            _button_state(sdlevent.motion.state, 3))
-        elif self.type in (MOUSEBUTTONDOWN, MOUSEBUTTONUP):
-            self.pos = (sdlevent.button.x, sdlevent.button.y)
-            self.button = sdlevent.button.button
-
-        elif self.type == JOYAXISMOTION:
-            self.joy = sdlevent.jaxis.which
-            self.axis = sdlevent.jaxis.axis
-            self.value = sdlevent.jaxis.value / 32767.0
-        elif self.type == JOYBALLMOTION:
-            self.joy = sdlevent.jball.which
-            self.ball = sdlevent.jball.ball
-            self.rel = (sdlevent.jball.xrel, sdlevent.jball.yrel)
-        elif self.type == JOYHATMOTION:
-            self.joy = sdlevent.jhat.which
-            self.hat = sdlevent.jhat.hat
-            hx = hy = 0
-            if sdlevent.jhat.value & sdl.SDL_HAT_UP:
-                hy = 1
-            elif sdlevent.jhat.value & sdl.SDL_HAT_DOWN:
-                hy = -1
-            if sdlevent.jhat.value & sdl.SDL_HAT_RIGHT:
-                hx = 1
-            elif sdlevent.jhat.value & sdl.SDL_HAT_LEFT:
-                hx = -1
-            self.value = (hx, hy)
-        elif self.type in (JOYBUTTONUP, JOYBUTTONDOWN):
-            self.joy = sdlevent.jbutton.which
-            self.button = sdlevent.jbutton.button
-
-        elif self.type == VIDEORESIZE:
-            self.size = (sdlevent.resize.w, sdlevent.resize.h)
-            self.w = sdlevent.resize.w
-            self.h = sdlevent.resize.h
-
-        elif self.type == SYSWMEVENT:
-            raise NotImplementedError("SYSWMEVENT not properly supported yet.")
-
-        elif self.type in (VIDEOEXPOSE, QUIT):
-            pass  # No attributes here.
-
-        elif USEREVENT <= self.type < NUMEVENTS:
-            self.code = sdlevent.user.code
-            if self.type == USEREVENT and sdlevent.user.code == USEREVENT_DROPFILE:
-                # mirrors what pygame does - not sure if correct
-                self.filename = ffi.string(sdlevent.user.data1)
-                sdl.free(sdlevent.user.data1)
-                sdlevent.user.data1 = ffi.NULL
+                cls = _sdl_event_class(sdlevent)
+        return object.__new__(cls)
 
     def __nonzero__(self):
         return self.type != sdl.SDL_NOEVENT
@@ -161,12 +186,12 @@ class EventType(object):
             return NotImplemented
         if self.type != other.type:
             return False
-        if hasattr(self, '_dict'):
-            if hasattr(other, '_dict'):
-                return self._dict == other._dict
-            return False
-        # FIXME: Either add _dict for all events, or add appropriate
-        # logic for all cases here
+        self_dict = getattr(self, '_dict', None)
+        other_dict = getattr(other, '_dict', None)
+        if self_dict is not None and other_dict is not None:
+            return self_dict == other_dict
+        # FIXME: Add appropriate logic for comparing the decoded
+        # attributes of SDL events here
         return False
 
     def __ne__(self, other):
@@ -176,6 +201,196 @@ class EventType(object):
         return not res
 
 
+class _DictEventType(EventType):
+    """An event with arbitrary attributes, either created from python or
+    posted to the queue with post()"""
+
+    __slots__ = ()
+
+    def __init__(self, sdlevent, d=None, **kwargs):
+        if isinstance(sdlevent, int):
+            # User specificed event with kwargs
+            self.type = sdlevent
+            # XXX: Pygame manipulates __dict__, we're currently don't
+            # this causes a failure in test_Event
+            if d:
+                self._dict = d.copy()
+            else:
+                self._dict = {}
+            if kwargs:
+                self._dict.update(kwargs)
+        else:
+            self.type = sdlevent.type
+            self._dict = _take_user_event(sdlevent)._dict
+        for attr, value in self._dict.items():
+            setattr(self, attr, value)
+
+
+class _NoEventType(EventType):
+    __slots__ = ()
+
+    def __init__(self, sdlevent=None, d=None, **kwargs):
+        self.type = sdl.SDL_NOEVENT
+
+
+class _SDLEventType(EventType):
+    """An event read from the SDL queue"""
+
+    __slots__ = ('_sdlevent',)
+
+    def __init__(self, sdlevent, d=None, **kwargs):
+        # The caller's SDL_Event is usually a reused buffer, so keep a copy
+        self._sdlevent = ffi.new("SDL_Event *", sdlevent)
+        self.type = sdlevent.type
+
+
+class _lazy_attribute(object):
+    """Descriptor that decodes an event attribute from the SDL_Event on
+    first access and caches the result in a slot"""
+
+    def __init__(self, slot, decode):
+        self._slot = slot
+        self._decode = decode
+
+    def __get__(self, event, owner):
+        if event is None:
+            return self
+        try:
+            return self._slot.__get__(event, owner)
+        except AttributeError:
+            value = self._decode(event._sdlevent)
+            self._slot.__set__(event, value)
+            return value
+
+    def __set__(self, event, value):
+        self._slot.__set__(event, value)
+
+
+def _sdl_event_type(name, **decoders):
+    """Create an _SDLEventType subclass with a lazily decoded attribute
+    for each of the given decoder functions"""
+    slots = tuple('_' + attr for attr in decoders)
+    cls = type(name, (_SDLEventType,), {'__slots__': slots})
+    for attr, decode in decoders.items():
+        setattr(cls, attr, _lazy_attribute(cls.__dict__['_' + attr], decode))
+    return cls
+
+
+_ActiveEventType = _sdl_event_type(
+    '_ActiveEventType',
+    gain=lambda e: e.active.gain,
+    state=lambda e: e.active.state)
+
+_KeyUpEventType = _sdl_event_type(
+    '_KeyUpEventType',
+    key=lambda e: e.key.keysym.sym,
+    mod=lambda e: e.key.keysym.mod,
+    scancode=lambda e: e.key.keysym.scancode)
+
+_KeyDownEventType = _sdl_event_type(
+    '_KeyDownEventType',
+    unicode=lambda e: unichr_(e.key.keysym.unicode),
+    key=lambda e: e.key.keysym.sym,
+    mod=lambda e: e.key.keysym.mod,
+    scancode=lambda e: e.key.keysym.scancode)
+
+_MouseMotionEventType = _sdl_event_type(
+    '_MouseMotionEventType',
+    pos=lambda e: (e.motion.x, e.motion.y),
+    rel=lambda e: (e.motion.xrel, e.motion.yrel),
+    buttons=_motion_buttons)
+
+_MouseButtonEventType = _sdl_event_type(
+    '_MouseButtonEventType',
+    pos=lambda e: (e.button.x, e.button.y),
+    button=lambda e: e.button.button)
+
+_JoyAxisEventType = _sdl_event_type(
+    '_JoyAxisEventType',
+    joy=lambda e: e.jaxis.which,
+    axis=lambda e: e.jaxis.axis,
+    value=lambda e: e.jaxis.value / 32767.0)
+
+_JoyBallEventType = _sdl_event_type(
+    '_JoyBallEventType',
+    joy=lambda e: e.jball.which,
+    ball=lambda e: e.jball.ball,
+    rel=lambda e: (e.jball.xrel, e.jball.yrel))
+
+_JoyHatEventType = _sdl_event_type(
+    '_JoyHatEventType',
+    joy=lambda e: e.jhat.which,
+    hat=lambda e: e.jhat.hat,
+    value=_hat_value)
+
+_JoyButtonEventType = _sdl_event_type(
+    '_JoyButtonEventType',
+    joy=lambda e: e.jbutton.which,
+    button=lambda e: e.jbutton.button)
+
+_VideoResizeEventType = _sdl_event_type(
+    '_VideoResizeEventType',
+    size=lambda e: (e.resize.w, e.resize.h),
+    w=lambda e: e.resize.w,
+    h=lambda e: e.resize.h)
+
+_UserEventType = _sdl_event_type(
+    '_UserEventType',
+    code=lambda e: e.user.code)
+
+# Events such as QUIT and VIDEOEXPOSE that have no attributes
+_PlainEventType = _sdl_event_type('_PlainEventType')
+
+
+class _DropFileEventType(_UserEventType):
+    __slots__ = ('filename',)
+
+    def __init__(self, sdlevent, d=None, **kwargs):
+        _UserEventType.__init__(self, sdlevent)
+        # mirrors what pygame does - not sure if correct
+        # The filename is owned by the event, so it can't be decoded lazily
+        self.filename = ffi.string(ffi.cast("char *", sdlevent.user.data1))
+        sdl.free(sdlevent.user.data1)
+        sdlevent.user.data1 = ffi.NULL
+        self._sdlevent.user.data1 = ffi.NULL
+
+
+_event_types = {
+    ACTIVEEVENT: _ActiveEventType,
+    KEYDOWN: _KeyDownEventType,
+    KEYUP: _KeyUpEventType,
+    MOUSEMOTION: _MouseMotionEventType,
+    MOUSEBUTTONDOWN: _MouseButtonEventType,
+    MOUSEBUTTONUP: _MouseButtonEventType,
+    JOYAXISMOTION: _JoyAxisEventType,
+    JOYBALLMOTION: _JoyBallEventType,
+    JOYHATMOTION: _JoyHatEventType,
+    JOYBUTTONDOWN: _JoyButtonEventType,
+    JOYBUTTONUP: _JoyButtonEventType,
+    VIDEORESIZE: _VideoResizeEventType,
+}
+
+
+def _sdl_event_class(sdlevent):
+    """Pick the EventType subclass used to wrap an SDL_Event"""
+    if not sdlevent or sdlevent.type == NOEVENT:
+        return _NoEventType
+    if _is_user_object(sdlevent):
+        return _DictEventType
+    event_type = sdlevent.type
+    cls = _event_types.get(event_type)
+    if cls is not None:
+        return cls
+    if event_type == SYSWMEVENT:
+        raise NotImplementedError("SYSWMEVENT not properly supported yet.")
+    if USEREVENT <= event_type < NUMEVENTS:
+        if (event_type == USEREVENT and
+                sdlevent.user.code == USEREVENT_DROPFILE):
+            return _DropFileEventType
+        return _UserEventType
+    return _PlainEventType
+
+
 def Event(type_id, attr_dict=None, **attrs):
     """ Event(type, dict) -> EventType instance
     create a new event object
@@ -216,25 +431,86 @@ def event_mask(event_id):
     return 1 << event_id
 
 
-def get(event_filter=None):
+# Number of events fetched from the queue by a single SDL_PeepEvents call
+_EVENT_BATCH_SIZE = 64
+
+
+def _event_filter_mask(event_filter):
+    """Convert None, an event type or a sequence of event types into
+    an SDL event mask"""
     if event_filter is None:
-        # unfiltered list of events
-        mask = sdl.SDL_ALLEVENTS
-    else:
-        raise RuntimeError("Implement me")
+        return sdl.SDL_ALLEVENTS
+    mask = 0
+    for event_type in _event_types_iter(event_filter):
+        mask |= event_mask(event_type)
+    return mask
+
+
+def _get_events(mask, coalesce_mask=0):
+    """Remove the queued events matching mask, yielding each SDL_Event.
+
+    The events are fetched _EVENT_BATCH_SIZE at a time into a single
+    buffer, so each one must be used before the next is requested.
+    Runs of the event types in coalesce_mask are merged by
+    event_coalesce; the last event of a full batch is held back so it
+    can be merged with the start of the next one."""
+    events = ffi.new("SDL_Event[]", _EVENT_BATCH_SIZE)
+    pending = 0
+    while True:
+        count = sdl.SDL_PeepEvents(events + pending,
+                                   _EVENT_BATCH_SIZE - pending,
+                                   sdl.SDL_GETEVENT, mask)
+        if count < 0:
+            raise SDLError.from_sdl_error()
+        done = count < _EVENT_BATCH_SIZE - pending
+        count += pending
+        pending = 0
+        if coalesce_mask:
+            count = sdl.event_coalesce(events, count, coalesce_mask)
+            if (not done and count and
+                    event_mask(events[count - 1].type) & coalesce_mask):
+                count -= 1
+                pending = 1
+        for i in range(count):
+            yield events[i]
+        if done:
+            return
+        if pending:
+            events[0] = events[count]
+
+
+def get(event_filter=None):
+    """ get() -> Eventlist
+    get(type) -> Eventlist
+    get(typelist) -> Eventlist
+    get events from the queue
+    """
+    mask = _event_filter_mask(event_filter)
+    if _player is not None:
+        return _player.next_events()
     sdl.SDL_PumpEvents()
-    event_list = []
-    event = ffi.new("SDL_Event *")
-    while sdl.SDL_PeepEvents(event, 1, sdl.SDL_GETEVENT, mask) == 1:
-        event_list.append(EventType(event))
-    return event_list
+    events = [EventType(event)
+              for event in _get_events(mask, _coalesce_mask)]
+    if _recorder is not None:
+        _recorder.record(events)
+    return events
 
 
 def poll():
+    if _player is not None:
+        return _player.next_event()
     event = ffi.new("SDL_Event[1]")
     if sdl.SDL_PollEvent(event):
-        return EventType(event[0])
-    return EventType(None)
+        event = EventType(event[0])
+    else:
+        event = EventType(None)
+    if _recorder is not None:
+        _recorder.record([event] if event else [])
+    return event
+
+
+def _is_blocked(event_type):
+    return sdl.SDL_EventState(event_type, sdl.SDL_QUERY) == sdl.SDL_IGNORE
 
 
 def post(event):
@@ -242,32 +518,72 @@ def post(event):
        place a new event on the queue"""
     # SDL requires video to be initialised before PushEvent does the right thing
     check_video()
-    is_blocked = sdl.SDL_EventState(event.type, sdl.SDL_QUERY) == sdl.SDL_IGNORE
-    if is_blocked:
+    if _is_blocked(event.type):
         # Silently drop blocked events, since that's what pygame does
         # (maybe worth logging somehow?)
         return None
 
     sdl_event = ffi.new("SDL_Event *")
-    sdl_event.type = event.type
-    sdl_event.user.code = _USEROBJECT_CHECK1
-    sdl_event.user.data1 = _USEROBJECT_CHECK2
-    sdl_event.user.data2 = ffi.cast("void*", sdl_event)
-    _user_events[sdl_event] = event
+    _store_user_event(sdl_event, event)
     if sdl.SDL_PushEvent(sdl_event) == -1:
+        _release_user_slot(_user_event_slot(sdl_event))
+        raise SDLError.from_sdl_error()
+
+
+def post_many(events):
+    """post_many(events): return None
+       place a sequence of new events on the queue
+
+    The events are added to the queue with a single SDL call. Blocked
+    events are dropped as with post(). If the queue fills up, the
+    remaining events are discarded and SDLError is raised.
+    """
+    check_video()
+    blocked = {}
+    to_post = []
+    for event in events:
+        if event.type not in blocked:
+            blocked[event.type] = _is_blocked(event.type)
+        if not blocked[event.type]:
+            to_post.append(event)
+    if not to_post:
+        return None
+
+    if (len(_free_user_slots) + _MAX_USER_EVENTS - len(_user_events) <
+            len(to_post)):
+        _purge_user_events()
+    sdl_events = ffi.new("SDL_Event[]", len(to_post))
+    stored = 0
+    try:
+        for event in to_post:
+            # purging now would free the slots of the events stored so far
+            _store_user_event(sdl_events[stored], event, purge=False)
+            stored += 1
+    except Exception:
+        # none of the events were posted, so free the slots taken so far
+        for i in range(stored):
+            _release_user_slot(_user_event_slot(sdl_events[i]))
+        raise
+    count = sdl.SDL_PeepEvents(sdl_events, len(to_post), sdl.SDL_ADDEVENT, 0)
+    for i in range(max(count, 0), len(to_post)):
+        _release_user_slot(_user_event_slot(sdl_events[i]))
+    if count < 0:
         raise SDLError.from_sdl_error()
+    if count < len(to_post):
+        raise SDLError("Event queue full")
 
 
 def clear(event_filter=None):
-    if event_filter is None:
-        # unfiltered list of events
-        mask = sdl.SDL_ALLEVENTS
-    else:
-        raise NotImplementedError("Implement me")
+    """ clear() -> None
+    clear(type) -> None
+    clear(typelist) -> None
+    remove all events from the queue
+    """
+    mask = _event_filter_mask(event_filter)
     sdl.SDL_PumpEvents()
-    event = ffi.new("SDL_Event *")
-    while sdl.SDL_PeepEvents(event, 1, sdl.SDL_GETEVENT, mask) == 1:
-        pass
+    for event in _get_events(mask):
+        if _is_user_object(event):
+            _release_user_slot(_user_event_slot(event))
 
 
 def set_grab(value):
@@ -313,10 +629,11 @@ def set_allowed(event_types):
 def set_blocked(event_types):
     if event_types is None:
         sdl.SDL_EventState(0xff, sdl.SDL_IGNORE)
-        return
-
-    for event_type in _event_types_iter(event_types):
-        sdl.SDL_EventState(event_type, sdl.SDL_IGNORE)
+    else:
+        for event_type in _event_types_iter(event_types):
+            sdl.SDL_EventState(event_type, sdl.SDL_IGNORE)
+    # SDL drops queued events of blocked types
+    _purge_user_events()
 
 
 def get_blocked(event_types):
@@ -331,6 +648,41 @@ def get_blocked(event_types):
     return is_blocked
 
 
+def set_coalesced(event_types):
+    """ set_coalesced(type) -> None
+    set_coalesced(typelist) -> None
+    set_coalesced(None) -> None
+    merge runs of motion events returned by get()
+
+    Consecutive MOUSEMOTION events are merged into one event with the
+    latest pos and buttons and the summed rel. Consecutive JOYAXISMOTION
+    events only keep the latest value for each joystick axis. Only these
+    two types can be coalesced; None turns coalescing off.
+    """
+    global _coalesce_mask
+    if event_types is None:
+        _coalesce_mask = 0
+        return
+    mask = 0
+    for event_type in _event_types_iter(event_types):
+        if event_type not in (MOUSEMOTION, JOYAXISMOTION):
+            raise ValueError("only MOUSEMOTION and JOYAXISMOTION events "
+                             "can be coalesced")
+        mask |= event_mask(event_type)
+    _coalesce_mask = mask
+
+
+def get_coalesced(event_types):
+    """ get_coalesced(type) -> bool
+    get_coalesced(typelist) -> bool
+    test if any of the event types are coalesced by get()
+    """
+    for event_type in _event_types_iter(event_types):
+        if _coalesce_mask & event_mask(event_type):
+            return True
+    return False
+
+
 def pump():
     sdl.SDL_PumpEvents()
 
@@ -339,34 +691,303 @@ def wait():
     """ wait() -> EventType instance
     wait for a single event from the queue
     """
+    if _player is not None:
+        return _player.next_event()
     event = ffi.new('SDL_Event*')
     if not sdl.SDL_WaitEvent(event):
         raise SDLError.from_sdl_error()
-    return EventType(event[0])
+    event = EventType(event[0])
+    if _recorder is not None:
+        _recorder.record([event])
+    return event
+
+
+# Seconds between checks of the event queue by the asyncio helpers
+ASYNC_POLL_INTERVAL = 0.005
+
+
+def _poll_async(fetch, poll_interval, loop):
+    """Return a future for the first value returned by fetch() that isn't
+    None, calling fetch on a loop timer until then"""
+    if loop is None:
+        loop = _get_event_loop()
+    future = _new_future(loop)
+
+    def check():
+        if future.cancelled():
+            return
+        try:
+            result = fetch()
+        except Exception as e:
+            future.set_exception(e)
+            return
+        if result is None:
+            loop.call_later(poll_interval, check)
+        else:
+            future.set_result(result)
+
+    check()
+    return future
+
+
+def wait_async(poll_interval=ASYNC_POLL_INTERVAL, loop=None):
+    """ wait_async(poll_interval=ASYNC_POLL_INTERVAL, loop=None) -> awaitable
+    wait for a single event without blocking the asyncio event loop
+
+    The queue is polled every poll_interval seconds until an event
+    arrives, so other tasks keep running while waiting.
+    """
+    def fetch():
+        event = poll()
+        if event:
+            return event
+        return None
+    return _poll_async(fetch, poll_interval, loop)
+
+
+class _AsyncEventIterator(object):
+    def __init__(self, event_filter, poll_interval, loop):
+        self._filter = event_filter
+        self._poll_interval = poll_interval
+        self._loop = loop
+        self._pending = deque()
+
+    def _fetch(self):
+        if not self._pending:
+            self._pending.extend(get(self._filter))
+        if self._pending:
+            return self._pending.popleft()
+        return None
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return _poll_async(self._fetch, self._poll_interval, self._loop)
+
+
+def aiter(event_filter=None, poll_interval=ASYNC_POLL_INTERVAL, loop=None):
+    """ aiter(type=None, poll_interval=ASYNC_POLL_INTERVAL, loop=None)
+    -> async iterator
+    iterate over events from the queue in an asyncio event loop
+
+    Use with "async for". Events are fetched in batches with get(type)
+    and the queue is polled every poll_interval seconds while it is
+    empty. The iterator never ends.
+    """
+    return _AsyncEventIterator(event_filter, poll_interval, loop)
 
 
 def peek(types=None):
     """ peek(type) -> bool
     test if event types are waiting on the queue
     """
-    mask = 0
     if not types:
         mask = sdl.SDL_ALLEVENTS
-    elif isinstance(types, int):
-        mask |= event_mask(types) 
-    elif hasattr(types, '__iter__'):
-        try:
-            for t in types:
-                mask |= event_mask(int(t))
-        except (ValueError, TypeError):
-            raise TypeError("type sequence must contain valid event types")
     else:
-        raise TypeError("peek type must be numeric or a sequence")
+        mask = _event_filter_mask(types)
 
     sdl.SDL_PumpEvents()
     event = ffi.new('SDL_Event*')
     result = sdl.SDL_PeepEvents(event, 1, sdl.SDL_PEEKEVENT, mask)
+    if result < 0:
+        raise SDLError.from_sdl_error()
 
     if not types:
+        if result == 1 and _is_user_object(event[0]):
+            # The event stays on the queue, so keep its slot
+            return Event(event.type, _get_user_event(event[0])._dict)
         return EventType(event[0])
     return result == 1
+
+
+# Event logs start with _LOG_MAGIC and the size of an SDL_Event, followed
+# by one record for each call to get(), poll() or wait(): the ticks at
+# the time of the call and the number of events returned, then for each
+# event its kind and the size and contents of its data.
+_LOG_MAGIC = b'PGEVLOG2'
+_LOG_HEADER = struct.Struct('<H')
+_LOG_CALL = struct.Struct('<IH')
+# posted events can carry any amount of pickled data
+_LOG_EVENT = struct.Struct('<BI')
+# The raw SDL_Event
+_LOG_SDL_EVENT = 0
+# A pickled (type, attribute dict) tuple, for events with python data
+_LOG_PYTHON_EVENT = 1
+
+_recorder = None
+_player = None
+
+
+class _EventLog(object):
+    def __init__(self, fileobj, mode):
+        if hasattr(fileobj, 'read') or hasattr(fileobj, 'write'):
+            self._file = fileobj
+            self._close_file = False
+        else:
+            self._file = open(fileobj, mode)
+            self._close_file = True
+
+    def close(self):
+        if self._close_file:
+            self._file.close()
+        self._file = None
+
+
+def _pickle_event(event_type, attrs):
+    """Pickle an event for the log, leaving out the attributes that can't
+    be pickled, since the events are already off the queue"""
+    try:
+        return pickle.dumps((event_type, attrs), 2)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        pass
+    kept = {}
+    for name, value in attrs.items():
+        try:
+            pickle.dumps(value, 2)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            continue
+        kept[name] = value
+    warnings.warn("Event attributes %s can't be recorded" %
+                  ', '.join(sorted(set(attrs) - set(kept))), RuntimeWarning)
+    return pickle.dumps((event_type, kept), 2)
+
+
+class _EventRecorder(_EventLog):
+    """Writes the events returned by get(), poll() and wait() to a log"""
+
+    def __init__(self, fileobj):
+        _EventLog.__init__(self, fileobj, 'wb')
+        self._file.write(_LOG_MAGIC +
+                         _LOG_HEADER.pack(ffi.sizeof("SDL_Event")))
+
+    def record(self, events):
+        data = [_LOG_CALL.pack(get_ticks() & 0xffffffff, len(events))]
+        for event in events:
+            if (isinstance(event, _SDLEventType) and
+                    not isinstance(event, _DropFileEventType)):
+                kind = _LOG_SDL_EVENT
+                payload = ffi.buffer(event._sdlevent)[:]
+            else:
+                kind = _LOG_PYTHON_EVENT
+                if isinstance(event, _DropFileEventType):
+                    attrs = {'code': event.code, 'filename': event.filename}
+                else:
+                    attrs = event._dict
+                payload = _pickle_event(event.type, attrs)
+            data.append(_LOG_EVENT.pack(kind, len(payload)))
+            data.append(payload)
+        self._file.write(b''.join(data))
+
+
+class _EventPlayer(_EventLog):
+    """Reads the events logged by _EventRecorder back"""
+
+    def __init__(self, fileobj):
+        _EventLog.__init__(self, fileobj, 'rb')
+        header = self._read(len(_LOG_MAGIC) + _LOG_HEADER.size)
+        if header is None or not header.startswith(_LOG_MAGIC):
+            raise ValueError("Not an event log")
+        event_size, = _LOG_HEADER.unpack(header[len(_LOG_MAGIC):])
+        if event_size != ffi.sizeof("SDL_Event"):
+            raise ValueError("Event log was recorded on an incompatible "
+                             "platform")
+
+    def _read(self, size):
+        data = self._file.read(size)
+        if len(data) < size:
+            return None
+        return data
+
+    def next_events(self):
+        """Return the events of the next call in the log, setting the
+        ticks to those of the call. Stops the replay at the end of the
+        log, or at a call that was cut off, as when the recording
+        program crashed."""
+        data = self._read(_LOG_CALL.size)
+        if data is None:
+            stop_replay()
+            return []
+        ticks, count = _LOG_CALL.unpack(data)
+        events = []
+        for i in range(count):
+            data = self._read(_LOG_EVENT.size)
+            if data is None:
+                stop_replay()
+                return []
+            kind, size = _LOG_EVENT.unpack(data)
+            payload = self._read(size)
+            if payload is None:
+                stop_replay()
+                return []
+            if kind == _LOG_SDL_EVENT:
+                sdl_event = ffi.new("SDL_Event *")
+                ffi.memmove(sdl_event, payload, size)
+                events.append(EventType(sdl_event[0]))
+            else:
+                event_type, attrs = pickle.loads(payload)
+                events.append(Event(event_type, attrs))
+        _set_virtual_ticks(ticks)
+        return events
+
+    def next_event(self):
+        events = self.next_events()
+        if events:
+            return events[0]
+        return EventType(None)
+
+
+def start_recording(fileobj):
+    """ start_recording(file) -> None
+    record the events returned by get, poll and wait to a log
+
+    file can be a filename or a file-like object opened for binary
+    writing. The value of pygame.time.get_ticks() is stored with each
+    call, so start_replay can reproduce the session.
+    """
+    global _recorder
+    stop_recording()
+    _recorder = _EventRecorder(fileobj)
+
+
+def stop_recording():
+    """ stop_recording() -> None
+    stop recording events
+    """
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+        _recorder = None
+
+
+def start_replay(fileobj):
+    """ start_replay(file) -> None
+    replay the events from a log written by start_recording
+
+    Each call to get, poll or wait returns the events of the next
+    recorded call instead of reading the event queue, and
+    pygame.time.get_ticks() returns the time logged with that call.
+    Once the log is exhausted, the replay stops and the real event
+    queue and clock are used again.
+    """
+    global _player
+    stop_replay()
+    _player = _EventPlayer(fileobj)
+
+
+def stop_replay():
+    """ stop_replay() -> None
+    stop replaying events and use the real event queue and clock again
+    """
+    global _player
+    if _player is not None:
+        _player.close()
+        _player = None
+    _set_virtual_ticks(None)
+
+
+def get_replaying():
+    """ get_replaying() -> bool
+    test if events are being replayed from a log
+    """
+    return _player is not None
@@ -29,7 +29,8 @@ from pygame.base import register_quit
 from pygame.color import Color
 from pygame.compat import bytes_, ord_, unicode_
 from pygame.pkgdata import getResource
-from pygame.rwobject import (rwops_from_file, rwops_encode_file_path,
+from pygame.rwobject import (PackMember, rwops_from_pack_member,
+                             rwops_from_file, rwops_encode_file_path,
                              rwops_from_file_path)
 from pygame.surface import Surface
 from pygame.sysfont import get_fonts, match_font, SysFont
@@ -117,6 +118,8 @@ class Font(object):
 
     _sdl_font = None
     _font_file = None
+    # keeps the pack of a font loaded from a PackMember mapped
+    _font_buffer = None
 
     def __init__(self, font, fontsize):
         check_font()
@@ -143,6 +146,11 @@ class Font(object):
             # exception
             f.close()
             self._sdl_font = sdl.TTF_OpenFont(filepath, fontsize)
+        elif isinstance(font, PackMember):
+            # SDL_ttf reads the font as it renders, so the memory must
+            # stay mapped for as long as the font is used
+            rwops, self._font_buffer = rwops_from_pack_member(font)
+            self._sdl_font = sdl.TTF_OpenFontRW(rwops, 1, fontsize)
         else:
             file_obj = font
 
@@ -21,16 +21,61 @@
 
 """ The pygame image module """
 
+import atexit
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from io import BytesIO
 from os import path
 
 from pygame._error import SDLError
 from pygame._sdl import sdl, ffi, get_sdl_byteorder
 from pygame._jpg import jpglib
 from pygame._png import pnglib
-from pygame.compat import chr_, string_types
-from pygame.rwobject import (rwops_encode_file_path, rwops_from_file,
-                             rwops_from_file_path)
-from pygame.surface import Surface, locked, BYTE0, BYTE1, BYTE2
+from pygame.compat import string_types
+from pygame.rwobject import (PackMember, rwops_encode_file_path,
+                             rwops_from_buffer, rwops_from_file,
+                             rwops_from_file_path, rwops_from_pack_member)
+from pygame.surface import Surface, SubSurfaceData, locked
+
+try:
+    from multiprocessing import cpu_count
+except ImportError:
+    cpu_count = None
+
+try:
+    import queue
+except ImportError:
+    # Python 2
+    import Queue as queue
+
+try:
+    _replace = os.replace
+except AttributeError:
+    # Python 2
+    _replace = os.rename
+
+
+def _supports_buffer(obj):
+    try:
+        memoryview(obj)
+    except TypeError:
+        return False
+    return True
+
+
+def _load_rw(rwops, namehint):
+    """Load an image from rwops, which is freed. The extension of
+    namehint tells SDL_image the format of the image."""
+    name, ext = path.splitext(namehint)
+    if len(ext) == 0:
+        # An empty extension tells SDL that we can only load files with
+        # suitable magic format markers in the file.
+        ext = name
+    ext = rwops_encode_file_path(ext)
+    return sdl.IMG_LoadTyped_RW(rwops, 1, ext)
 
 
 def load(filename, namehint=""):
@@ -38,22 +83,21 @@ def load(filename, namehint=""):
         filename = rwops_encode_file_path(filename)
         c_surface = sdl.IMG_Load(filename)
     except SDLError:
-        # filename is not a string, try as file object
+        # filename is not a string, try as a pack member, buffer or
+        # file object
+        if isinstance(filename, PackMember):
+            rwops, base = rwops_from_pack_member(filename)
+            c_surface = _load_rw(rwops, namehint or filename.name)
+            if not c_surface:
+                raise SDLError(ffi.string(sdl.IMG_GetError()))
+            return Surface._from_sdl_surface(c_surface)
+        if _supports_buffer(filename):
+            return load_bytes(filename, namehint)
         try:
             rwops = rwops_from_file(filename)
-            if namehint:
-                name, ext = path.splitext(namehint)
-            elif hasattr(filename, 'name'):
-                name, ext = path.splitext(filename.name)
-            else:
-                # No name info, so we pass an empty extension to
-                # SDL to indicate we can only load files with
-                # suitable magic format markers in the file.
-                name, ext = '', ''
-            if len(ext) == 0:
-                ext = name
-            ext = rwops_encode_file_path(ext)
-            c_surface = sdl.IMG_LoadTyped_RW(rwops, 1, ext)
+            if not namehint and hasattr(filename, 'name'):
+                namehint = filename.name
+            c_surface = _load_rw(rwops, namehint)
         except TypeError:
             raise TypeError("file argument must be a valid path "
                             "string or file object")
@@ -62,66 +106,458 @@ def load(filename, namehint=""):
     return Surface._from_sdl_surface(c_surface)
 
 
-def save(surface, filename):
-    """ save(Surface, filename) -> None
+def load_bytes(data, namehint=""):
+    """ load_bytes(data, namehint="") -> Surface
+    load new image from the contents of an image file in memory
+
+    data can be bytes or any object supporting the buffer protocol,
+    such as a bytearray, memoryview or mmap. It's decoded in place, so
+    SDL_image never calls back into Python. The extension of namehint
+    gives the image format, otherwise it's detected from the data.
+    """
+    # buf keeps the memory alive while SDL_image reads it
+    rwops, buf = rwops_from_buffer(data)
+    c_surface = _load_rw(rwops, namehint)
+    if not c_surface:
+        raise SDLError(ffi.string(sdl.IMG_GetError()))
+    return Surface._from_sdl_surface(c_surface)
+
+
+def _default_workers():
+    try:
+        return cpu_count()
+    except (TypeError, NotImplementedError):
+        # no multiprocessing module, or the count is unknown
+        return 1
+
+
+def _load_item(item):
+    if isinstance(item, tuple):
+        return load_bytes(*item)
+    return load(item)
+
+
+def load_many(files, workers=None, convert=False):
+    """ load_many(files, workers=None, convert=False) -> list
+    load many images at once
+
+    Each item of files is anything load() takes, or a (data, namehint)
+    pair for load_bytes(). The images are decoded by workers threads,
+    by default one per CPU, which run in parallel since SDL_image is
+    called without the GIL. The Surfaces are returned in the order of
+    files. With convert, they are converted to the display format
+    afterwards, using convert_alpha() for images with per-pixel alpha.
+    If an image can't be loaded, the first error is raised once all of
+    the images are done.
+    """
+    files = list(files)
+    if workers is None:
+        workers = _default_workers()
+    workers = max(min(workers, len(files)), 1)
+    results = [None] * len(files)
+    next_index = [0]
+    lock = threading.Lock()
+    # SDL_image loads its format libraries lazily on first use, which
+    # isn't thread safe, so do it here before the workers start
+    sdl.IMG_Init(sdl.IMG_INIT_JPG | sdl.IMG_INIT_PNG | sdl.IMG_INIT_TIF)
+
+    def work():
+        while True:
+            with lock:
+                index = next_index[0]
+                next_index[0] += 1
+            if index >= len(files):
+                return
+            try:
+                results[index] = _load_item(files[index])
+            except Exception as e:
+                results[index] = e
+
+    if workers == 1:
+        work()
+    else:
+        threads = [threading.Thread(target=work) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    if convert:
+        results = [surf.convert_alpha() if surf.get_masks()[3]
+                   else surf.convert() for surf in results]
+    return results
+
+
+def load_sheet(file, frame_size, count=None, convert=True, copy=False):
+    """ load_sheet(file, frame_size, count=None, convert=True, copy=False)
+        -> list
+    load the frames of a sprite sheet
+
+    file is anything load() takes. The sheet is cut into frames of
+    frame_size, taken left to right and top to bottom, ignoring any
+    partial frames at the right and bottom edges, and the first count
+    frames are returned, or all of them. With convert, the sheet is
+    converted to the display format first, using convert_alpha() if it
+    has per-pixel alpha. The frames are subsurfaces sharing the pixels
+    of the sheet, or with copy, Surfaces with their own pixels. Either
+    way, they're all made by a single call into C.
+    """
+    sheet = load(file)
+    if convert:
+        sheet = (sheet.convert_alpha() if sheet.get_masks()[3]
+                 else sheet.convert())
+    frame_w, frame_h = int(frame_size[0]), int(frame_size[1])
+    if frame_w < 1 or frame_h < 1:
+        raise ValueError("frame size must be positive")
+    surf = sheet._c_surface
+    columns = surf.w // frame_w
+    frames = columns * (surf.h // frame_h)
+    if count is None:
+        count = frames
+    elif not 0 <= count <= frames:
+        raise ValueError("sheet only has %d frames" % frames)
+    if count == 0:
+        return []
+
+    c_frames = ffi.new('SDL_Surface*[]', count)
+    with locked(surf):
+        if sdl.image_slice_frames(surf, frame_w, frame_h, count, copy,
+                                  c_frames) == -1:
+            raise SDLError.from_sdl_error()
+    bpp = surf.format.BytesPerPixel
+    result = []
+    for i in range(count):
+        frame = Surface._from_sdl_surface(c_frames[i])
+        if not copy:
+            x = (i % columns) * frame_w
+            y = (i // columns) * frame_h
+            frame.subsurfacedata = SubSurfaceData(
+                sheet, y * surf.pitch + x * bpp, x, y)
+        result.append(frame)
+    return result
+
+
+# A SurfaceCache file is a header followed by the pixel rows
+_CACHE_MAGIC = b'PGSURF01'
+_cache_header = struct.Struct('=8s11I')
+_CACHE_HEADER_SIZE = 64
+_CACHE_SUFFIX = '.surf'
+
+
+class SurfaceCache(object):
+    """ SurfaceCache(directory, max_size=256MB, hash_contents=False)
+    cache of decoded and converted images on disk
+
+    Images loaded through the cache are stored in directory as raw
+    pixels in the format they were converted to. Later loads map the
+    file into memory and use it as the pixels of the Surface, so the
+    image isn't decoded again. Drawing on such a Surface doesn't change
+    the cache file.
+
+    Entries are looked up by the absolute path of the image, its
+    modification time and size, or a hash of its contents with
+    hash_contents, and the display format. When the cache grows past
+    max_size bytes, the least recently used entries are removed. 8 bit
+    images are only cached once converted, so a display mode should be
+    set first.
+
+    The size and last use of the cache files are read from directory
+    once and then kept in memory, so files added by other processes
+    sharing the directory are only counted once loaded from it.
+    """
+
+    def __init__(self, directory, max_size=256 * 1024 * 1024,
+                 hash_contents=False):
+        if not path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.max_size = max_size
+        self.hash_contents = hash_contents
+        # cache path -> [last use, size] of the cache files, with the
+        # uses numbered by _uses, or None until the directory is read
+        self._index = None
+        self._uses = 0
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def _cache_path(self, filename, alpha):
+        if self.hash_contents:
+            with open(filename, 'rb') as f:
+                source = hashlib.sha1(f.read()).hexdigest()
+        else:
+            st = os.stat(filename)
+            source = (st.st_mtime, st.st_size)
+        screen = sdl.SDL_GetVideoSurface()
+        if screen:
+            fmt = screen.format
+            target = (fmt.BitsPerPixel, fmt.Rmask, fmt.Gmask, fmt.Bmask,
+                      fmt.Amask)
+        else:
+            target = None
+        key = repr((path.abspath(filename), source, target, alpha))
+        return path.join(self.directory,
+                         hashlib.sha1(key.encode('utf-8')).hexdigest() +
+                         _CACHE_SUFFIX)
+
+    def _read(self, cache_path):
+        with open(cache_path, 'rb') as f:
+            # changes to the Surface stay in memory
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        (magic, w, h, pitch, depth, rmask, gmask, bmask, amask, flags,
+         colorkey, alpha) = _cache_header.unpack_from(mapped)
+        if (magic != _CACHE_MAGIC or
+                len(mapped) < _CACHE_HEADER_SIZE + pitch * h):
+            raise ValueError("Damaged cache file")
+        data = ffi.from_buffer(mapped)
+        c_surface = sdl.SDL_CreateRGBSurfaceFrom(data + _CACHE_HEADER_SIZE,
+                                                 w, h, depth, pitch, rmask,
+                                                 gmask, bmask, amask)
+        if not c_surface:
+            raise SDLError.from_sdl_error()
+        surface = Surface._from_sdl_surface(c_surface)
+        surface._pixel_buffer = (mapped, data)
+        if flags & sdl.SDL_SRCCOLORKEY:
+            sdl.SDL_SetColorKey(c_surface, sdl.SDL_SRCCOLORKEY, colorkey)
+        sdl.SDL_SetAlpha(c_surface, flags & sdl.SDL_SRCALPHA, alpha)
+        return surface
+
+    def _write(self, cache_path, surface):
+        c_surface = surface._c_surface
+        fmt = c_surface.format
+        if fmt.BytesPerPixel == 1:
+            # palettes aren't stored
+            return
+        header = _cache_header.pack(
+            _CACHE_MAGIC, c_surface.w, c_surface.h, c_surface.pitch,
+            fmt.BitsPerPixel, fmt.Rmask, fmt.Gmask, fmt.Bmask, fmt.Amask,
+            c_surface.flags & (sdl.SDL_SRCCOLORKEY | sdl.SDL_SRCALPHA),
+            fmt.colorkey, fmt.alpha)
+        tmp_path = '%s.%d.%d.tmp' % (cache_path, os.getpid(),
+                                     threading.current_thread().ident)
+        size = c_surface.pitch * c_surface.h
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(header.ljust(_CACHE_HEADER_SIZE, b'\0'))
+                with locked(c_surface):
+                    f.write(ffi.buffer(c_surface.pixels, size))
+            _replace(tmp_path, cache_path)
+        except (IOError, OSError):
+            # the image just isn't cached
+            if path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._used(cache_path, _CACHE_HEADER_SIZE + size)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(_CACHE_SUFFIX):
+                continue
+            cache_path = path.join(self.directory, name)
+            try:
+                st = os.stat(cache_path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, cache_path))
+        return entries
+
+    def _get_index(self):
+        """Return the index of the cache files, reading the directory the
+        first time. The caller holds _lock."""
+        if self._index is None:
+            self._index = {}
+            self._total = 0
+            for mtime, size, cache_path in sorted(self._entries()):
+                self._uses += 1
+                self._index[cache_path] = [self._uses, size]
+                self._total += size
+        return self._index
+
+    def _used(self, cache_path, size):
+        """Record a use of a cache file of size bytes"""
+        with self._lock:
+            index = self._get_index()
+            entry = index.get(cache_path)
+            if entry is not None:
+                self._total -= entry[1]
+            self._uses += 1
+            index[cache_path] = [self._uses, size]
+            self._total += size
+
+    def _evict(self):
+        with self._lock:
+            index = self._get_index()
+            if self._total <= self.max_size:
+                return
+            entries = sorted((used, size, cache_path)
+                             for cache_path, (used, size) in index.items())
+            for used, size, cache_path in entries:
+                if self._total <= self.max_size:
+                    break
+                try:
+                    os.remove(cache_path)
+                except OSError:
+                    if path.exists(cache_path):
+                        # still mapped on Windows
+                        continue
+                del index[cache_path]
+                self._total -= size
+
+    def load(self, filename, alpha=None):
+        """ load(filename, alpha=None) -> Surface
+        load an image from a file through the cache
+
+        When a display mode is set, new images are converted with
+        convert_alpha() if alpha is True or, with None, if they have
+        per-pixel alpha, and with convert() otherwise.
+        """
+        cache_path = self._cache_path(filename, alpha)
+        try:
+            surface = self._read(cache_path)
+        except (IOError, OSError, ValueError, struct.error):
+            # not cached yet, or a damaged file which is replaced
+            pass
+        else:
+            try:
+                # for finding the least recently used entries once the
+                # directory is read again
+                os.utime(cache_path, None)
+            except OSError:
+                pass
+            self._used(cache_path, len(surface._pixel_buffer[0]))
+            return surface
+
+        surface = load(filename)
+        if sdl.SDL_GetVideoSurface():
+            if alpha or (alpha is None and surface.get_masks()[3]):
+                surface = surface.convert_alpha()
+            else:
+                surface = surface.convert()
+        self._write(cache_path, surface)
+        self._evict()
+        return surface
+
+    def get_size(self):
+        """ get_size() -> bytes
+        the size of the cache files
+        """
+        with self._lock:
+            self._get_index()
+            return self._total
+
+    def clear(self):
+        """ clear() -> None
+        remove all of the cache files
+        """
+        with self._lock:
+            for mtime, size, cache_path in self._entries():
+                try:
+                    os.remove(cache_path)
+                except OSError:
+                    pass
+            # files that couldn't be removed are found again when needed
+            self._index = None
+
+
+def _save_format(filename):
+    fn_normalized = filename.lower()
+    if fn_normalized.endswith(b'bmp'):
+        return 'bmp'
+    elif (fn_normalized.endswith(b'jpg')
+          or fn_normalized.endswith(b'jpeg')):
+        return 'jpg'
+    elif fn_normalized.endswith(b'png'):
+        return 'png'
+    return 'tga'
+
+
+def _check_save_options(quality, compression):
+    if not 0 <= quality <= 100:
+        raise ValueError("quality must be between 0 and 100")
+    if not -1 <= compression <= 9:
+        raise ValueError("compression must be between 0 and 9, or -1")
+
+
+def save(surface, file, namehint="", quality=85, compression=-1):
+    """ save(Surface, file, namehint="", quality=85, compression=-1) -> None
     save an image to disk
+
+    file is a filename, or a file object that the image is written to.
+    The format is picked from the filename's extension, or for a file
+    object from namehint or the object's name, falling back to TGA.
+    quality is used for JPEG files, and compression is the zlib level
+    from 0 to 9 for PNG files, -1 picking libpng's default.
     """
     surf = surface._c_surface
     if surf.flags & sdl.SDL_OPENGL:
         raise NotImplementedError()
-    if not isinstance(filename, string_types):
-        raise TypeError("Expected a string for the file arugment: got %s"
-                        % type(filename).__name__)
-
-    filename = rwops_encode_file_path(filename)
-    fn_normalized = filename.lower()
+    if not isinstance(file, string_types):
+        if not hasattr(file, 'write'):
+            raise TypeError("Expected a string or file object for the file "
+                            "argument: got %s" % type(file).__name__)
+        if not namehint:
+            namehint = getattr(file, 'name', '')
+            if not isinstance(namehint, string_types):
+                # the file descriptor of a file opened with os.fdopen()
+                namehint = ''
+        file.write(save_bytes(surface, namehint, quality, compression))
+        return
+    _check_save_options(quality, compression)
+
+    filename = rwops_encode_file_path(file)
+    format = _save_format(filename)
     result = 0
     # TODO: prep/unprep surface
-    if fn_normalized.endswith(b'bmp'):
-        # save as BMP
+    if format == 'bmp':
         result = sdl.SDL_SaveBMP(surf, filename)
-    elif (fn_normalized.endswith(b'jpg')
-          or fn_normalized.endswith(b'jpeg')):
-        # save as JPEG
-        result = save_jpg(surf, filename)
-    elif fn_normalized.endswith(b'png'):
-        # save as PNG
-        result = save_png(surf, filename)
+    elif format == 'jpg':
+        result = save_jpg(surf, filename, quality)
+    elif format == 'png':
+        result = save_png(surf, filename, compression)
     else:
-        # save as TGA
         result = save_tga(surf, filename, True)
     if result == -1:
         raise SDLError.from_sdl_error()
 
 
-class opaque(object):
-    '''
-    Removes color key and alpha from surface so that
-    copies are opaque.
-    '''
-    def __init__(self, c_surface):
-        self.c_surface = c_surface
-        self.flags = 0
-        self.alpha = 0
-        self.colorkey = 0
+class _SaveBuffer(BytesIO):
+    # SDL_RWclose closes the file object, but the data is still needed
+    def close(self):
+        pass
 
-    def __enter__(self):
-        self.flags = self.c_surface.flags & (sdl.SDL_SRCALPHA |
-                                             sdl.SDL_SRCCOLORKEY)
-        self.alpha = self.c_surface.format.alpha
-        self.colorkey = self.c_surface.format.colorkey
-        if self.flags & sdl.SDL_SRCALPHA:
-            sdl.SDL_SetAlpha(self.c_surface, 0, 255)
-        if self.flags & sdl.SDL_SRCCOLORKEY:
-            sdl.SDL_SetColorKey(self.c_surface, 0,
-                                self.c_surface.format.colorkey)
 
-    def __exit__(self, *args):
-        if self.flags & sdl.SDL_SRCALPHA:
-            sdl.SDL_SetAlpha(self.c_surface, sdl.SDL_SRCALPHA, self.alpha)
-        if self.flags & sdl.SDL_SRCCOLORKEY:
-            sdl.SDL_SetColorKey(self.c_surface, sdl.SDL_SRCCOLORKEY,
-                                self.colorkey)
+def save_bytes(surface, namehint, quality=85, compression=-1):
+    """ save_bytes(Surface, namehint, quality=85, compression=-1) -> bytes
+    save an image to a string
+
+    Returns the image file that save() would write, the format being
+    picked from the extension of namehint, such as "png" or "shot.jpg".
+    PNG and JPEG images are encoded in memory by libpng and libjpeg.
+    """
+    surf = surface._c_surface
+    if surf.flags & sdl.SDL_OPENGL:
+        raise NotImplementedError()
+    _check_save_options(quality, compression)
+
+    format = _save_format(rwops_encode_file_path(namehint))
+    if format == 'jpg':
+        return save_jpg(surf, None, quality)
+    elif format == 'png':
+        return save_png(surf, None, compression)
+
+    out = _SaveBuffer()
+    rwops = rwops_from_file(out)
+    if format == 'bmp':
+        result = sdl.SDL_SaveBMP_RW(surf, rwops, 0)
+    else:
+        result = sdl._pygame_SaveTGA_RW(surf, rwops, 1)
+    sdl.SDL_RWclose(rwops)
+    if result == -1:
+        raise SDLError.from_sdl_error()
+    return out.getvalue()
 
 
 def save_tga(surf, filename, rle=False):
@@ -131,442 +567,418 @@ def save_tga(surf, filename, rle=False):
     return result
 
 
-def save_jpg(surf, filename):
-    if (surf.format.BytesPerPixel == 3
-            and not (surf.flags & sdl.SDL_SRCALPHA)
-            and surf.format.Rshift == 0):
-        ss_surf = surf
-    else:
-        if get_sdl_byteorder() == sdl.SDL_LIL_ENDIAN:
-            rmask, gmask, bmask, amask = 0xff, 0xff00, 0xff0000, 0xff000000
-        else:
-            rmask, gmask, bmask, amask = 0xff00, 0xff, 0xff0000, 0xff000000
-        ss_surf = sdl.SDL_CreateRGBSurface(sdl.SDL_SWSURFACE, surf.w, surf.h,
-                                           24, rmask, gmask, bmask, amask)
-        if not ss_surf:
-            return -1
-        rect = ffi.new('SDL_Rect*')
-        rect.w = surf.w
-        rect.h = surf.h
-        sdl.SDL_BlitSurface(surf, rect, ss_surf, ffi.NULL)
-
-    ss_rows = ffi.new('unsigned char*[]', surf.h)
-    ss_pixels = ffi.cast('unsigned char*', ss_surf.pixels)
-    for i in range(surf.h):
-        ss_rows[i] = ss_pixels + i * ss_surf.pitch
-    err_msg = ffi.new('char**')
-    result = jpglib.write_jpeg(filename, ss_rows, surf.w, surf.h, 85, err_msg)
+def _take_encoded(lib, data, size):
+    try:
+        return ffi.buffer(data[0], size[0])[:]
+    finally:
+        lib.free(data[0])
+
 
-    if ss_surf is not surf:
-        sdl.SDL_FreeSurface(ss_surf)
+# _write_jpeg and _write_png return the encoded image if filename is None
+
+def _write_jpeg(filename, pixels, pitch, w, h, quality):
+    err_msg = ffi.new('char**')
+    pixels = ffi.cast('unsigned char*', pixels)
+    if filename is None:
+        data = ffi.new('unsigned char**')
+        size = ffi.new('size_t*')
+        result = jpglib.write_jpeg_mem(pixels, pitch, w, h, quality,
+                                       data, size, err_msg)
+    else:
+        result = jpglib.write_jpeg(filename, pixels, pitch, w, h, quality,
+                                   err_msg)
     if result == -1:
         raise IOError("JPGError: %s" % ffi.string(err_msg[0]))
+    if filename is None:
+        return _take_encoded(jpglib, data, size)
     return result
 
 
-def save_png(surf, filename):
-    alpha = bool(surf.format.Amask)
-    if get_sdl_byteorder() == sdl.SDL_LIL_ENDIAN:
-        rmask, gmask, bmask, amask = 0xff, 0xff00, 0xff0000, 0xff000000
-    else:
-        rmask, gmask, bmask, amask = 0xff00, 0xff0000, 0xff, 0x000000ff
-    ss_surf = sdl.SDL_CreateRGBSurface(sdl.SDL_SWSURFACE | sdl.SDL_SRCALPHA,
-                                       surf.w, surf.h, 32 if alpha else 24,
-                                       rmask, gmask, bmask, amask)
-    if not ss_surf:
-        return -1
-    with opaque(surf):
-        rect = ffi.new('SDL_Rect*')
-        rect.w = surf.w
-        rect.h = surf.h
-        sdl.SDL_BlitSurface(surf, rect, ss_surf, ffi.NULL)
-
-    ss_rows = ffi.new('unsigned char*[]', surf.h)
-    ss_pixels = ffi.cast('unsigned char*', ss_surf.pixels)
-    for i in range(surf.h):
-        ss_rows[i] = ss_pixels + i * ss_surf.pitch
+def _write_png(filename, pixels, w, h, alpha, compression):
     err_msg = ffi.new('char**')
-    result = pnglib.write_png(filename, ss_rows, surf.w, surf.h,
-                              (pnglib.PNG_COLOR_TYPE_RGB_ALPHA if alpha else
-                               pnglib.PNG_COLOR_TYPE_RGB), 8, err_msg)
-
-    sdl.SDL_FreeSurface(ss_surf)
+    args = (ffi.cast('unsigned char*', pixels), w * (4 if alpha else 3), w, h,
+            (pnglib.PNG_COLOR_TYPE_RGB_ALPHA if alpha else
+             pnglib.PNG_COLOR_TYPE_RGB), 8, compression)
+    if filename is None:
+        data = ffi.new('unsigned char**')
+        size = ffi.new('size_t*')
+        result = pnglib.write_png_mem(*(args + (data, size, err_msg)))
+    else:
+        result = pnglib.write_png(filename, *(args + (err_msg,)))
     if result == -1:
         raise IOError("PNGError: %s" % ffi.string(err_msg[0]))
+    if filename is None:
+        return _take_encoded(pnglib, data, size)
     return result
 
 
-def fromstring(string, size, format, flipped=False):
-    w, h = size
-    if w < 1 or h < 1:
-        raise ValueError("Resolution must be positive values")
-
-    if format == "P":
-        if len(string) != w * h:
-            raise ValueError("String length does not equal format and "
-                             "resolution size")
-        surf = sdl.SDL_CreateRGBSurface(0, w, h, 8, 0, 0, 0, 0)
-        if not surf:
-            raise SDLError.from_sdl_error()
+def save_jpg(surf, filename, quality=85):
+    if (surf.format.BytesPerPixel == 3
+            and not (surf.flags & sdl.SDL_SRCALPHA)
+            and surf.format.Rshift == 0):
+        # already packed RGB, so encode straight from the surface
         with locked(surf):
-            pixels = ffi.cast('char*', surf.pixels)
-            for y in range(h):
-                dest =  surf.pitch * y
-                src_start = (h - 1 - y) * w if flipped else y * w
-                pixels[dest:dest + w] = string[src_start:src_start + w]
+            return _write_jpeg(filename, surf.pixels, surf.pitch,
+                               surf.w, surf.h, quality)
+    pixels = ffi.new('unsigned char[]', 3 * surf.w * surf.h)
+    _tostring_into(surf, "RGB", pixels, False)
+    return _write_jpeg(filename, pixels, 3 * surf.w, surf.w, surf.h,
+                       quality)
 
-    elif format == "RGB":
-        if len(string) != w * h * 3:
-            raise ValueError("String length does not equal format and "
-                             "resolution size")
-        surf = sdl.SDL_CreateRGBSurface(0, w, h, 24, 0xff, 0xff << 16,
-                                        0xff << 8, 0)
-        if not surf:
-            raise SDLError.from_sdl_error()
-        with locked(surf):
-            pixels = ffi.cast("char*", surf.pixels)
-            for y in range(h):
-                dest = surf.pitch * y
-                src_start = (h - 1 - y) * w * 3 if flipped else y * w * 3
-                row = string[src_start:src_start + w * 3]
-                for x in range(0, w * 3, 3):
-                    # BYTE0, BYTE1 and BYTE2 are determined by byte order
-                    pixels[dest + x + BYTE0] = row[x + BYTE0]
-                    pixels[dest + x + BYTE1] = row[x + BYTE1]
-                    pixels[dest + x + BYTE2] = row[x + BYTE2]
-
-    elif format in ("RGBA", "RGBAX", "ARGB"):
-        if len(string) != w * h * 4:
-            raise ValueError("String length does not equal format and "
-                             "resolution size")
-        if format == "ARGB":
-            if get_sdl_byteorder() == sdl.SDL_LIL_ENDIAN:
-                rmask, gmask, bmask, amask = (0xff << 8, 0xff << 16,
-                                              0xff << 24, 0xff)
-            else:
-                rmask, gmask, bmask, amask = (0xff << 16, 0xff << 8,
-                                              0xff, 0xff << 24)
-            surf = sdl.SDL_CreateRGBSurface(sdl.SDL_SRCALPHA, w, h, 32,
-                                            rmask, gmask, bmask, amask)
+
+def save_png(surf, filename, compression=-1):
+    # colorkey and surface alpha are left out, like SDL_BlitSurface
+    # without SDL_SRCALPHA
+    alpha = bool(surf.format.Amask)
+    pixels = ffi.new('unsigned char[]', (4 if alpha else 3) *
+                     surf.w * surf.h)
+    _tostring_into(surf, "RGBA" if alpha else "RGB", pixels, False)
+    return _write_png(filename, pixels, surf.w, surf.h, alpha, compression)
+
+
+class FrameWriter(object):
+    """ FrameWriter(workers=1, max_pending=4, quality=85, compression=-1)
+    save images on background threads
+
+    save() copies the pixels of a Surface and returns, leaving
+    the PNG or JPEG encoding to the worker threads, which run without
+    the GIL. BMP and TGA images are encoded by save() itself and only
+    written to disk by the workers. At most max_pending images are
+    queued at a time; once that many are waiting, save() blocks until
+    one is written. The pixel buffers are reused between frames.
+    quality and compression are as for pygame.image.save().
+    """
+
+    def __init__(self, workers=1, max_pending=4, quality=85, compression=-1):
+        _check_save_options(quality, compression)
+        if workers < 1 or max_pending < 1:
+            raise ValueError("workers and max_pending must be positive")
+        self.quality = quality
+        self.compression = compression
+        self._max_pending = max_pending
+        self._slots = threading.Semaphore(max_pending)
+        self._jobs = queue.Queue()
+        self._buffers = []
+        self._errors = []
+        self._pending = 0
+        self._done = threading.Condition()
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _get_buffer(self, size):
+        with self._done:
+            for i, buf in enumerate(self._buffers):
+                if len(buf) >= size:
+                    return self._buffers.pop(i)
+        return ffi.new('unsigned char[]', size)
+
+    def _snapshot(self, surface, filename, format):
+        surf = surface._c_surface
+        if format == 'jpg':
+            alpha = False
+        elif format == 'png':
+            alpha = bool(surf.format.Amask)
         else:
-            alphamult = format == "RGBA"
-            if get_sdl_byteorder() == sdl.SDL_LIL_ENDIAN:
-                rmask, gmask, bmask = 0xff, 0xff << 8, 0xff << 16
-                amask = 0xff << 24 if alphamult else 0
-            else:
-                rmask, gmask, bmask = 0xff << 24, 0xff << 16, 0xff << 8
-                amask = 0xff if alphamult else 0
-            surf = sdl.SDL_CreateRGBSurface(sdl.SDL_SRCALPHA if alphamult
-                                            else 0, w, h, 32, rmask, gmask,
-                                            bmask, amask)
-        if not surf:
-            raise SDLError.from_sdl_error()
-        with locked(surf):
-            pixels = ffi.cast("char*", surf.pixels)
-            for y in range(h):
-                dest = surf.pitch * y
-                src_start = (h - 1 - y) * w * 4 if flipped else y * w * 4
-                pixels[dest:dest + w * 4]  = string[src_start:src_start + w * 4]
+            # BMP and TGA are cheap to encode, and encoding them here keeps
+            # SDL, and its global error message, off the worker threads
+            return (format, filename, save_bytes(surface, format))
+        pixels = self._get_buffer((4 if alpha else 3) * surf.w * surf.h)
+        _tostring_into(surf, "RGBA" if alpha else "RGB", pixels, False)
+        return (format, filename, pixels, surf.w, surf.h, alpha)
+
+    def _encode(self, job):
+        format, filename = job[:2]
+        if format == 'jpg':
+            pixels, w, h = job[2:5]
+            _write_jpeg(filename, pixels, 3 * w, w, h, self.quality)
+        elif format == 'png':
+            _write_png(filename, *(job[2:] + (self.compression,)))
+        else:
+            with open(filename, 'wb') as f:
+                f.write(job[2])
+
+    def _work(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            try:
+                self._encode(job)
+            except Exception as e:
+                with self._done:
+                    self._errors.append(e)
+            finally:
+                with self._done:
+                    if (job[0] in ('jpg', 'png') and
+                            len(self._buffers) < self._max_pending):
+                        self._buffers.append(job[2])
+                    self._pending -= 1
+                    self._done.notify_all()
+                self._slots.release()
+
+    def save(self, surface, filename):
+        """ save(Surface, filename) -> None
+        queue an image to be saved
+
+        The format is picked from the file extension, as for
+        pygame.image.save(). Errors are raised by flush().
+        """
+        surf = surface._c_surface
+        if surf.flags & sdl.SDL_OPENGL:
+            raise NotImplementedError()
+        if not isinstance(filename, string_types):
+            raise TypeError("Expected a string for the file arugment: got %s"
+                            % type(filename).__name__)
+        if not self._threads:
+            raise ValueError("FrameWriter is closed")
+        filename = rwops_encode_file_path(filename)
+        format = _save_format(filename)
 
-    else:
-        raise ValueError("Unrecognized type of format")
+        self._slots.acquire()
+        try:
+            job = self._snapshot(surface, filename, format)
+        except:
+            self._slots.release()
+            raise
+        with self._done:
+            self._pending += 1
+        self._jobs.put(job)
+
+    def flush(self):
+        """ flush() -> None
+        wait for the queued images to be written
+
+        The first error from saving any of them is raised.
+        """
+        with self._done:
+            while self._pending:
+                self._done.wait()
+            errors, self._errors = self._errors, []
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        """ close() -> None
+        write the queued images and stop the worker threads
+        """
+        try:
+            self.flush()
+        finally:
+            threads, self._threads = self._threads, []
+            for thread in threads:
+                self._jobs.put(None)
+            for thread in threads:
+                thread.join()
 
-    return Surface._from_sdl_surface(surf)
 
+_async_writer = None
+_async_writer_lock = threading.Lock()
 
-def tostring(surface, format, flipped=False):
-    """ tostring(Surface, format, flipped=False) -> string
-    transfer image to string buffer
+
+def save_async(surface, filename):
+    """ save_async(Surface, filename) -> FrameWriter
+    save an image to disk in the background
+
+    The image is saved by a FrameWriter shared by all callers, which is
+    returned so that its flush() can be used to wait for the file and
+    see any error. Queued images are written before the interpreter
+    exits.
     """
-    surf = surface._c_surface
-    if surf.flags & sdl.SDL_OPENGL:
-        raise NotImplementedError()
+    global _async_writer
+    with _async_writer_lock:
+        if _async_writer is None:
+            _async_writer = FrameWriter()
+    _async_writer.save(surface, filename)
+    return _async_writer
+
+
+@atexit.register
+def _atexit_flush():
+    if _async_writer is not None:
+        try:
+            _async_writer.flush()
+        except Exception:
+            # nobody is left to report the error to
+            pass
+
 
+def _string_format(format):
+    """Return the bytes per pixel, Surface flags and masks of a Surface
+    whose pixels are laid out like format"""
+    lil_endian = get_sdl_byteorder() == sdl.SDL_LIL_ENDIAN
     if format == "P":
-        if surf.format.BytesPerPixel != 1:
-            raise ValueError("Can only create \"P\" format data with "
-                             "8bit Surfaces")
-        with locked(surf):
-            string = ffi.buffer(ffi.cast('char*', surf.pixels))[:]
-    else:
-        _tostring = globals().get('_tostring_%s' % format, None)
-        if _tostring is None:
-            raise ValueError("Unrecognized type of format")
-        with locked(surf):
-            string = _tostring(surf, flipped)
-    return string
-
-
-def _tostring_RGBA(surf, flipped, has_colorkey=True, argb=False):
-    rmask, gmask, bmask, amask = (surf.format.Rmask,
-                                  surf.format.Gmask,
-                                  surf.format.Bmask,
-                                  surf.format.Amask)
-    rshift, gshift, bshift, ashift = (surf.format.Rshift,
-                                      surf.format.Gshift,
-                                      surf.format.Bshift,
-                                      surf.format.Ashift)
-    rloss, gloss, bloss, aloss = (surf.format.Rloss,
-                                  surf.format.Gloss,
-                                  surf.format.Bloss,
-                                  surf.format.Aloss)
-    bpp = surf.format.BytesPerPixel
-    h, w = surf.h, surf.w
-    colorkey = surf.format.colorkey
-    if argb:
-        has_colorkey = False
-        ri, gi, bi, ai = 1, 2, 3, 0
-    else:
-        has_colorkey = (has_colorkey and surf.flags & sdl.SDL_SRCCOLORKEY
-                        and not amask)
-        ri, gi, bi, ai = 0, 1, 2, 3
-
-    data = ffi.new('char[]', w * h * 4)
-    if bpp == 1:
-        pixels = ffi.cast('uint8_t*', surf.pixels)
-        colors = surf.format.palette.colors
-        for y in range(h):
-            src_start = (h - 1 - y) * w if flipped \
-                        else y * w
-            for x in range(w):
-                dest = 4 * (y * w + x)
-                color = pixels[src_start + x]
-                data[dest + ri] = chr_(colors[color].r)
-                data[dest + gi] = chr_(colors[color].g)
-                data[dest + bi] = chr_(colors[color].b)
-                if has_colorkey:
-                    data[dest + ai] = chr_(
-                        ffi.cast('char', color != colorkey) * 255)
-                else:
-                    data[dest + ai] = chr_(255)
-    elif bpp == 2:
-        pixels = ffi.cast('uint16_t*', surf.pixels)
-        for y in range(h):
-            src_start = (h - 1 - y) * w if flipped \
-                        else y * w
-            for x in range(w):
-                dest = 4 * (y * w + x)
-                color = pixels[src_start + x]
-                data[dest + ri] = chr_(((color & rmask) >> rshift) << rloss)
-                data[dest + gi] = chr_(((color & gmask) >> gshift) << gloss)
-                data[dest + bi] = chr_(((color & bmask) >> bshift) << bloss)
-                if has_colorkey:
-                    data[dest + ai] = chr_(
-                        ffi.cast('char', color != colorkey) * 255)
-                else:
-                    data[dest + ai] = chr_(
-                        (((color & amask) >> ashift) << aloss)
-                        if amask else 255)
-    elif bpp == 3:
-        pixels = ffi.cast('uint8_t*', surf.pixels)
-        for y in range(h):
-            src_start = (h - 1 - y) * surf.pitch if flipped \
-                        else y * surf.pitch
-            for x in range(w):
-                dest = 4 * (y * w + x)
-                color = (pixels[src_start + x * 3 + BYTE0] +
-                         (pixels[src_start + x * 3 + BYTE1] << 8) +
-                         (pixels[src_start + x * 3 + BYTE2] << 16))
-                data[dest + ri] = chr_(((color & rmask) >> rshift) << rloss)
-                data[dest + gi] = chr_(((color & gmask) >> gshift) << gloss)
-                data[dest + bi] = chr_(((color & bmask) >> bshift) << bloss)
-                if has_colorkey:
-                    data[dest + ai] = chr_(
-                        ffi.cast('char', color != colorkey) * 255)
-                else:
-                    data[dest + ai] = chr_(
-                        (((color & amask) >> ashift) << aloss)
-                        if amask else 255)
-    elif bpp == 4:
-        pixels = ffi.cast('uint32_t*', surf.pixels)
-        for y in range(h):
-            src_start = (h - 1 - y) * w if flipped \
-                        else y * w
-            for x in range(w):
-                dest = 4 * (y * w + x)
-                color = pixels[src_start + x]
-                data[dest + ri] = chr_(((color & rmask) >> rshift) << rloss)
-                data[dest + gi] = chr_(((color & gmask) >> gshift) << gloss)
-                data[dest + bi] = chr_(((color & bmask) >> bshift) << bloss)
-                if has_colorkey:
-                    data[dest + ai] = chr_(
-                        ffi.cast('char', color != colorkey) * 255)
-                else:
-                    data[dest + ai] = chr_(
-                        (((color & amask) >> ashift) << aloss)
-                        if amask else 255)
-    else:
-        raise ValueError("invalid color depth")
-    return ffi.buffer(data)[:]
+        return 1, 0, (0, 0, 0, 0)
+    elif format == "RGB":
+        if lil_endian:
+            return 3, 0, (0xff, 0xff << 8, 0xff << 16, 0)
+        return 3, 0, (0xff << 16, 0xff << 8, 0xff, 0)
+    elif format == "ARGB":
+        if lil_endian:
+            return 4, sdl.SDL_SRCALPHA, (0xff << 8, 0xff << 16,
+                                         0xff << 24, 0xff)
+        return 4, sdl.SDL_SRCALPHA, (0xff << 16, 0xff << 8,
+                                     0xff, 0xff << 24)
+    elif format in ("RGBA", "RGBX", "RGBAX"):
+        alphamult = format == "RGBA"
+        if lil_endian:
+            masks = (0xff, 0xff << 8, 0xff << 16,
+                     0xff << 24 if alphamult else 0)
+        else:
+            masks = (0xff << 24, 0xff << 16, 0xff << 8,
+                     0xff if alphamult else 0)
+        return 4, sdl.SDL_SRCALPHA if alphamult else 0, masks
+    raise ValueError("Unrecognized type of format")
+
+
+def _char_buffer(obj):
+    """Return something that can be passed as a char * to cffi, without
+    copying obj"""
+    if isinstance(obj, bytes):
+        return obj
+    return ffi.from_buffer(obj)
 
 
-def _tostring_RGBX(surf, flipped):
-    return _tostring_RGBA(surf, flipped, False)
+def fromstring(string, size, format, flipped=False):
+    """ fromstring(string, size, format, flipped=False) -> Surface
+    create new Surface from a string buffer
+    """
+    w, h = size
+    if w < 1 or h < 1:
+        raise ValueError("Resolution must be positive values")
+
+    bpp, flags, masks = _string_format(format)
+    if len(string) != w * h * bpp:
+        raise ValueError("String length does not equal format and "
+                         "resolution size")
+    surf = sdl.SDL_CreateRGBSurface(flags, w, h, bpp * 8, *masks)
+    if not surf:
+        raise SDLError.from_sdl_error()
+    with locked(surf):
+        sdl.image_copy_rows(_char_buffer(string), w * bpp,
+                            ffi.cast("char*", surf.pixels), surf.pitch,
+                            w * bpp, h, flipped)
+    return Surface._from_sdl_surface(surf)
 
 
-def _tostring_ARGB(surf, flipped):
-    return _tostring_RGBA(surf, flipped, True, True)
+# channels, argb, premultiplied and colorkey alpha of the tostring()
+# formats other than "P"
+_tostring_formats = {
+    "RGB": (3, False, False, False),
+    "RGBX": (4, False, False, False),
+    "RGBA": (4, False, False, True),
+    "ARGB": (4, True, False, False),
+    "RGBA_PREMULT": (4, False, True, False),
+    "ARGB_PREMULT": (4, True, True, False),
+}
 
 
-def _tostring_RGBA_PREMULT(surf, flipped, argb=False):
-    if surf.format.BytesPerPixel == 1 or surf.format.Amask == 0:
+def _tostring_size(surf, format):
+    if format == "P":
+        if surf.format.BytesPerPixel != 1:
+            raise ValueError("Can only create \"P\" format data with "
+                             "8bit Surfaces")
+        return surf.w * surf.h
+    if format not in _tostring_formats:
+        raise ValueError("Unrecognized type of format")
+    if _tostring_formats[format][2] and (surf.format.BytesPerPixel == 1 or
+                                         surf.format.Amask == 0):
         raise ValueError("Can only create pre-multiplied alpha strings if "
                          "the surface has per-pixel alpha")
+    return _tostring_formats[format][0] * surf.w * surf.h
 
-    rmask, gmask, bmask, amask = (surf.format.Rmask,
-                                  surf.format.Gmask,
-                                  surf.format.Bmask,
-                                  surf.format.Amask)
-    rshift, gshift, bshift, ashift = (surf.format.Rshift,
-                                      surf.format.Gshift,
-                                      surf.format.Bshift,
-                                      surf.format.Ashift)
-    rloss, gloss, bloss, aloss = (surf.format.Rloss,
-                                  surf.format.Gloss,
-                                  surf.format.Bloss,
-                                  surf.format.Aloss)
-    bpp = surf.format.BytesPerPixel
-    h, w = surf.h, surf.w
-    if argb:
-        ri, gi, bi, ai = 1, 2, 3, 0
-    else:
-        ri, gi, bi, ai = 0, 1, 2, 3
-
-    data = ffi.new('char[]', w * h * 4)
-    if bpp == 2:
-        pixels = ffi.cast('uint16_t*', surf.pixels)
-        for y in range(h):
-            src_start = (h - 1 - y) * w if flipped \
-                        else y * w
-            for x in range(w):
-                dest = 4 * (y * w + x)
-                color = pixels[src_start + x]
-                alpha = ((color & amask) >> ashift) << aloss
-                data[dest + ri] = chr_((((color & rmask) >> rshift) << rloss)
-                                       * alpha // 255)
-                data[dest + gi] = chr_((((color & gmask) >> gshift) << gloss)
-                                       * alpha // 255)
-                data[dest + bi] = chr_((((color & bmask) >> bshift) << bloss)
-                                       * alpha // 255)
-                data[dest + ai] = chr_(alpha)
-    elif bpp == 3:
-        pixels = ffi.cast('uint8_t*', surf.pixels)
-        for y in range(h):
-            src_start = (h - 1 - y) * surf.pitch if flipped \
-                        else y * surf.pitch
-            for x in range(w):
-                dest = 4 * (y * w + x)
-                color = (pixels[src_start + x * 3 + BYTE0] +
-                         (pixels[src_start + x * 3 + BYTE1] << 8) +
-                         (pixels[src_start + x * 3 + BYTE2] << 16))
-                alpha = ((color & amask) >> ashift) << aloss
-                data[dest + ri] = chr_((((color & rmask) >> rshift) << rloss)
-                                       * alpha // 255)
-                data[dest + gi] = chr_((((color & gmask) >> gshift) << gloss)
-                                       * alpha // 255)
-                data[dest + bi] = chr_((((color & bmask) >> bshift) << bloss)
-                                       * alpha // 255)
-                data[dest + ai] = chr_(alpha)
-    elif bpp == 4:
-        pixels = ffi.cast('uint32_t*', surf.pixels)
-        for y in range(h):
-            src_start = (h - 1 - y) * w if flipped \
-                        else y * w
-            for x in range(w):
-                dest = 4 * (y * w + x)
-                color = pixels[src_start + x]
-                alpha = ((color & amask) >> ashift) << aloss
-                if alpha == 0:
-                    data[dest + ri] = data[dest + gi] = data[dest + bi] \
-                        = chr_(0)
-                else:
-                    data[dest + ri] = chr_(
-                        (((color & rmask) >> rshift) << rloss) * alpha // 255)
-                    data[dest + gi] = chr_(
-                        (((color & gmask) >> gshift) << gloss) * alpha // 255)
-                    data[dest + bi] = chr_(
-                        (((color & bmask) >> bshift) << bloss) * alpha // 255)
-                data[dest + ai] = chr_(alpha)
-    else:
-        raise ValueError("invalid color depth")
-    return ffi.buffer(data)[:]
 
+def _tostring_into(surf, format, dst, flipped):
+    with locked(surf):
+        if format == "P":
+            sdl.image_copy_rows(ffi.cast("char*", surf.pixels), surf.pitch,
+                                ffi.cast("char*", dst), surf.w, surf.w,
+                                surf.h, flipped)
+            return
+        channels, argb, premult, colorkey = _tostring_formats[format]
+        use_colorkey = bool(colorkey and
+                            surf.flags & sdl.SDL_SRCCOLORKEY and
+                            not surf.format.Amask)
+        if sdl.image_tostring(surf, ffi.cast("Uint8*", dst), channels, argb,
+                              premult, use_colorkey, flipped):
+            raise ValueError("invalid color depth")
 
-def _tostring_ARGB_PREMULT(surf, flipped):
-    return _tostring_RGBA_PREMULT(surf, flipped, True)
 
+def tostring(surface, format, flipped=False):
+    """ tostring(Surface, format, flipped=False) -> string
+    transfer image to string buffer
+    """
+    surf = surface._c_surface
+    if surf.flags & sdl.SDL_OPENGL:
+        raise NotImplementedError()
 
-def _tostring_RGB(surf, flipped):
-    rmask, gmask, bmask, amask = (surf.format.Rmask,
-                                  surf.format.Gmask,
-                                  surf.format.Bmask,
-                                  surf.format.Amask)
-    rshift, gshift, bshift, ashift = (surf.format.Rshift,
-                                      surf.format.Gshift,
-                                      surf.format.Bshift,
-                                      surf.format.Ashift)
-    rloss, gloss, bloss, aloss = (surf.format.Rloss,
-                                  surf.format.Gloss,
-                                  surf.format.Bloss,
-                                  surf.format.Aloss)
-    bpp = surf.format.BytesPerPixel
-    h, w = surf.h, surf.w
-
-    data = ffi.new('char[]', w * h * 3)
-    if bpp == 1:
-        pixels = ffi.cast('uint8_t*', surf.pixels)
-        colors = surf.format.palette.colors
-        for y in range(h):
-            src_start = (h - 1 - y) * w if flipped \
-                        else y * w
-            for x in range(w):
-                dest = 3 * (y * w + x)
-                color = pixels[src_start + x]
-                data[dest] = chr_(colors[color].r)
-                data[dest + 1] = chr_(colors[color].g)
-                data[dest + 2] = chr_(colors[color].b)
-    elif bpp == 2:
-        pixels = ffi.cast('uint16_t*', surf.pixels)
-        for y in range(h):
-            src_start = (h - 1 - y) * w if flipped \
-                        else y * w
-            for x in range(w):
-                dest = 3 * (y * w + x)
-                color = pixels[src_start + x]
-                data[dest] = chr_(((color & rmask) >> rshift) << rloss)
-                data[dest + 1] = chr_(((color & gmask) >> gshift) << gloss)
-                data[dest + 2] = chr_(((color & bmask) >> bshift) << bloss)
-    elif bpp == 3:
-        pixels = ffi.cast('uint8_t*', surf.pixels)
-        for y in range(h):
-            src_start = (h - 1 - y) * surf.pitch if flipped \
-                        else y * surf.pitch
-            for x in range(w):
-                dest = 3 * (y * w + x)
-                color = (pixels[src_start + x * 3 + BYTE0] +
-                         (pixels[src_start + x * 3 + BYTE1] << 8) +
-                         (pixels[src_start + x * 3 + BYTE2] << 16))
-                data[dest] = chr_(((color & rmask) >> rshift) << rloss)
-                data[dest + 1] = chr_(((color & gmask) >> gshift) << gloss)
-                data[dest + 2] = chr_(((color & bmask) >> bshift) << bloss)
-    elif bpp == 4:
-        pixels = ffi.cast('uint32_t*', surf.pixels)
-        for y in range(h):
-            src_start = (h - 1 - y) * w if flipped \
-                        else y * w
-            for x in range(w):
-                dest = 3 * (y * w + x)
-                color = pixels[src_start + x]
-                data[dest] = chr_(((color & rmask) >> rshift) << rloss)
-                data[dest + 1] = chr_(((color & gmask) >> gshift) << gloss)
-                data[dest + 2] = chr_(((color & bmask) >> bshift) << bloss)
-    else:
-        raise ValueError("invalid color depth")
+    data = ffi.new('char[]', _tostring_size(surf, format))
+    _tostring_into(surf, format, data, flipped)
     return ffi.buffer(data)[:]
 
 
-def frombuffer(string, size, format):
-    """ frombuffer(string, size, format) -> Surface
+def tostring_into(surface, format, buffer, flipped=False):
+    """ tostring_into(Surface, format, buffer, flipped=False) -> size
+    transfer image to a writable buffer
+
+    Like tostring(), but the data is written to the start of buffer,
+    which can be any writable object supporting the buffer protocol, so
+    the same buffer can be reused for every frame. Returns the number of
+    bytes written.
+    """
+    surf = surface._c_surface
+    if surf.flags & sdl.SDL_OPENGL:
+        raise NotImplementedError()
+
+    if memoryview(buffer).readonly:
+        raise TypeError("buffer must be writable")
+    size = _tostring_size(surf, format)
+    dst = ffi.from_buffer(buffer)
+    if len(dst) < size:
+        raise ValueError("buffer is too small, %d bytes are needed" % size)
+    _tostring_into(surf, format, dst, flipped)
+    return size
+
+
+def frombuffer(string, size, format, pitch=None):
+    """ frombuffer(string, size, format, pitch=None) -> Surface
     create a new Surface that shares data inside a string buffer
+
+    string can be any object supporting the buffer protocol. Rows start
+    pitch bytes apart, by default the width times the bytes per pixel.
+    The Surface keeps the buffer alive, and drawing on it changes the
+    buffer.
     """
-    raise NotImplementedError()
+    w, h = size
+    if w < 1 or h < 1:
+        raise ValueError("Resolution must be positive values")
+
+    bpp, flags, masks = _string_format(format)
+    if pitch is None:
+        pitch = w * bpp
+    elif pitch < w * bpp:
+        raise ValueError("Pitch is smaller than a row of pixels")
+    # a char[] of the buffer's size in bytes, whatever its item type
+    # and shape
+    pixels = ffi.from_buffer(string)
+    if len(pixels) < pitch * (h - 1) + w * bpp:
+        raise ValueError("Buffer length is too small for format, "
+                         "resolution and pitch")
+    surf = sdl.SDL_CreateRGBSurfaceFrom(pixels, w, h, bpp * 8, pitch,
+                                        *masks)
+    if not surf:
+        raise SDLError.from_sdl_error()
+    if flags:
+        sdl.SDL_SetAlpha(surf, flags, 255)
+    surface = Surface._from_sdl_surface(surf)
+    surface._pixel_buffer = (string, pixels)
+    return surface
@@ -32,8 +32,9 @@ from pygame.base import register_quit
 from pygame.compat import string_types, unicode_
 import pygame.mixer_music as music
 from pygame.mixer_music import check_mixer
-from pygame.rwobject import (rwops_encode_file_path, rwops_from_file,
-                             rwops_from_file_path)
+from pygame.rwobject import (PackMember, rwops_encode_file_path,
+                             rwops_from_file, rwops_from_file_path,
+                             rwops_from_pack_member)
 
 
 PYGAME_MIXER_DEFAULT_FREQUENCY = 22050
@@ -48,8 +49,6 @@ _request_chunksize = PYGAME_MIXER_DEFAULT_CHUNKSIZE;
 
 _channeldata = None
 _numchanneldata = 0
-_current_music = None
-_queue_music = None
 
 
 class ChannelData(object):
@@ -210,6 +209,11 @@ class Sound(object):
             elif isinstance(obj, IOBase):
                 rwops = rwops_from_file(obj)
                 self.chunk = sdl.Mix_LoadWAV_RW(rwops, 1)
+            elif isinstance(obj, PackMember):
+                # the sound is decoded straight away, so the memory
+                # only has to stay mapped while loading
+                rwops, base = rwops_from_pack_member(obj)
+                self.chunk = sdl.Mix_LoadWAV_RW(rwops, 1)
             else:
                 buff = obj
 
@@ -247,6 +251,8 @@ class Sound(object):
                     # Needed for python 3
                     filename = rwops_encode_file_path(arg_value)
                     rwops = rwops_from_file_path(filename, 'rb')
+                elif isinstance(arg_value, PackMember):
+                    rwops, base = rwops_from_pack_member(arg_value)
                 else:
                     rwops = rwops_from_file(arg_value)
                 self.chunk = sdl.Mix_LoadWAV_RW(rwops, 1)
@@ -488,20 +494,20 @@ def autoinit(frequency=None, size=None, channels=None, chunksize=None):
 
 
 def autoquit():
-    global _channeldata, _numchanneldata, _current_music, \
-           _queue_music
+    global _channeldata, _numchanneldata
     if sdl.SDL_WasInit(sdl.SDL_INIT_AUDIO):
         sdl.Mix_HaltMusic()
         # cleanup
         if _channeldata:
             _channeldata = None
             _numchanneldata = 0
-        if _current_music:
-            sdl.Mix_FreeMusic(_current_music)
-            _current_music = None
-        if _queue_music:
-            sdl.Mix_FreeMusic(_queue_music)
-            _queue_music = None
+        # the music module keeps pack members' memory until it's freed
+        if music._current_music:
+            music._free_music(music._current_music)
+            music._current_music = None
+        if music._queue_music:
+            music._free_music(music._queue_music)
+            music._queue_music = None
 
         sdl.Mix_CloseAudio()
         sdl.SDL_QuitSubSystem(sdl.SDL_INIT_AUDIO)
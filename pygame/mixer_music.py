@@ -23,7 +23,8 @@
 from pygame._sdl import ffi, sdl
 from pygame._error import SDLError
 from pygame.compat import bytes_, unicode_
-from pygame.rwobject import rwops_encode_file_path, rwops_from_file
+from pygame.rwobject import (PackMember, rwops_encode_file_path,
+                             rwops_from_file, rwops_from_pack_member)
 
 _current_music = None
 _queue_music = None
@@ -33,6 +34,9 @@ _music_pos_time = -1
 _music_frequency = 0
 _music_format = 0
 _music_channels = 0
+# SDL_mixer streams music as it plays, so music loaded from a PackMember
+# keeps the pack mapped, by the address of the Mix_Music
+_music_buffers = {}
 
 
 def check_mixer():
@@ -43,6 +47,23 @@ def check_mixer():
         raise SDLError("mixer system not initialized")
 
 
+def _music_key(music):
+    return int(ffi.cast('intptr_t', music))
+
+
+def _load_pack_music(member):
+    rwops, base = rwops_from_pack_member(member)
+    music = sdl.Mix_LoadMUS_RW(rwops)
+    if music:
+        _music_buffers[_music_key(music)] = base
+    return music
+
+
+def _free_music(music):
+    sdl.Mix_FreeMusic(music)
+    _music_buffers.pop(_music_key(music), None)
+
+
 def load(obj):
     """load(filename): return None
        load(object): return None
@@ -53,6 +74,8 @@ def load(obj):
     if isinstance(obj, (bytes_, unicode_)):
         filename = rwops_encode_file_path(obj)
         new_music = sdl.Mix_LoadMUS(filename)
+    elif isinstance(obj, PackMember):
+        new_music = _load_pack_music(obj)
     else:
         rwops = rwops_from_file(obj)
         new_music = sdl.Mix_LoadMUS_RW(rwops)
@@ -61,9 +84,9 @@ def load(obj):
 
     # Cleanup
     if _current_music:
-        sdl.Mix_FreeMusic(_current_music)
+        _free_music(_current_music)
     if _queue_music:
-        sdl.Mix_FreeMusic(_queue_music)
+        _free_music(_queue_music)
         _queue_music = None
 
     _current_music = new_music
@@ -132,7 +155,7 @@ def stop():
     sdl.Mix_HaltMusic()
     global _queue_music
     if _queue_music:
-        sdl.Mix_FreeMusic(_queue_music)
+        _free_music(_queue_music)
         _queue_music = None
 
 
@@ -173,7 +196,7 @@ def fadeout(milliseconds):
     sdl.Mix_FadeOutMusic(milliseconds)
     global _queue_music
     if _queue_music:
-        sdl.Mix_FreeMusic(_queue_music)
+        _free_music(_queue_music)
         _queue_music = None
 
 
@@ -207,17 +230,23 @@ def queue(filename):
     """
     check_mixer()
     global _queue_music
-    try:
-        filename = rwops_encode_file_path(filename)
-        _queue_music = sdl.Mix_LoadMUS(filename)
-    except SDLError:
-        # try as file object
-        rwops = rwops_from_file(filename)
-        _queue_music = sdl.Mix_LoadMUS_RW(rwops)
-
-    if not _queue_music:
+    if isinstance(filename, PackMember):
+        new_music = _load_pack_music(filename)
+    else:
+        try:
+            filename = rwops_encode_file_path(filename)
+            new_music = sdl.Mix_LoadMUS(filename)
+        except SDLError:
+            # try as file object
+            rwops = rwops_from_file(filename)
+            new_music = sdl.Mix_LoadMUS_RW(rwops)
+    if not new_music:
         raise SDLError.from_sdl_error()
 
+    if _queue_music:
+        _free_music(_queue_music)
+    _queue_music = new_music
+
 
 @ffi.def_extern()
 def _endmusic_callback():
@@ -232,7 +261,7 @@ def _endmusic_callback():
 
     if _queue_music:
         if _current_music:
-            sdl.Mix_FreeMusic(_current_music)
+            _free_music(_current_music)
         _current_music = _queue_music
         _queue_music = None
         sdl.Mix_HookMusicFinished(sdl._endmusic_callback)
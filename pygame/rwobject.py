@@ -20,21 +20,42 @@
 # MA  02110-1301  USA
 
 """ The pygame rwobject module for IO using SDL_RWops """
+import mmap
+import struct
 import sys
+import threading
 
 from pygame._sdl import ffi, sdl
 from pygame._error import SDLError
-from pygame.compat import bytes_, filesystem_encode, unicode_
+from pygame.compat import bytes_, filesystem_encode, string_types, unicode_
 
 # Can't use weakref, since we need to hold a reference to
 # the handle until all the operations are done.
 __localhandles = set()
 
 
+# Read ahead this many bytes when reading from file objects
+READ_BUFFER_SIZE = 64 * 1024
+
+
 # Callback helpers for rwops_from_file
 @ffi.def_extern()
-def obj_seek(context, offset, whence):
-    fileobj = ffi.from_handle(context.hidden.unknown.data1)
+def obj_readinto(handle, output, size):
+    fileobj = ffi.from_handle(handle)
+    readinto = getattr(fileobj, 'readinto', None)
+    if readinto is not None:
+        # let the file object write straight into SDL's memory
+        return readinto(ffi.buffer(output, size)) or 0
+    if not hasattr(fileobj, 'read'):
+        return -1
+    data = fileobj.read(size)
+    ffi.memmove(output, data, len(data))
+    return len(data)
+
+
+@ffi.def_extern()
+def obj_seek(handle, offset, whence):
+    fileobj = ffi.from_handle(handle)
     if not hasattr(fileobj, 'tell') or not hasattr(fileobj, 'seek'):
         return -1
     # whence = 1 => SEEK_CUR, from python docs
@@ -45,41 +66,26 @@ def obj_seek(context, offset, whence):
 
 
 @ffi.def_extern()
-def obj_read(context, output, size, maxnum):
-    fileobj = ffi.from_handle(context.hidden.unknown.data1)
-    if not hasattr(fileobj, 'read'):
-        return -1
-    data = fileobj.read(size * maxnum)
-    if not data:
-        return -1
-    retval = len(data)
-    ffi.memmove(output, data, retval)
-    retval = retval // size
-    return retval
-
-
-@ffi.def_extern()
-def obj_write(context, input, size, maxnum):
-    fileobj = ffi.from_handle(context.hidden.unknown.data1)
+def obj_write(handle, input, size):
+    fileobj = ffi.from_handle(handle)
     if not hasattr(fileobj, 'write'):
         return -1
-    data = ffi.buffer(input, size*maxnum)
+    data = ffi.buffer(input, size)
     try:
         fileobj.write(data)
     except IOError:
         return -1
-    return size*maxnum
+    return size
 
 
 @ffi.def_extern()
-def obj_close(context):
-    fileobj = ffi.from_handle(context.hidden.unknown.data1)
+def obj_close(handle):
+    fileobj = ffi.from_handle(handle)
     retval = 0
     if hasattr(fileobj, 'close'):
         if fileobj.close():
             retval = -1
-    __localhandles.discard(context.hidden.unknown.data1)
-    sdl.SDL_FreeRW(context)
+    __localhandles.discard(handle)
     return retval
 
 
@@ -94,30 +100,28 @@ def rwops_encode_file_path(filepath):
     raise SDLError("filepath argument needs to be a unicode or str value")
 
 
-def _lib_rwops_from_file(fileobj):
+def _lib_rwops_from_file(fileobj, buffer_size):
     """create rwops from file usings our helper functions."""
-    rwops = sdl.SDL_AllocRW()
+    if buffer_size is None:
+        buffer_size = READ_BUFFER_SIZE
     handle = ffi.new_handle(fileobj)
-    rwops.hidden.unknown.data1 = handle
-    __localhandles.add(handle)
-    rwops.seek = sdl.obj_seek
-    rwops.read = sdl.obj_read
-    rwops.write = sdl.obj_write
-    rwops.close = sdl.obj_close
+    rwops = sdl.rwobject_from_handle(handle, buffer_size)
+    if rwops:
+        __localhandles.add(handle)
     return rwops
 
 
-def _win_rwops_from_file(fileobj):
+def _win_rwops_from_file(fileobj, buffer_size=None):
     """Windows compatible implementation of rwops_from_file."""
     # sdl.SDL_RWFromFP doesn't setup the correct handlers on
     # windows, so we fall back to our helpers
-    rwops = _lib_rwops_from_file(fileobj)
+    rwops = _lib_rwops_from_file(fileobj, buffer_size)
     if not rwops:
         raise SDLError.from_sdl_error()
     return rwops
 
 
-def _unix_rwops_from_file(fileobj):
+def _unix_rwops_from_file(fileobj, buffer_size=None):
     """Non-windows implementation of rwops_from_file."""
     try:
         # We try use the SDL helper first, since
@@ -125,21 +129,243 @@ def _unix_rwops_from_file(fileobj):
         rwops = sdl.SDL_RWFromFP(fileobj, 0)
     except (TypeError, IOError):
         # Construct a suitable rwops object
-        rwops = _lib_rwops_from_file(fileobj)
+        rwops = _lib_rwops_from_file(fileobj, buffer_size)
     if not rwops:
         raise SDLError.from_sdl_error()
     return rwops
 
 
+# rwops_from_file(fileobj, buffer_size=None) creates an rwops for a file
+# object. Reads are buffered, reading buffer_size bytes ahead, or
+# READ_BUFFER_SIZE if it's None, and use the file's readinto method
+# where it has one. Closing the rwops closes the file object.
 if sys.platform.startswith('win'):
     rwops_from_file = _win_rwops_from_file
 else:
     rwops_from_file = _unix_rwops_from_file
 
 
+def rwops_from_buffer(data):
+    """create read only rwops for the memory of bytes or an object
+    supporting the buffer protocol, without copying it.
+
+    Returns the rwops and the object keeping the memory alive, which
+    must be referenced for as long as the rwops is used."""
+    buf = data if isinstance(data, bytes) else ffi.from_buffer(data)
+    rwops = sdl.SDL_RWFromConstMem(buf, len(buf))
+    if not rwops:
+        raise SDLError.from_sdl_error()
+    return rwops, buf
+
+
 def rwops_from_file_path(filename, mode='r'):
     mode = mode.encode('ascii')
     rwops = sdl.SDL_RWFromFile(filename, mode)
     if not rwops:
         raise SDLError.from_sdl_error()
     return rwops
+
+
+# A pack file is a header, the members' data, each starting on a
+# _PACK_ALIGN boundary, and then an index of (offset, size, name length)
+# entries, each followed by the utf-8 encoded name
+_PACK_MAGIC = b'PGPACK01'
+_pack_header = struct.Struct('<8sQI')
+_pack_entry = struct.Struct('<QQH')
+_PACK_ALIGN = 16
+
+
+def write_pack(filename, members):
+    """write_pack(filename, members) -> None
+    write a pack file
+
+    members is a dict or a sequence of (name, data) pairs, where data is
+    a filename to copy or an object supporting the buffer protocol.
+    """
+    if isinstance(members, dict):
+        members = sorted(members.items())
+    index = []
+    with open(filename, 'wb') as f:
+        f.write(b'\0' * _pack_header.size)
+        offset = _pack_header.size
+        for name, data in members:
+            if isinstance(name, bytes_):
+                name = name.decode('utf-8')
+            if isinstance(data, string_types):
+                with open(data, 'rb') as member:
+                    data = member.read()
+            padding = -offset % _PACK_ALIGN
+            f.write(b'\0' * padding)
+            offset += padding
+            data = memoryview(data)
+            size = data.nbytes if hasattr(data, 'nbytes') else len(data)
+            f.write(data)
+            index.append((name.encode('utf-8'), offset, size))
+            offset += size
+        for name, member_offset, size in index:
+            f.write(_pack_entry.pack(member_offset, size, len(name)))
+            f.write(name)
+        f.seek(0)
+        f.write(_pack_header.pack(_PACK_MAGIC, offset, len(index)))
+
+
+class PackMember(object):
+    """ a file stored in a PackFile
+
+    image.load(), mixer.Sound(), mixer.music.load() and font.Font()
+    take members directly, loading them from the mapped pack without
+    copying or calling back into Python.
+    """
+
+    def __init__(self, pack, name, offset, size):
+        self._pack = pack
+        self._offset = offset
+        self.name = name
+        self.size = size
+
+    def __repr__(self):
+        return '<PackMember(%r, %d bytes)>' % (self.name, self.size)
+
+    def _pointer(self):
+        base = self._pack._acquire()
+        return base, base + self._offset
+
+    def getbuffer(self):
+        """getbuffer() -> memoryview
+        get the member's data without copying it
+
+        The buffer must not be written to.
+        """
+        base, pointer = self._pointer()
+        # the view keeps base, and so the mapping, alive
+        view = memoryview(ffi.buffer(base, self._offset + self.size))
+        return view[self._offset:]
+
+    def read(self):
+        """read() -> bytes
+        get a copy of the member's data
+        """
+        return self.getbuffer()[:]
+
+
+def rwops_from_pack_member(member):
+    """create read only rwops for the data of a PackMember.
+
+    Returns the rwops and the object keeping the pack mapped, which
+    must be referenced for as long as the rwops is used."""
+    base, pointer = member._pointer()
+    rwops = sdl.SDL_RWFromConstMem(pointer, member.size)
+    if not rwops:
+        raise SDLError.from_sdl_error()
+    return rwops, base
+
+
+class PackFile(object):
+    """PackFile(filename) -> PackFile
+    open a pack of files written by write_pack()
+
+    The pack is memory mapped read only, so every process using the same
+    pack shares its pages. Members are looked up by name with
+    pack[name]. Fonts and music loaded from members keep the pack
+    mapped until they are freed, even once it has been closed.
+    """
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._base = ffi.from_buffer(self._map)
+        # the number of pointers from _acquire() still referenced; the
+        # pack is unmapped once it is closed and they are all gone
+        self._users = 0
+        self._users_lock = threading.RLock()
+        self._members = {}
+        self._names = []
+        try:
+            self._read_index()
+        except:
+            self.close()
+            raise
+
+    def _read_index(self):
+        if len(self._map) < _pack_header.size:
+            raise SDLError("not a pack file")
+        magic, offset, count = _pack_header.unpack_from(self._map, 0)
+        if magic != _PACK_MAGIC:
+            raise SDLError("not a pack file")
+        for i in range(count):
+            if offset + _pack_entry.size > len(self._map):
+                raise SDLError("truncated pack file")
+            member_offset, size, name_size = _pack_entry.unpack_from(
+                self._map, offset)
+            offset += _pack_entry.size
+            if (offset + name_size > len(self._map) or
+                    member_offset + size > len(self._map)):
+                raise SDLError("truncated pack file")
+            name = self._map[offset:offset + name_size].decode('utf-8')
+            offset += name_size
+            self._names.append(name)
+            self._members[name] = PackMember(self, name, member_offset, size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __contains__(self, name):
+        return name in self._members
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __getitem__(self, name):
+        return self._members[name]
+
+    def namelist(self):
+        """namelist() -> list
+        get the names of the members, in the order they were written
+        """
+        return list(self._names)
+
+    def read(self, name):
+        """read(name) -> bytes
+        get a copy of a member's data
+        """
+        return self._members[name].read()
+
+    def _acquire(self):
+        """Return a pointer to the start of the mapping, which keeps the
+        pack mapped for as long as it is referenced"""
+        with self._users_lock:
+            if self._base is None:
+                raise ValueError("I/O operation on closed pack file")
+            self._users += 1
+            return ffi.gc(ffi.cast('char *', self._base), self._release)
+
+    def _release(self, pointer):
+        with self._users_lock:
+            self._users -= 1
+            if not self._users and self._base is None:
+                self._unmap()
+
+    def _unmap(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def close(self):
+        """close() -> None
+        unmap the pack file
+
+        Fonts, music and buffers still loaded from members keep the
+        pack mapped until they are freed.
+        """
+        with self._users_lock:
+            # the pointers from _acquire() don't hold on to the buffer,
+            # so the map can be closed once they are gone
+            self._base = None
+            if not self._users:
+                self._unmap()
@@ -86,9 +86,19 @@ Sprites are not thread safe.  So lock them yourself if using threads.
 ## specific ones that aren't quite so general but fit into common
 ## specialized cases.
 
+from bisect import bisect_left, bisect_right, insort
+
 import pygame
 from pygame import Rect
-from pygame.time import get_ticks
+from pygame._error import SDLError
+from pygame._sdl import sdl, ffi
+from pygame.rect import game_rect_from_obj
+
+try:
+    from time import perf_counter as perf_timer
+except ImportError:
+    # Python 2
+    from timeit import default_timer as perf_timer
 
 # Don't depend on pygame.mask if it's not there...
 try:
@@ -110,6 +120,10 @@ class Sprite(object):
     adding the Sprite to Groups.
     """
 
+    # Group membership lives in a slot; __dict__ is kept so that sprites
+    # can still be given image, rect and any other attributes.
+    __slots__ = ('__g', '__dict__', '__weakref__')
+
     def __init__(self, *groups):
         self.__g = {} # The groups the sprite is in
         if groups: self.add(groups)
@@ -121,10 +135,10 @@ class Sprite(object):
         Any number of Group instances can be passed as arguments. The 
         Sprite will be added to the Groups it is not already a member of.
         """
-        has = self.__g.__contains__
+        g = self.__g
         for group in groups:
             if hasattr(group, '_spritegroup'):
-                if not has(group):
+                if group not in g:
                     group.add_internal(self)
                     self.add_internal(group)
             else: self.add(*group)
@@ -136,10 +150,10 @@ class Sprite(object):
         Any number of Group instances can be passed as arguments. The Sprite will
         be removed from the Groups it is currently a member of.
         """
-        has = self.__g.__contains__
+        g = self.__g
         for group in groups:
             if hasattr(group, '_spritegroup'):
-                if has(group):
+                if group in g:
                     group.remove_internal(self)
                     self.remove_internal(group)
             else: self.remove(*group)
@@ -172,9 +186,10 @@ class Sprite(object):
         to use the Sprite after this method has been called, including adding it
         to Groups.
         """
-        for c in self.__g.keys():
+        g = self.__g
+        for c in g:
             c.remove_internal(self)
-        self.__g.clear()
+        g.clear()
 
     def groups(self):
         """list of Groups that contain this Sprite
@@ -223,6 +238,8 @@ class DirtySprite(Sprite):
         (READONLY value, it is read when adding it to the 
         LayeredUpdates, for details see doc of LayeredUpdates)
     """
+
+    __slots__ = ('dirty', 'blendmode', '_visible', '_layer', 'source_rect')
     
     def __init__(self, *groups):
         
@@ -310,20 +327,28 @@ class AbstractGroup(object):
            add sprite to group
 
            Add a sprite or sequence of sprites to a group."""
+        has = self.has_internal
+        add_internal = self.add_internal
         for sprite in sprites:
             # It's possible that some sprite is also an iterator.
             # If this is the case, we should add the sprite itself,
             # and not the objects it iterates over.
             if isinstance(sprite, Sprite):
-                if not self.has_internal(sprite):
-                    self.add_internal(sprite)
+                if not has(sprite):
+                    add_internal(sprite)
                     sprite.add_internal(self)
             else:
                 try:
                     # See if sprite is an iterator, like a list or sprite
-                    # group.
+                    # group. Plain sprites in it are added directly, only
+                    # nested sequences recurse.
                     for spr in sprite:
-                        self.add(spr)
+                        if isinstance(spr, Sprite):
+                            if not has(spr):
+                                add_internal(spr)
+                                spr.add_internal(self)
+                        else:
+                            self.add(spr)
                 except (TypeError, AttributeError):
                     # Not iterable, this is probably a sprite that happens
                     # to not subclass Sprite. Alternately, it could be an
@@ -346,14 +371,22 @@ class AbstractGroup(object):
         # Check for Spritehood, check for iterability, check for
         # old-style sprite group, and fall back to assuming
         # spritehood.
+        has = self.has_internal
+        remove_internal = self.remove_internal
         for sprite in sprites:
             if isinstance(sprite, Sprite):
-                if self.has_internal(sprite):
-                    self.remove_internal(sprite)
+                if has(sprite):
+                    remove_internal(sprite)
                     sprite.remove_internal(self)
             else:
                 try:
-                    for spr in sprite: self.remove(spr)
+                    for spr in sprite:
+                        if isinstance(spr, Sprite):
+                            if has(spr):
+                                remove_internal(spr)
+                                spr.remove_internal(self)
+                        else:
+                            self.remove(spr)
                 except (TypeError, AttributeError):
                     if hasattr(sprite, '_spritegroup'):
                         for spr in sprite.sprites():
@@ -391,6 +424,39 @@ class AbstractGroup(object):
                 else:
                     return self.has_internal(sprite)
 
+    def remove_many(self, sprites):
+        """remove_many(sprites)
+           remove many sprites from group in one pass
+
+           Removes every sprite in the iterable that is in the group.
+           Unlike remove(), nested sequences and groups are not flattened,
+           which makes this the cheaper way to drop a large batch."""
+        has = self.has_internal
+        remove_internal = self.remove_internal
+        for spr in sprites:
+            if has(spr):
+                remove_internal(spr)
+                spr.remove_internal(self)
+
+    def kill_many(self, sprites=None):
+        """kill_many(sprites=None)
+           remove many sprites from all their groups
+
+           Equivalent to calling kill() on each sprite, but each group
+           containing the sprites is updated with a single remove_many()
+           call. With no argument, kills every sprite in this group."""
+        if sprites is None:
+            sprites = self.sprites()
+        members = {}
+        for spr in sprites:
+            for group in spr.groups():
+                members.setdefault(group, []).append(spr)
+        for group, group_sprites in members.items():
+            if hasattr(group, 'remove_many'):
+                group.remove_many(group_sprites)
+            else:
+                group.remove(group_sprites)
+
     def update(self, *args):
         """update(*args)
            call update for all member sprites
@@ -536,6 +602,128 @@ class OrderedUpdates(RenderUpdates):
         RenderUpdates.remove_internal(self, sprite)
         self._spritelist.remove(sprite)
 
+    def remove_many(self, sprites):
+        spritedict = self.spritedict
+        removed = False
+        for spr in sprites:
+            if spr in spritedict:
+                RenderUpdates.remove_internal(self, spr)
+                spr.remove_internal(self)
+                removed = True
+        if removed:
+            # rebuild the draw order once rather than once per sprite
+            self._spritelist = [spr for spr in self._spritelist
+                                if spr in spritedict]
+
+
+def _rect_bottom(sprite):
+    return sprite.rect.bottom
+
+
+# the key of a sprite added before its key could be computed
+_NO_KEY = object()
+
+
+class DepthSortedGroup(RenderUpdates):
+    """RenderUpdates class that draws Sprites in order of a sort key
+    pygame.sprite.DepthSortedGroup(*sprites, key=None): return DepthSortedGroup
+
+    This class derives from pygame.sprite.RenderUpdates(). Sprites are
+    drawn from the lowest to the highest key, which by default is the
+    bottom of the sprite rect, so that sprites lower on the screen are
+    drawn in front. Pass key=function to sort on something else. Sprites
+    with equal keys are drawn in the order they were added.
+
+    The order is kept up to date incrementally: at draw time only the
+    sprites whose key has changed since the last draw are moved, which
+    is cheap when most sprites keep their relative order from frame to
+    frame. Finding them still calls the key function of every sprite on
+    each draw, so it should be cheap too.
+
+    Sprites can be added before they have a rect, as when a Sprite
+    subclass calls Sprite.__init__(self, group) first; they are put in
+    order by the next sort() or draw().
+    """
+
+    def __init__(self, *sprites, **kwargs):
+        key = kwargs.pop('key', None)
+        if kwargs:
+            raise TypeError("DepthSortedGroup() got an unexpected keyword "
+                            "argument '%s'" % sorted(kwargs)[0])
+        self._key = key or _rect_bottom
+        self._spritelist = []
+        # (key, number) pairs, the number counting the sprites added to
+        # keep sprites with equal keys in the order they were added
+        self._keys = []
+        self._added = 0
+        # True while some sprites are waiting for their key
+        self._pending = False
+        RenderUpdates.__init__(self, *sprites)
+
+    def sprites(self):
+        return list(self._spritelist)
+
+    def add_internal(self, sprite):
+        RenderUpdates.add_internal(self, sprite)
+        added = self._added
+        self._added += 1
+        if not self._pending:
+            try:
+                key = (self._key(sprite), added)
+            except AttributeError:
+                self._pending = True
+            else:
+                idx = bisect_right(self._keys, key)
+                self._keys.insert(idx, key)
+                self._spritelist.insert(idx, sprite)
+                return
+        # keys can't be compared with _NO_KEY, so the sprite waits at the
+        # end until the next sort
+        self._keys.append((_NO_KEY, added))
+        self._spritelist.append(sprite)
+
+    def remove_internal(self, sprite):
+        RenderUpdates.remove_internal(self, sprite)
+        idx = self._spritelist.index(sprite)
+        del self._spritelist[idx]
+        del self._keys[idx]
+
+    def sort(self):
+        """bring the drawing order up to date
+        DepthSortedGroup.sort(): return None
+
+        This is done automatically by draw(), but can be called directly
+        if the order is needed before drawing.
+        """
+        key = self._key
+        sprites = self._spritelist
+        keys = self._keys
+        moved = self._pending
+        for i, spr in enumerate(sprites):
+            k = key(spr)
+            if keys[i][0] is _NO_KEY or k != keys[i][0]:
+                keys[i] = (k, keys[i][1])
+                moved = True
+        self._pending = False
+        if not moved:
+            return
+        # insertion sort, moving out of order sprites back to their place
+        # in the already sorted prefix
+        for i in range(1, len(sprites)):
+            k = keys[i]
+            if k < keys[i - 1]:
+                idx = bisect_right(keys, k, 0, i)
+                del keys[i]
+                keys.insert(idx, k)
+                sprites.insert(idx, sprites.pop(i))
+
+    def draw(self, surface):
+        """draw all sprites in key order onto the surface
+        DepthSortedGroup.draw(surface): return Rect_list
+        """
+        self.sort()
+        return RenderUpdates.draw(self, surface)
+
 
 class LayeredUpdates(AbstractGroup):
     """LayeredUpdates Group handles layers, that draws like OrderedUpdates.
@@ -559,7 +747,11 @@ class LayeredUpdates(AbstractGroup):
         layer is used to add the sprites.
         """
         self._spritelayers = {}
-        self._spritelist = []
+        # sorted list of the layers in use, each with its own bucket of
+        # sprites in the order they were added to that layer
+        self._layers = []
+        self._layerbuckets = {}
+        self._spritelist_cache = None
         AbstractGroup.__init__(self)
         self._default_layer = kwargs.get('default_layer', 0)
             
@@ -579,29 +771,48 @@ class LayeredUpdates(AbstractGroup):
                 layer = self._default_layer
                 
                 
-        self._spritelayers[sprite] = layer
+        self._add_to_layer(sprite, layer)
         if hasattr(sprite, '_layer'):
             sprite._layer = layer
-    
-        # add the sprite at the right position
-        # bisect algorithmus
-        sprites = self._spritelist # speedup
-        sprites_layers = self._spritelayers
-        leng = len(sprites)
-        low = 0
-        high = leng-1
-        mid = low
-        while(low<=high):
-            mid = low + (high-low)//2
-            if(sprites_layers[sprites[mid]]<=layer):
-                low = mid+1
-            else:
-                high = mid-1
-        # linear search to find final position
-        while(mid<leng and sprites_layers[sprites[mid]]<=layer):
-            mid += 1
-        sprites.insert(mid, sprite)
-        
+
+    def _add_to_layer(self, sprite, layer):
+        """Append sprite to the end of the bucket for layer."""
+        buckets = self._layerbuckets
+        bucket = buckets.get(layer)
+        if bucket is None:
+            bucket = buckets[layer] = []
+            insort(self._layers, layer)
+        bucket.append(sprite)
+        self._spritelayers[sprite] = layer
+        self._spritelist_cache = None
+
+    def _remove_from_layer(self, sprite):
+        """Take sprite out of its layer bucket, dropping empty layers."""
+        layer = self._spritelayers.pop(sprite)
+        buckets = self._layerbuckets
+        bucket = buckets[layer]
+        bucket.remove(sprite)
+        if not bucket:
+            del buckets[layer]
+            layers = self._layers
+            del layers[bisect_left(layers, layer)]
+        self._spritelist_cache = None
+
+    def _get_spritelist(self):
+        # The flat draw order is only rebuilt when the layers have changed,
+        # so many layer changes per frame cost a single concatenation.
+        spritelist = self._spritelist_cache
+        if spritelist is None:
+            buckets = self._layerbuckets
+            spritelist = []
+            spritelist_extend = spritelist.extend
+            for layer in self._layers:
+                spritelist_extend(buckets[layer])
+            self._spritelist_cache = spritelist
+        return spritelist
+
+    _spritelist = property(_get_spritelist)
+
     def add(self, *sprites, **kwargs):
         """add a sprite or sequence of sprites to a group
         LayeredUpdates.add(*sprites, **kwargs): return None
@@ -617,20 +828,27 @@ class LayeredUpdates(AbstractGroup):
             layer = kwargs['layer']
         if sprites is None or not sprites:
             return
+        has = self.has_internal
+        add_internal = self.add_internal
         for sprite in sprites:
             # It's possible that some sprite is also an iterator.
             # If this is the case, we should add the sprite itself,
             # and not the objects it iterates over.
             if isinstance(sprite, Sprite):
-                if not self.has_internal(sprite):
-                    self.add_internal(sprite, layer)
+                if not has(sprite):
+                    add_internal(sprite, layer)
                     sprite.add_internal(self)
             else:
                 try:
                     # See if sprite is an iterator, like a list or sprite
                     # group.
                     for spr in sprite:
-                        self.add(spr, **kwargs)
+                        if isinstance(spr, Sprite):
+                            if not has(spr):
+                                add_internal(spr, layer)
+                                spr.add_internal(self)
+                        else:
+                            self.add(spr, **kwargs)
                 except (TypeError, AttributeError):
                     # Not iterable, this is probably a sprite that happens
                     # to not subclass Sprite. Alternately, it could be an
@@ -649,14 +867,13 @@ class LayeredUpdates(AbstractGroup):
         Do not use this method directly. It is used by the group to 
         add a sprite.
         """
-        self._spritelist.remove(sprite)
+        self._remove_from_layer(sprite)
         # these dirty rects are suboptimal for one frame
         self.lostsprites.append(self.spritedict[sprite]) # dirty rect
         if hasattr(sprite, 'rect'):
             self.lostsprites.append(sprite.rect) # dirty rect
         
         self.spritedict.pop(sprite, 0)
-        self._spritelayers.pop(sprite)
     
     def sprites(self):
         """returns a ordered list of sprites (first back, last top).
@@ -724,10 +941,7 @@ class LayeredUpdates(AbstractGroup):
         """returns a list of layers defined (unique), sorted from botton up.
         LayeredUpdates.layers(): return layers
         """
-        layers = set()
-        for layer in self._spritelayers.values():
-            layers.add(layer)
-        return list(layers)
+        return list(self._layers)
 
     def change_layer(self, sprite, new_layer):
         """changes the layer of the sprite
@@ -735,33 +949,10 @@ class LayeredUpdates(AbstractGroup):
 
         sprite must have been added to the renderer. It is not checked.
         """
-        sprites = self._spritelist # speedup
-        sprites_layers = self._spritelayers # speedup
-        
-        sprites.remove(sprite) 
-        sprites_layers.pop(sprite)
-        
-        # add the sprite at the right position
-        # bisect algorithmus
-        leng = len(sprites)
-        low = 0
-        high = leng-1
-        mid = low
-        while(low<=high):
-            mid = low + (high-low)//2
-            if(sprites_layers[sprites[mid]]<=new_layer):
-                low = mid+1
-            else:
-                high = mid-1
-        # linear search to find final position
-        while(mid<leng and sprites_layers[sprites[mid]]<=new_layer):
-            mid += 1
-        sprites.insert(mid, sprite)
+        self._remove_from_layer(sprite)
+        self._add_to_layer(sprite, new_layer)
         if hasattr(sprite, 'layer'):
             sprite.layer = new_layer
-        
-        # add layer info
-        sprites_layers[sprite] = new_layer
             
     def get_layer_of_sprite(self, sprite):
         """
@@ -774,13 +965,13 @@ class LayeredUpdates(AbstractGroup):
         """returns the top layer
         LayeredUpdates.get_top_layer(): return layer
         """
-        return self._spritelayers[self._spritelist[-1]]
+        return self._layers[-1]
     
     def get_bottom_layer(self):
         """returns the bottom layer
         LayeredUpdates.get_bottom_layer(): return layer
         """
-        return self._spritelayers[self._spritelist[0]]
+        return self._layers[0]
     
     def move_to_front(self, sprite):
         """brings the sprite to front layer
@@ -811,18 +1002,9 @@ class LayeredUpdates(AbstractGroup):
         LayeredUpdates.get_sprites_from_layer(layer): return sprites
 
         Returns all sprites from a layer, ordered by how they where added.
-        It uses linear search and the sprites are not removed from layer.
+        The sprites are not removed from layer.
         """
-        sprites = []
-        sprites_append = sprites.append
-        sprite_layers = self._spritelayers
-        for spr in self._spritelist:
-            if sprite_layers[spr] == layer: 
-                sprites_append(spr)
-            elif sprite_layers[spr]>layer:# break after because no other will 
-                                          # follow with same layer
-                break
-        return sprites
+        return list(self._layerbuckets.get(layer, ()))
         
     def switch_layer(self, layer1_nr, layer2_nr):
         """switches the sprites from layer1 to layer2
@@ -848,6 +1030,9 @@ class LayeredDirty(LayeredUpdates):
     pygame.sprite.RenderUpdates if you have many static sprites.  It 
     also switches automatically between dirty rect update and full 
     screen drawing, so you do no have to worry what would be faster.
+    The switch is driven by the fraction of the screen that is dirty,
+    with separate thresholds for each direction; get_stats() reports
+    the per-phase timings and the reason for the last switch.
 
     Same as for the pygame.sprite.Group.
     You can specify some additional attributes through kwargs:
@@ -855,6 +1040,8 @@ class LayeredDirty(LayeredUpdates):
         _default_layer: default layer where sprites without a layer are added.
         _time_threshold: treshold time for switching between dirty rect mode 
             and fullscreen mode, defaults to 1000./80  == 1000./fps
+        _dirty_fraction_low, _dirty_fraction_high: dirty area fractions
+            for switching modes, defaults to 0.3 and 0.5
 
     New in pygame 1.8.0
     """
@@ -869,6 +1056,8 @@ class LayeredDirty(LayeredUpdates):
                         added.
         _time_threshold: treshold time for switching between dirty rect mode and
                         fullscreen mode, defaults to 1000./80  == 1000./fps
+        _dirty_fraction_low, _dirty_fraction_high: dirty area fractions for
+                        switching modes, defaults to 0.3 and 0.5
         """
         LayeredUpdates.__init__(self, *sprites, **kwargs)
         self._clip = None
@@ -877,10 +1066,19 @@ class LayeredDirty(LayeredUpdates):
         
         self._time_threshold = 1000./80. # 1000./ fps
         
+        # fractions of dirty screen area for switching to full screen mode
+        # and back, see _select_mode
+        self._dirty_fraction_low = 0.3
+        self._dirty_fraction_high = 0.5
+        self._stats = {'mode': None, 'detect_time': 0., 'merge_time': 0.,
+                       'blit_time': 0., 'total_time': 0., 'dirty_rects': 0,
+                       'dirty_fraction': 0., 'frames': 0, 'switches': 0,
+                       'switch_reason': None}
         
         self._bgd = None
         for key, val in kwargs.items():
-            if key in ['_use_update', '_time_threshold', '_default_layer']:
+            if key in ['_use_update', '_time_threshold', '_default_layer',
+                       '_dirty_fraction_low', '_dirty_fraction_high']:
                 if hasattr(self, key):
                     setattr(self, key, val)
 
@@ -929,43 +1127,48 @@ class LayeredDirty(LayeredUpdates):
         if bgd is not None:
             self._bgd = bgd
         _bgd = self._bgd
+        _timer = perf_timer
+        stats = self._stats
         
         _surf.set_clip(_clip)
         # -------
-        # 0. deside if normal render of flip
-        start_time = get_ticks()
+        # 0. find the dirty sprites; their area is used to pick the mode
+        # for the next frame even when drawing full screen
+        start_time = _timer()
+        _dirty_rects = []
+        _dirty_rects_append = _dirty_rects.append
+        for spr in _sprites:
+            if 0 < spr.dirty:
+                # chose the right rect
+                if spr.source_rect:
+                    _union_rect = _rect(spr.rect.topleft, spr.source_rect.size)
+                else:
+                    _union_rect = _rect(spr.rect)
+                _dirty_rects_append(_union_rect.clip(_clip))
+                _dirty_rects_append(_rect(_old_rect[spr]).clip(_clip))
+        detect_time = _timer()
         if self._use_update: # dirty rects mode
-            # 1. find dirty area on screen and put the rects into _update
+            # 1. merge the dirty area, with the rects of removed sprites,
+            # into non-overlapping rects in _update
             # still not happy with that part
-            for spr in _sprites:
-                if 0 < spr.dirty:
-                    # chose the right rect
-                    if spr.source_rect:
-                        _union_rect = _rect(spr.rect.topleft, spr.source_rect.size)
-                    else:
-                        _union_rect = _rect(spr.rect)
-                        
-                    _union_rect_collidelist = _union_rect.collidelist
-                    _union_rect_union_ip = _union_rect.union_ip
+            _dirty_rects[:0] = [_rect(rec).clip(_clip) for rec in _update]
+            _update[:] = []
+            for _union_rect in _dirty_rects:
+                _union_rect_collidelist = _union_rect.collidelist
+                _union_rect_union_ip = _union_rect.union_ip
+                i = _union_rect_collidelist(_update)
+                while -1 < i:
+                    _union_rect_union_ip(_update[i])
+                    del _update[i]
                     i = _union_rect_collidelist(_update)
-                    while -1 < i:
-                        _union_rect_union_ip(_update[i])
-                        del _update[i]
-                        i = _union_rect_collidelist(_update)
-                    _update_append(_union_rect.clip(_clip))
-                    
-                    _union_rect = _rect(_old_rect[spr])
-                    _union_rect_collidelist = _union_rect.collidelist
-                    _union_rect_union_ip = _union_rect.union_ip
-                    i = _union_rect_collidelist(_update)
-                    while -1 < i:
-                        _union_rect_union_ip(_update[i])
-                        del _update[i]
-                        i = _union_rect_collidelist(_update)
-                    _update_append(_union_rect.clip(_clip))
+                _update_append(_union_rect.clip(_clip))
             # can it be done better? because that is an O(n**2) algorithm in
             # worst case
-                    
+            merge_time = _timer()
+            _dirty_area = 0
+            for rec in _update:
+                _dirty_area += rec.w * rec.h
+
             # clear using background
             if _bgd is not None:
                 for rec in _update:
@@ -996,24 +1199,40 @@ class LayeredDirty(LayeredUpdates):
                         spr.dirty = 0
             _ret = list(_update)
         else: # flip, full screen mode
+            # merging isn't needed to draw full screen, so the areas are
+            # just added up, counting overlaps more than once; that only
+            # keeps full screen mode while the screen is busy
+            _dirty_area = 0
+            for rec in _update:
+                rec = _rect(rec).clip(_clip)
+                _dirty_area += rec.w * rec.h
+            for rec in _dirty_rects:
+                _dirty_area += rec.w * rec.h
+            merge_time = _timer()
             if _bgd is not None:
                 _surf_blit(_bgd, (0, 0))
             for spr in _sprites:
                 if spr._visible:
                     _old_rect[spr] = _surf_blit(spr.image, spr.rect, spr.source_rect,spr.blendmode)
+                if spr.dirty == 1:
+                    spr.dirty = 0
             _ret = [_rect(_clip)] # return only the part of the screen changed
+        end_time = _timer()
             
-        
-        # timing for switching modes
-        # how to find a good treshold? it depends on the hardware it runs on
-        end_time = get_ticks()
-        if end_time-start_time > self._time_threshold:
-            self._use_update = False
+        # record what this frame cost, in milliseconds
+        stats['mode'] = 'dirty' if self._use_update else 'full'
+        stats['detect_time'] = (detect_time - start_time) * 1000.
+        stats['merge_time'] = (merge_time - detect_time) * 1000.
+        stats['blit_time'] = (end_time - merge_time) * 1000.
+        stats['total_time'] = (end_time - start_time) * 1000.
+        stats['dirty_rects'] = len(_ret)
+        _clip_area = _clip.w * _clip.h
+        if _clip_area > 0:
+            stats['dirty_fraction'] = min(_dirty_area / float(_clip_area), 1.)
         else:
-            self._use_update = True
-            
-##        # debug
-##        print "               check: using dirty rects:", self._use_update
+            stats['dirty_fraction'] = 0.
+        stats['frames'] += 1
+        self._select_mode()
             
         # emtpy dirty reas list
         _update[:] = []
@@ -1023,6 +1242,68 @@ class LayeredDirty(LayeredUpdates):
         _surf.set_clip(_orig_clip)
         return _ret
 
+    def _select_mode(self):
+        """pick dirty rect or full screen mode for the next frame
+
+        Full screen mode is used once the dirty area covers more than the
+        upper fraction of the clip area, or dirty rect drawing took longer
+        than the timing threshold. Dirty rect mode is only used again once
+        the dirty area drops below the lower fraction, so the mode doesn't
+        flip back and forth around a single value.
+        """
+        stats = self._stats
+        fraction = stats['dirty_fraction']
+        low, high = self._dirty_fraction_low, self._dirty_fraction_high
+        if self._use_update:
+            if fraction > high:
+                reason = 'dirty fraction %.2f > %.2f' % (fraction, high)
+            elif stats['total_time'] > self._time_threshold:
+                reason = 'draw time %.2fms > %.2fms' % (
+                    stats['total_time'], self._time_threshold)
+            else:
+                return
+            self._use_update = False
+        else:
+            if fraction >= low:
+                return
+            reason = 'dirty fraction %.2f < %.2f' % (fraction, low)
+            self._use_update = True
+        stats['switches'] += 1
+        stats['switch_reason'] = reason
+
+    def get_stats(self):
+        """timings and mode information for the last draw
+        LayeredDirty.get_stats(): return dict
+
+        The returned dict has the following keys:
+            mode: 'dirty' or 'full', the mode the last frame was drawn in
+            detect_time: milliseconds spent finding dirty sprites
+            merge_time: milliseconds spent merging dirty rects
+            blit_time: milliseconds spent clearing and blitting
+            total_time: sum of the above
+            dirty_rects: number of rects returned by draw()
+            dirty_fraction: dirty area as a fraction of the clip area;
+                in full screen mode overlapping rects are counted more
+                than once, up to the whole clip area
+            frames: number of frames drawn
+            switches: number of times the mode has changed
+            switch_reason: why the mode last changed, or None
+        """
+        return dict(self._stats)
+
+    def set_mode_thresholds(self, low, high):
+        """sets the dirty area fractions used to switch modes
+        LayeredDirty.set_mode_thresholds(low, high): return None
+
+        Full screen mode is used when more than high of the screen is
+        dirty, dirty rect mode when less than low is. Defaults are 0.3
+        and 0.5.
+        """
+        if not 0. <= low <= high:
+            raise ValueError("thresholds must satisfy 0 <= low <= high")
+        self._dirty_fraction_low = low
+        self._dirty_fraction_high = high
+
     def clear(self, surface, bgd):
         """used to set background
         Group.clear(surface, bgd): return None
@@ -1129,6 +1410,281 @@ class GroupSingle(AbstractGroup):
     def __contains__(self, sprite): return (self.__sprite is sprite)
 
 
+class BatchSprite(object):
+    """a view of a single slot in a SpriteBatch
+    pygame.sprite.BatchSprite(batch, index): return BatchSprite
+
+    These are created on demand by SpriteBatch.sprites() so that batches
+    can be passed to spritecollide(), groupcollide() and friends. They
+    hold no state of their own.
+    """
+
+    __slots__ = ('batch', 'index')
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+
+    @property
+    def rect(self):
+        return self.batch.get_rect(self.index)
+
+    @property
+    def image(self):
+        return self.batch.get_image(self.index)
+
+    def kill(self):
+        self.batch.kill(self.index)
+
+    def alive(self):
+        return self.batch.is_alive(self.index)
+
+    def __eq__(self, other):
+        return (isinstance(other, BatchSprite) and
+                self.batch is other.batch and self.index == other.index)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.batch), self.index))
+
+    def __repr__(self):
+        return "<BatchSprite(slot %d)>" % self.index
+
+
+class SpriteBatch(object):
+    """container for large numbers of simple, homogeneous sprites
+    pygame.sprite.SpriteBatch(images, capacity=256): return SpriteBatch
+
+    Instead of one Python object per sprite, a SpriteBatch keeps the
+    position, velocity, image index and alive flag of every sprite in
+    parallel C arrays. update() moves all live sprites by their velocity
+    in a single call and draw() blits them all in a single call, which
+    makes it suitable for particles, bullets and the like.
+
+    Sprites are identified by the integer slot returned by spawn(). Slots
+    of killed sprites are reused by later spawns.
+
+    For the collision functions a batch behaves like a group of
+    BatchSprite objects with rect and image attributes and a kill()
+    method.
+    """
+
+    def __init__(self, images, capacity=256):
+        capacity = max(int(capacity), 1)
+        self._capacity = capacity
+        self._count = 0     # high water mark of used slots
+        self._live = 0
+        self._free = []
+        self._x = ffi.new('double[]', capacity)
+        self._y = ffi.new('double[]', capacity)
+        self._vx = ffi.new('double[]', capacity)
+        self._vy = ffi.new('double[]', capacity)
+        self._image = ffi.new('int[]', capacity)
+        self._alive = ffi.new('Uint8[]', capacity)
+        self.set_images(images)
+
+    def set_images(self, images):
+        """set the list of images the sprites are drawn with
+        SpriteBatch.set_images(images): return None
+
+        Each sprite refers to its image by index into this list, so
+        IndexError is raised if live sprites use an index the new list
+        doesn't have.
+        """
+        images = list(images)
+        nimages = len(images)
+        image, alive = self._image, self._alive
+        for i in range(self._count):
+            if alive[i] and image[i] >= nimages:
+                raise IndexError("sprite %d uses image %d, out of range" %
+                                 (i, image[i]))
+        self._images = images
+        self._c_images = ffi.new('SDL_Surface *[]', max(nimages, 1))
+        self._widths = ffi.new('int[]', max(nimages, 1))
+        self._heights = ffi.new('int[]', max(nimages, 1))
+        for i, image in enumerate(images):
+            self._c_images[i] = image._c_surface
+            self._widths[i], self._heights[i] = image.get_size()
+
+    def _grow(self):
+        count = self._count
+        capacity = self._capacity * 2
+        for name, ctype, size in (('_x', 'double[]', 8),
+                                  ('_y', 'double[]', 8),
+                                  ('_vx', 'double[]', 8),
+                                  ('_vy', 'double[]', 8),
+                                  ('_image', 'int[]', ffi.sizeof('int')),
+                                  ('_alive', 'Uint8[]', 1)):
+            new = ffi.new(ctype, capacity)
+            ffi.memmove(new, getattr(self, name), count * size)
+            setattr(self, name, new)
+        self._capacity = capacity
+
+    def spawn(self, pos, velocity=(0, 0), image=0):
+        """add a sprite to the batch
+        SpriteBatch.spawn(pos, velocity=(0, 0), image=0): return index
+
+        Returns the slot of the new sprite.
+        """
+        if not 0 <= image < len(self._images):
+            raise IndexError("image index out of range")
+        if self._free:
+            index = self._free.pop()
+        else:
+            if self._count == self._capacity:
+                self._grow()
+            index = self._count
+            self._count += 1
+        self._x[index], self._y[index] = pos
+        self._vx[index], self._vy[index] = velocity
+        self._image[index] = image
+        self._alive[index] = 1
+        self._live += 1
+        return index
+
+    def kill(self, index):
+        """remove a sprite from the batch
+        SpriteBatch.kill(index): return None
+
+        Killing a sprite that is already dead does nothing.
+        """
+        if 0 <= index < self._count and self._alive[index]:
+            self._alive[index] = 0
+            self._free.append(index)
+            self._live -= 1
+
+    def kill_many(self, indices):
+        """remove several sprites from the batch
+        SpriteBatch.kill_many(indices): return None
+        """
+        for index in indices:
+            self.kill(index)
+
+    def is_alive(self, index):
+        """SpriteBatch.is_alive(index): return bool"""
+        return 0 <= index < self._count and bool(self._alive[index])
+
+    def empty(self):
+        """remove all sprites
+        SpriteBatch.empty(): return None
+        """
+        ffi.memmove(self._alive, b'\x00' * self._count, self._count)
+        self._count = 0
+        self._live = 0
+        self._free = []
+
+    def get_pos(self, index):
+        """SpriteBatch.get_pos(index): return (x, y)"""
+        return self._x[index], self._y[index]
+
+    def set_pos(self, index, pos):
+        """SpriteBatch.set_pos(index, (x, y)): return None"""
+        self._x[index], self._y[index] = pos
+
+    def get_velocity(self, index):
+        """SpriteBatch.get_velocity(index): return (vx, vy)"""
+        return self._vx[index], self._vy[index]
+
+    def set_velocity(self, index, velocity):
+        """SpriteBatch.set_velocity(index, (vx, vy)): return None"""
+        self._vx[index], self._vy[index] = velocity
+
+    def get_image(self, index):
+        """SpriteBatch.get_image(index): return Surface"""
+        return self._images[self._image[index]]
+
+    def set_image(self, index, image):
+        """SpriteBatch.set_image(index, image_index): return None"""
+        if not 0 <= image < len(self._images):
+            raise IndexError("image index out of range")
+        self._image[index] = image
+
+    def get_rect(self, index):
+        """the area covered by a sprite
+        SpriteBatch.get_rect(index): return Rect
+        """
+        image = self._image[index]
+        return Rect(int(self._x[index]), int(self._y[index]),
+                    self._widths[image], self._heights[image])
+
+    def update(self, dt=1.0):
+        """move all live sprites by their velocity
+        SpriteBatch.update(dt=1.0): return None
+
+        Each live sprite's position is advanced by velocity * dt.
+        """
+        sdl.spritebatch_integrate(self._x, self._y, self._vx, self._vy,
+                                  self._alive, self._count, dt)
+
+    def draw(self, surface):
+        """draw all live sprites onto the surface
+        SpriteBatch.draw(surface): return None
+        """
+        surface.check_surface()
+        if surface.is_pure_opengl():
+            raise SDLError("Cannot blit to OPENGL Surfaces (OPENGLBLIT is ok)")
+        c_dest = surface._c_surface
+        # the images' SDL surfaces can be freed or replaced after
+        # set_images(), as the display surface is by display.quit()
+        c_images = self._c_images
+        for i, image in enumerate(self._images):
+            image.check_surface()
+            c_images[i] = image._c_surface
+        if surface.subsurfacedata or c_dest.format.BytesPerPixel == 1:
+            # Let Surface.blit deal with the awkward destinations
+            surface_blit = surface.blit
+            for index in self.indices():
+                surface_blit(self.get_image(index),
+                             (self._x[index], self._y[index]))
+            return
+        if sdl.spritebatch_blit(self._c_images, len(self._images),
+                                self._image, self._x, self._y, self._alive,
+                                self._count, c_dest) == -1:
+            raise SDLError.from_sdl_error()
+
+    def collide_rect(self, rect):
+        """find the sprites that intersect a rect
+        SpriteBatch.collide_rect(rect): return index_list
+        """
+        r = game_rect_from_obj(rect)
+        out = ffi.new('int[]', max(self._count, 1))
+        found = sdl.spritebatch_collide_rect(
+            self._widths, self._heights, len(self._images), self._image,
+            self._x, self._y, self._alive, self._count,
+            r.x, r.y, r.w, r.h, out)
+        return [out[i] for i in range(found)]
+
+    def indices(self):
+        """list of the slots of all live sprites
+        SpriteBatch.indices(): return index_list
+        """
+        alive = self._alive
+        return [i for i in range(self._count) if alive[i]]
+
+    def sprites(self):
+        """list of BatchSprite views of all live sprites
+        SpriteBatch.sprites(): return sprite_list
+        """
+        return [BatchSprite(self, i) for i in self.indices()]
+
+    def __iter__(self):
+        return iter(self.sprites())
+
+    def __len__(self):
+        return self._live
+
+    def __nonzero__(self):
+        return self._live != 0
+
+    def __bool__(self):
+        return self._live != 0
+
+    def __repr__(self):
+        return "<%s(%d sprites)>" % (self.__class__.__name__, len(self))
+
+
 
 
 
@@ -1333,6 +1889,12 @@ def spritecollide(sprite, group, dokill, collided = None):
     must have a "rect" value, which is a rectangle of the sprite area, which will 
     be used to calculate the collision.
     """
+    if collided is None and isinstance(group, SpriteBatch):
+        # Let the batch find the collisions in a single pass
+        indices = group.collide_rect(sprite.rect)
+        if dokill:
+            group.kill_many(indices)
+        return [BatchSprite(group, i) for i in indices]
     crashed = []
     if collided is None:
         # Special case old behaviour for speed.
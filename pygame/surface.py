@@ -129,6 +129,8 @@ class Surface(object):
     """
     _c_surface = None
     subsurfacedata = None
+    # the buffer the pixels of an image.frombuffer() Surface live in
+    _pixel_buffer = None
 
     def __init__(self, size, flags=0, depth=0, masks=None):
         w, h = unpack_rect(size)
@@ -22,13 +22,28 @@
 """ pygame module for monitoring time
 """
 
+import array
 import atexit
+import bisect
+import math
+from timeit import default_timer as _perf_counter
+
 from pygame._sdl import sdl, ffi
 from pygame._error import SDLError
 
+try:
+    import asyncio
+except ImportError:
+    # Python 2
+    asyncio = None
+
 
 WORST_CLOCK_ACCURACY = 12
 
+# Value returned by get_ticks() while events are replayed from a log,
+# see pygame.event.start_replay
+_virtual_ticks = None
+
 
 def _get_init():
     return sdl.SDL_WasInit(sdl.SDL_INIT_TIMER)
@@ -41,23 +56,44 @@ def _try_init():
 
 
 class Clock(object):
-    """ Clock() -> Clock
+    """ Clock(history=0, spin=2) -> Clock
     create an object to help track time
+
+    With a history, the clock also measures each frame with a high
+    resolution timer and keeps the last history frame times for
+    get_frame_times() and get_frame_stats(). tick() then sleeps with
+    SDL_Delay until spin milliseconds before the end of the frame and
+    busy waits the rest, so frames are paced to well under a
+    millisecond.
     """
 
-    def __init__(self):
+    def __init__(self, history=0, spin=2):
         _try_init()
         self._last_tick = get_ticks()
         self._rawpassed = 0
         self._fps_count = 0
         self._fps_tick = 0
         self._fps = 0.0
+        if history < 0:
+            raise ValueError("history must not be negative")
+        self._frame_times = None
+        if history:
+            self._frame_times = array.array('d', [0.0]) * history
+            self._frame_count = 0
+            self._spin = spin / 1000.0
+            self._last_time = _perf_counter()
+
+    def _frame_delay(self, framerate):
+        """Return the milliseconds left until the end of the frame"""
+        endtime = int((1.0 / framerate) * 1000.)
+        self._rawpassed = sdl.SDL_GetTicks() - self._last_tick
+        return endtime - self._rawpassed
 
     def _base(self, framerate=None, use_accurate_delay=False):
+        if self._frame_times is not None:
+            return self._precise_base(framerate)
         if framerate:
-            endtime = int((1.0 / framerate) * 1000.)
-            self._rawpassed = sdl.SDL_GetTicks() - self._last_tick
-            delay = endtime - self._rawpassed
+            delay = self._frame_delay(framerate)
 
             _try_init()
 
@@ -67,6 +103,9 @@ class Clock(object):
                 delay = max(delay, 0)
                 sdl.SDL_Delay(delay)
 
+        return self._update(framerate)
+
+    def _update(self, framerate):
         nowtime = sdl.SDL_GetTicks()
         self._timepassed = nowtime - self._last_tick
         self._fps_count += 1
@@ -88,6 +127,68 @@ class Clock(object):
 
         return self._timepassed
 
+    def _precise_base(self, framerate):
+        if framerate:
+            endtime = self._last_time + 1.0 / framerate
+            self._rawpassed = int((_perf_counter() - self._last_time) * 1000)
+            _try_init()
+            _precise_delay(endtime, self._spin)
+        result = self._update(framerate)
+        self._record_frame()
+        return result
+
+    def _record_frame(self):
+        now = _perf_counter()
+        frame_times = self._frame_times
+        frame_times[self._frame_count % len(frame_times)] = (
+            (now - self._last_time) * 1000.0)
+        self._frame_count += 1
+        self._last_time = now
+
+    def get_frame_times(self):
+        """ get_frame_times() -> list
+        frame times in milliseconds of the last ticks, oldest first
+
+        Only a Clock with a history records frame times.
+        """
+        frame_times = self._frame_times
+        if frame_times is None:
+            return []
+        size = len(frame_times)
+        if self._frame_count <= size:
+            return frame_times[:self._frame_count].tolist()
+        start = self._frame_count % size
+        return (frame_times[start:] + frame_times[:start]).tolist()
+
+    def get_frame_stats(self, jank=None):
+        """ get_frame_stats(jank=None) -> dict
+        statistics of the recorded frame times
+
+        Gives the number of frames and the mean, p50, p95, p99 and max
+        frame times in milliseconds. jank counts the frames longer than
+        jank milliseconds, by default twice the median frame time.
+        """
+        times = sorted(self.get_frame_times())
+        count = len(times)
+        if not count:
+            return {'frames': 0, 'mean': 0.0, 'p50': 0.0, 'p95': 0.0,
+                    'p99': 0.0, 'max': 0.0, 'jank': 0}
+
+        def percentile(p):
+            # nearest rank
+            return times[max(int(math.ceil(p / 100.0 * count)) - 1, 0)]
+
+        p50 = percentile(50)
+        if jank is None:
+            jank = 2 * p50
+        return {'frames': count,
+                'mean': math.fsum(times) / count,
+                'p50': p50,
+                'p95': percentile(95),
+                'p99': percentile(99),
+                'max': times[-1],
+                'jank': count - bisect.bisect_right(times, jank)}
+
     def tick(self, framerate=0):
         """ tick(framerate=0) -> milliseconds
         update the clock
@@ -118,16 +219,61 @@ class Clock(object):
         """
         return self._base(framerate, True)
 
+    def tick_async(self, framerate=0, loop=None):
+        """ tick_async(framerate=0, loop=None) -> awaitable
+        update the clock without blocking the asyncio event loop
+
+        Like tick(), but the rest of the frame is spent in the event loop
+        rather than in SDL_Delay, so other tasks can run. The returned
+        future gives the milliseconds since the previous tick.
+        """
+        if loop is None:
+            loop = _get_event_loop()
+        future = _new_future(loop)
+        delay = 0
+        if framerate:
+            delay = max(self._frame_delay(framerate), 0)
+            _try_init()
+
+        def finish():
+            if not future.cancelled():
+                result = self._update(framerate)
+                if self._frame_times is not None:
+                    self._record_frame()
+                future.set_result(result)
+
+        loop.call_later(delay / 1000.0, finish)
+        return future
+
+
+def _get_event_loop():
+    if asyncio is None:
+        raise NotImplementedError("asyncio is not available")
+    return asyncio.get_event_loop()
+
+
+def _new_future(loop):
+    if hasattr(loop, 'create_future'):
+        return loop.create_future()
+    return asyncio.Future(loop=loop)
+
 
 def get_ticks():
     """ get_ticks() -> milliseconds
     get the time in milliseconds
     """
+    if _virtual_ticks is not None:
+        return _virtual_ticks
     if not _get_init():
         return 0
     return sdl.SDL_GetTicks()
 
 
+def _set_virtual_ticks(ticks):
+    global _virtual_ticks
+    _virtual_ticks = ticks
+
+
 _event_timers = {}
 
 
@@ -167,6 +313,213 @@ def set_timer(eventid, milliseconds):
     _event_timers[eventid] = newtimer
 
 
+# A TimerWheel has a root wheel of 2**_WHEEL_ROOT_BITS slots, one per
+# tick, and _WHEEL_LEVELS coarser wheels of 2**_WHEEL_LEVEL_BITS slots,
+# each slot spanning a full turn of the wheel below it
+_WHEEL_ROOT_BITS = 8
+_WHEEL_LEVEL_BITS = 6
+_WHEEL_LEVELS = 3
+_WHEEL_ROOT_MASK = (1 << _WHEEL_ROOT_BITS) - 1
+_WHEEL_LEVEL_MASK = (1 << _WHEEL_LEVEL_BITS) - 1
+_WHEEL_SPAN = 1 << (_WHEEL_ROOT_BITS + _WHEEL_LEVELS * _WHEEL_LEVEL_BITS)
+
+
+class _WheelTimer(object):
+    __slots__ = ('timer_id', 'expires', 'interval', 'event', 'active')
+
+    def __init__(self, timer_id, expires, interval, event):
+        self.timer_id = timer_id
+        self.expires = expires
+        self.interval = interval
+        self.event = event
+        self.active = True
+
+
+class TimerWheel(object):
+    """ TimerWheel(resolution=1) -> TimerWheel
+    schedule many timer events from the main loop
+
+    Unlike set_timer(), which runs an SDL timer thread per event type,
+    the timers of a TimerWheel are only checked when expire() or
+    update() is called, usually once per frame, so any number of one
+    shot and repeating timers with any event are cheap. Timers fire at
+    whole multiples of resolution milliseconds, as told by get_ticks().
+    """
+
+    def __init__(self, resolution=1):
+        if resolution <= 0:
+            raise ValueError("resolution must be positive")
+        self._resolution = resolution
+        # the next tick to expire
+        self._current = get_ticks() // resolution + 1
+        self._root = [[] for i in range(1 << _WHEEL_ROOT_BITS)]
+        self._levels = [[[] for i in range(1 << _WHEEL_LEVEL_BITS)]
+                        for level in range(_WHEEL_LEVELS)]
+        self._timers = {}
+        self._next_id = 1
+
+    def __len__(self):
+        return len(self._timers)
+
+    def _place(self, timer):
+        delta = timer.expires - self._current
+        if delta < 1 << _WHEEL_ROOT_BITS:
+            self._root[timer.expires & _WHEEL_ROOT_MASK].append(timer)
+            return
+        # timers beyond the last wheel wait in its furthest slot and are
+        # placed again when it comes round
+        expires = min(timer.expires, self._current + _WHEEL_SPAN - 1)
+        level = 0
+        shift = _WHEEL_ROOT_BITS
+        while (level < _WHEEL_LEVELS - 1 and
+               delta >= 1 << (shift + _WHEEL_LEVEL_BITS)):
+            level += 1
+            shift += _WHEEL_LEVEL_BITS
+        self._levels[level][(expires >> shift) & _WHEEL_LEVEL_MASK].append(
+            timer)
+
+    def _cascade(self):
+        """Spread the timers of the coarser slots that start at the
+        current tick over the finer wheels"""
+        shift = _WHEEL_ROOT_BITS
+        for slots in self._levels:
+            index = (self._current >> shift) & _WHEEL_LEVEL_MASK
+            slot = slots[index]
+            slots[index] = []
+            for timer in slot:
+                if timer.active:
+                    self._place(timer)
+            if index:
+                break
+            shift += _WHEEL_LEVEL_BITS
+
+    def _next_tick(self, limit):
+        """Return the first tick from the current one on where a root slot
+        has timers or a coarser slot with timers cascades, or limit if
+        there is none before it"""
+        current = self._current
+        root = self._root
+        index = current & _WHEEL_ROOT_MASK
+        if index:
+            start = current - index
+            for i in range(index, 1 << _WHEEL_ROOT_BITS):
+                if root[i]:
+                    return min(start + i, limit)
+            current = start + (1 << _WHEEL_ROOT_BITS)
+            if current >= limit:
+                return limit
+        # a new turn of the root wheel starts at current
+        if any(root):
+            return current
+        shift = _WHEEL_ROOT_BITS
+        for slots in self._levels:
+            # the first turn of this wheel's slots from current on
+            first = ((current + (1 << shift) - 1) >> shift) << shift
+            first_index = (first >> shift) & _WHEEL_LEVEL_MASK
+            for i, slot in enumerate(slots):
+                if slot:
+                    tick = first + (((i - first_index) & _WHEEL_LEVEL_MASK)
+                                    << shift)
+                    limit = min(tick, limit)
+            shift += _WHEEL_LEVEL_BITS
+        return limit
+
+    def add(self, event, milliseconds, repeat=False):
+        """ add(event, milliseconds, repeat=False) -> timer_id
+        post an event after a delay
+
+        event is an Event or an event type. With repeat, the event is
+        posted every milliseconds until the timer is removed.
+        """
+        from pygame.event import Event, EventType
+        if not isinstance(event, EventType):
+            event = Event(event)
+        if milliseconds <= 0:
+            raise ValueError("milliseconds must be positive")
+        interval = max(int(math.ceil(float(milliseconds) /
+                                     self._resolution)), 1)
+        expires = max(get_ticks() // self._resolution + interval,
+                      self._current)
+        timer_id = self._next_id
+        self._next_id += 1
+        timer = _WheelTimer(timer_id, expires,
+                            interval if repeat else 0, event)
+        self._timers[timer_id] = timer
+        self._place(timer)
+        return timer_id
+
+    def remove(self, timer_id):
+        """ remove(timer_id) -> bool
+        stop a timer, returns False if it already expired
+        """
+        timer = self._timers.pop(timer_id, None)
+        if timer is None:
+            return False
+        timer.active = False
+        return True
+
+    def clear(self):
+        """ clear() -> None
+        stop all timers
+        """
+        for timer in self._timers.values():
+            timer.active = False
+        self._timers.clear()
+
+    def expire(self, now=None):
+        """ expire(now=None) -> list
+        return the events of the timers due by now
+
+        now defaults to get_ticks(). Repeating timers that were due more
+        than once since the last call give an event for every interval.
+        """
+        if now is None:
+            now = get_ticks()
+        target = now // self._resolution
+        root = self._root
+        timers = self._timers
+        due = []
+        while self._current <= target:
+            if not timers:
+                self._current = target + 1
+                break
+            # skip the ticks where nothing happens, as after a long pause
+            self._current = self._next_tick(target + 1)
+            if self._current > target:
+                break
+            index = self._current & _WHEEL_ROOT_MASK
+            if not index:
+                self._cascade()
+            slot = root[index]
+            if slot:
+                root[index] = []
+                for timer in slot:
+                    if not timer.active:
+                        continue
+                    due.append(timer.event)
+                    if timer.interval:
+                        timer.expires += timer.interval
+                        self._place(timer)
+                    else:
+                        timer.active = False
+                        del timers[timer.timer_id]
+            self._current += 1
+        return due
+
+    def update(self, now=None):
+        """ update(now=None) -> count
+        post the events of the timers due by now
+
+        The events are posted with a single pygame.event.post_many()
+        call, which raises SDLError if the event queue fills up.
+        """
+        from pygame.event import post_many
+        events = self.expire(now)
+        if events:
+            post_many(events)
+        return len(events)
+
+
 def wait(milliseconds):
     """ wait(milliseconds) -> time
     pause the program for an amount of time
@@ -203,6 +556,16 @@ def _accurate_delay(ticks):
     return sdl.SDL_GetTicks() - start
 
 
+def _precise_delay(endtime, spin):
+    """Wait until _perf_counter() reaches endtime, sleeping in SDL_Delay
+    until spin seconds before it"""
+    remaining = endtime - spin - _perf_counter()
+    if remaining >= 0.001:
+        sdl.SDL_Delay(int(remaining * 1000))
+    while _perf_counter() < endtime:
+        pass
+
+
 def delay(milliseconds):
     """ delay(milliseconds) -> time
     pause the program for an amount of time
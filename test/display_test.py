@@ -16,6 +16,9 @@ else:
     from test.test_utils import test_not_implemented, unittest
 import pygame, pygame.transform
 
+import array
+import os
+
 class DisplayModuleTest( unittest.TestCase ):
     def test_update( self ):
         """ see if pygame.display.update takes rects with negative values.
@@ -61,6 +64,81 @@ class DisplayModuleTest( unittest.TestCase ):
 
             """
 
+    def test_update_rect_list(self):
+        pygame.init()
+        try:
+            screen = pygame.display.set_mode((100, 100))
+            r1 = pygame.Rect(-10, -10, 30, 30)
+            r2 = pygame.Rect(15, 15, 30, 30)
+            pygame.display.update([r1, r2, (90, 90, 20, 20), None])
+            # the rects aren't cropped in place
+            self.assertEqual(r1, (-10, -10, 30, 30))
+
+            pygame.display.update(array.array('i', [0, 0, 10, 10,
+                                                    10, 0, 10, 10]))
+            pygame.display.update(memoryview(array.array('i', [0] * 4)))
+            self.assertRaises(ValueError, pygame.display.update,
+                              array.array('i', [0, 0, 10]))
+
+            old_cost = pygame.display.get_update_rect_cost()
+            pygame.display.set_update_rect_cost(-1)
+            self.assertEqual(pygame.display.get_update_rect_cost(), -1)
+            pygame.display.update([r1, r2])
+            pygame.display.set_update_rect_cost(old_cost)
+        finally:
+            pygame.quit()
+
+    def test_headless_capture(self):
+        pygame.init()
+        try:
+            screen = pygame.display.set_mode((20, 10), headless=True)
+            self.assertTrue(pygame.display.get_headless())
+            seen = []
+            pygame.display.set_capture(2, callback=seen.append)
+            for color in ((255, 0, 0), (0, 255, 0), (0, 0, 255)):
+                screen.fill(color)
+                pygame.display.flip()
+            self.assertEqual(len(seen), 3)
+            frames = pygame.display.get_frames()
+            self.assertEqual([f.get_at((0, 0)) for f in frames],
+                             [(0, 255, 0, 255), (0, 0, 255, 255)])
+            # frames are copies, not the display surface
+            screen.fill((0, 0, 0))
+            self.assertEqual(frames[1].get_at((0, 0)), (0, 0, 255, 255))
+
+            pygame.display.set_capture(1, raw=True)
+            pygame.display.update((0, 0, 5, 5))
+            frames = pygame.display.get_frames()
+            self.assertEqual(len(frames), 1)
+            self.assertEqual(len(frames[0]),
+                             screen.get_pitch() * screen.get_height())
+            self.assertRaises(pygame.error, pygame.display.set_mode,
+                              (20, 10), pygame.OPENGL, 0, True)
+        finally:
+            pygame.display.set_capture()
+            pygame.quit()
+
+    def test_headless_driver_switch(self):
+        old_driver = os.environ.get('SDL_VIDEODRIVER')
+        try:
+            pygame.display.set_mode((20, 20), headless=True)
+            # make going back to a windowed display fail
+            os.environ['SDL_VIDEODRIVER'] = 'no-such-driver'
+            self.assertRaises(pygame.error, pygame.display.set_mode, (20, 20))
+            self.assertFalse(pygame.display.get_headless())
+            self.assertRaises(pygame.error, pygame.display.get_surface)
+
+            pygame.display.set_mode((30, 30), headless=True)
+            self.assertTrue(pygame.display.get_headless())
+            self.assertEqual(pygame.display.get_surface().get_size(), (30, 30))
+            pygame.display.flip()
+        finally:
+            if old_driver is None:
+                os.environ.pop('SDL_VIDEODRIVER', None)
+            else:
+                os.environ['SDL_VIDEODRIVER'] = old_driver
+            pygame.display.quit()
+
     def todo_test_Info(self):
 
         # __doc__ (as of 2008-08-02) for pygame.display.Info:
@@ -1,5 +1,6 @@
 #################################### IMPORTS ###################################
 
+import io
 import os
 
 if __name__ == '__main__':
@@ -158,6 +159,327 @@ class EventModuleTest(unittest.TestCase):
 
         self.assert_ ( len(pygame.event.get()) >= 10 )
 
+    def test_get_type(self):
+        pygame.event.post(pygame.event.Event(pygame.USEREVENT, a=1))
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN))
+        pygame.event.post(pygame.event.Event(pygame.USEREVENT, a=2))
+        pygame.event.post(pygame.event.Event(pygame.KEYUP))
+
+        events = pygame.event.get(pygame.USEREVENT)
+        self.assertEquals([e.a for e in events], [1, 2])
+        events = pygame.event.get([pygame.KEYDOWN, pygame.KEYUP])
+        self.assertEquals([e.type for e in events],
+                          [pygame.KEYDOWN, pygame.KEYUP])
+        self.assertRaises(TypeError, pygame.event.get, 'abc')
+        self.assertRaises(ValueError, pygame.event.get, pygame.NUMEVENTS)
+
+    def test_get_many(self):
+        # more events than are fetched by a single batch, but fewer than
+        # fit on the SDL 1.2 event queue
+        for i in range(100):
+            pygame.event.post(pygame.event.Event(pygame.USEREVENT, i=i))
+        events = pygame.event.get()
+        self.assertEquals([e.i for e in events if e.type == pygame.USEREVENT],
+                          list(range(100)))
+
+    def test_clear_type(self):
+        pygame.event.post(pygame.event.Event(pygame.USEREVENT))
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN))
+
+        pygame.event.clear(pygame.KEYDOWN)
+        self.assert_(not pygame.event.peek(pygame.KEYDOWN))
+        self.assert_(pygame.event.peek(pygame.USEREVENT))
+
+    def _push_mousemotion(self, pos, rel, state=0):
+        # push a raw SDL event, as the video driver would
+        from pygame._sdl import sdl, ffi
+        sdl_event = ffi.new("SDL_Event *")
+        sdl_event.type = pygame.MOUSEMOTION
+        sdl_event.motion.x, sdl_event.motion.y = pos
+        sdl_event.motion.xrel, sdl_event.motion.yrel = rel
+        sdl_event.motion.state = state
+        self.assertEquals(sdl.SDL_PushEvent(sdl_event), 0)
+
+    def test_sdl_event_attributes(self):
+        self._push_mousemotion((10, 20), (-3, 4), state=1)
+        self._push_mousemotion((12, 22), (2, 2))
+        e1, e2 = pygame.event.get(pygame.MOUSEMOTION)
+        self.assertEquals(e1.type, pygame.MOUSEMOTION)
+        self.assertEquals(e2.pos, (12, 22))
+        self.assertEquals(e1.pos, (10, 20))
+        self.assertEquals(e1.rel, (-3, 4))
+        self.assertEquals(e1.buttons, (1, 0, 0))
+        # decoded attributes can be replaced
+        e1.pos = (0, 0)
+        self.assertEquals(e1.pos, (0, 0))
+        self.assertEquals(e2.pos, (12, 22))
+        # and new ones added, as on any event
+        e2.handled = True
+        self.assert_(e2.handled)
+        self.assertEquals(e2.pos, (12, 22))
+
+    def _push_joyaxis(self, joy, axis, value):
+        from pygame._sdl import sdl, ffi
+        sdl_event = ffi.new("SDL_Event *")
+        sdl_event.type = pygame.JOYAXISMOTION
+        sdl_event.jaxis.which = joy
+        sdl_event.jaxis.axis = axis
+        sdl_event.jaxis.value = value
+        self.assertEquals(sdl.SDL_PushEvent(sdl_event), 0)
+
+    def test_coalesce_mousemotion(self):
+        pygame.event.set_coalesced(pygame.MOUSEMOTION)
+        try:
+            self.assert_(pygame.event.get_coalesced(pygame.MOUSEMOTION))
+            self.assert_(not pygame.event.get_coalesced(pygame.JOYAXISMOTION))
+            # more events than are fetched by a single batch
+            for i in range(100):
+                self._push_mousemotion((i, i * 2), (1, 2), state=i % 2)
+            pygame.event.post(pygame.event.Event(pygame.USEREVENT))
+            self._push_mousemotion((5, 6), (-1, -1))
+            events = pygame.event.get()
+        finally:
+            pygame.event.set_coalesced(None)
+        self.assertEquals([e.type for e in events],
+                          [pygame.MOUSEMOTION, pygame.USEREVENT,
+                           pygame.MOUSEMOTION])
+        self.assertEquals(events[0].pos, (99, 198))
+        self.assertEquals(events[0].rel, (100, 200))
+        self.assertEquals(events[0].buttons, (1, 0, 0))
+        self.assertEquals(events[2].rel, (-1, -1))
+        self.assert_(not pygame.event.get_coalesced(pygame.MOUSEMOTION))
+
+    def test_coalesce_posted_events(self):
+        pygame.event.clear()
+        pygame.event.set_coalesced([pygame.MOUSEMOTION, pygame.JOYAXISMOTION])
+        try:
+            pygame.event.post(pygame.event.Event(pygame.MOUSEMOTION, a=1))
+            pygame.event.post(pygame.event.Event(pygame.MOUSEMOTION, a=2))
+            self._push_mousemotion((5, 6), (1, 1))
+            pygame.event.post_many([
+                pygame.event.Event(pygame.JOYAXISMOTION, joy=0, axis=0, a=3),
+                pygame.event.Event(pygame.JOYAXISMOTION, joy=0, axis=0, a=4)])
+            events = pygame.event.get()
+        finally:
+            pygame.event.set_coalesced(None)
+        # posted events are never merged, with each other or SDL's
+        self.assertEquals([getattr(e, 'a', None) for e in events],
+                          [1, 2, None, 3, 4])
+        self.assertEquals(events[2].pos, (5, 6))
+        self.assertEquals(self._posted_event_slots(), 0)
+
+    def test_coalesce_joyaxismotion(self):
+        pygame.event.set_coalesced([pygame.JOYAXISMOTION])
+        try:
+            self._push_joyaxis(0, 0, 100)
+            self._push_joyaxis(0, 1, 200)
+            self._push_joyaxis(1, 0, 300)
+            self._push_joyaxis(0, 0, -32767)
+            events = pygame.event.get()
+        finally:
+            pygame.event.set_coalesced(None)
+        self.assertEquals([(e.joy, e.axis, e.value) for e in events],
+                          [(0, 0, -1.0), (0, 1, 200 / 32767.0),
+                           (1, 0, 300 / 32767.0)])
+        self.assertRaises(ValueError, pygame.event.set_coalesced,
+                          pygame.KEYDOWN)
+
+    def test_post_many(self):
+        pygame.event.post_many([
+            pygame.event.Event(pygame.USEREVENT, a=1),
+            pygame.event.Event(pygame.KEYDOWN, a=2),
+            pygame.event.Event(pygame.USEREVENT, a=3)])
+        events = pygame.event.get()
+        self.assertEquals([(e.type, e.a) for e in events],
+                          [(pygame.USEREVENT, 1), (pygame.KEYDOWN, 2),
+                           (pygame.USEREVENT, 3)])
+
+    def test_post_many_too_many(self):
+        pygame.event.clear()
+        events = [pygame.event.Event(pygame.USEREVENT, i=i)
+                  for i in range(pygame.event._MAX_USER_EVENTS + 1)]
+        self.assertRaises(pygame.error, pygame.event.post_many, events)
+        # the slots taken before running out are freed again
+        self.assertEquals(self._posted_event_slots(), 0)
+        self.assertEquals(pygame.event.get(), [])
+
+    def _posted_event_slots(self):
+        return (len(pygame.event._user_events) -
+                len(pygame.event._free_user_slots))
+
+    def test_posted_event_slots_are_freed(self):
+        for i in range(10):
+            pygame.event.post(pygame.event.Event(pygame.USEREVENT, i=i))
+        self.assertEquals(self._posted_event_slots(), 10)
+        # peeking leaves the event on the queue
+        self.assertEquals(pygame.event.peek().i, 0)
+        self.assertEquals(pygame.event.poll().i, 0)
+        self.assertEquals(self._posted_event_slots(), 9)
+        pygame.event.clear()
+        self.assertEquals(self._posted_event_slots(), 0)
+
+        pygame.event.post(pygame.event.Event(pygame.USEREVENT))
+        pygame.event.set_blocked(pygame.USEREVENT)
+        self.assertEquals(self._posted_event_slots(), 0)
+        pygame.event.set_allowed(pygame.USEREVENT)
+
+    def test_posted_event_with_freed_slot(self):
+        pygame.event.clear()
+        pygame.event.post(pygame.event.Event(pygame.USEREVENT, a=1))
+        # free the slot while the event is still queued
+        for slot, posted in enumerate(pygame.event._user_events):
+            if posted is not None:
+                pygame.event._release_user_slot(slot)
+        event = pygame.event.poll()
+        self.assertEquals(event.type, pygame.USEREVENT)
+        self.assert_(not hasattr(event, 'a'))
+        free_slots = pygame.event._free_user_slots
+        self.assertEquals(len(set(free_slots)), len(free_slots))
+
+    def test_record_and_replay(self):
+        log = io.BytesIO()
+        pygame.event.start_recording(log)
+        try:
+            self._push_mousemotion((10, 20), (1, 2))
+            pygame.event.post(pygame.event.Event(pygame.USEREVENT, a=1))
+            recorded = pygame.event.get()
+            self.assert_(not pygame.event.poll())
+            pygame.event.post(pygame.event.Event(pygame.KEYUP, key=3))
+            recorded.append(pygame.event.poll())
+        finally:
+            pygame.event.stop_recording()
+
+        pygame.event.post(pygame.event.Event(pygame.QUIT))
+        log.seek(0)
+        pygame.event.start_replay(log)
+        try:
+            self.assert_(pygame.event.get_replaying())
+            events = pygame.event.get()
+            ticks = pygame.time.get_ticks()
+            pygame.time.wait(20)
+            # the clock only moves on with the recorded calls
+            self.assertEquals(pygame.time.get_ticks(), ticks)
+            self.assert_(not pygame.event.poll())
+            events.append(pygame.event.poll())
+            # the end of the log stops the replay
+            self.assertEquals(pygame.event.get(), [])
+            self.assert_(not pygame.event.get_replaying())
+        finally:
+            pygame.event.stop_replay()
+
+        self.assertEquals([e.type for e in events],
+                          [pygame.MOUSEMOTION, pygame.USEREVENT,
+                           pygame.KEYUP])
+        self.assertEquals(events[0].pos, (10, 20))
+        self.assertEquals(events[0].rel, (1, 2))
+        self.assertEquals(events[1:], recorded[1:])
+        # the real queue wasn't touched by the replay
+        self.assertEquals([e.type for e in pygame.event.get()],
+                          [pygame.QUIT])
+
+    def test_record_large_event(self):
+        log = io.BytesIO()
+        pygame.event.start_recording(log)
+        try:
+            pygame.event.post(pygame.event.Event(pygame.USEREVENT,
+                                                 a='a' * 100000))
+            self.assertEquals(len(pygame.event.get()), 1)
+        finally:
+            pygame.event.stop_recording()
+
+        log.seek(0)
+        pygame.event.start_replay(log)
+        try:
+            event, = pygame.event.get()
+        finally:
+            pygame.event.stop_replay()
+        self.assertEquals(event.a, 'a' * 100000)
+
+    def test_replay_truncated_log(self):
+        log = io.BytesIO()
+        pygame.event.start_recording(log)
+        try:
+            pygame.event.post(pygame.event.Event(pygame.USEREVENT, a=1))
+            pygame.event.get()
+            pygame.event.post(pygame.event.Event(pygame.USEREVENT, a=2))
+            pygame.event.get()
+        finally:
+            pygame.event.stop_recording()
+
+        # cut the second call off in the middle of its event
+        log = io.BytesIO(log.getvalue()[:-3])
+        pygame.event.start_replay(log)
+        try:
+            self.assertEquals([e.a for e in pygame.event.get()], [1])
+            self.assertEquals(pygame.event.get(), [])
+            self.assert_(not pygame.event.get_replaying())
+        finally:
+            pygame.event.stop_replay()
+
+    def test_record_unpicklable_attribute(self):
+        import warnings
+        log = io.BytesIO()
+        pygame.event.start_recording(log)
+        try:
+            pygame.event.post(pygame.event.Event(pygame.USEREVENT, a=1,
+                                                 func=lambda: None))
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                events = pygame.event.get()
+            self.assertEquals(len(caught), 1)
+            self.assert_('func' in str(caught[0].message))
+            # the events are still returned
+            self.assertEquals(len(events), 1)
+            self.assert_(callable(events[0].func))
+        finally:
+            pygame.event.stop_recording()
+
+        log.seek(0)
+        pygame.event.start_replay(log)
+        try:
+            event, = pygame.event.get()
+        finally:
+            pygame.event.stop_replay()
+        self.assertEquals(event.a, 1)
+        self.assert_(not hasattr(event, 'func'))
+
+    def test_wait_async(self):
+        try:
+            import asyncio
+        except ImportError:
+            return
+        loop = asyncio.new_event_loop()
+        try:
+            loop.call_later(0.02, pygame.event.post,
+                            pygame.event.Event(pygame.USEREVENT, a=1))
+            event = loop.run_until_complete(
+                pygame.event.wait_async(loop=loop))
+        finally:
+            loop.close()
+        self.assertEquals(event.a, 1)
+
+    def test_aiter(self):
+        try:
+            import asyncio
+        except ImportError:
+            return
+        for i in range(3):
+            pygame.event.post(pygame.event.Event(pygame.USEREVENT, i=i))
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN))
+        loop = asyncio.new_event_loop()
+        try:
+            events = pygame.event.aiter(pygame.USEREVENT, loop=loop)
+            self.assert_(events.__aiter__() is events)
+            received = [loop.run_until_complete(events.__anext__())
+                        for i in range(3)]
+            loop.call_later(0.02, pygame.event.post,
+                            pygame.event.Event(pygame.USEREVENT, i=3))
+            received.append(loop.run_until_complete(events.__anext__()))
+        finally:
+            loop.close()
+        self.assertEquals([e.i for e in received], [0, 1, 2, 3])
+        self.assert_(pygame.event.peek(pygame.KEYDOWN))
+
     def test_clear(self):
 
         # __doc__ (as of 2008-06-25) for pygame.event.clear:
@@ -464,6 +464,28 @@ class FontTypeTest( unittest.TestCase ):
         f = open(font_path, "rb")
         font = pygame_font.Font(f, 20)
 
+    def test_load_from_pack_member(self):
+        import shutil
+        import tempfile
+        from pygame.rwobject import PackFile, write_pack
+        font_path = os.path.join(os.path.split(pygame.__file__)[0],
+                                 pygame_font.get_default_font())
+        directory = tempfile.mkdtemp()
+        try:
+            pack_path = os.path.join(directory, "fonts.pack")
+            write_pack(pack_path, [("sans.ttf", font_path)])
+            pack = PackFile(pack_path)
+            font = pygame_font.Font(pack["sans.ttf"], 20)
+            # the font is read as it renders, even once the pack is closed
+            pack.close()
+            expected = pygame_font.Font(font_path, 20)
+            self.assertEqual(font.size("pack"), expected.size("pack"))
+            self.assert_(equal_images(font.render("pack", False, (0, 0, 0)),
+                                      expected.render("pack", False,
+                                                      (0, 0, 0))))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
     def test_load_default_font_filename(self):
         # In font_init, a special case is when the filename argument is
         # identical to the default font file name.
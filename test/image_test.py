@@ -19,8 +19,10 @@ else:
 import pygame, pygame.image, pygame.pkgdata
 from pygame.compat import xrange_, ord_
 
+import gc
 import os
 import array
+import shutil
 import tempfile
 from io import BytesIO
 
@@ -116,6 +118,211 @@ class ImageModuleTest( unittest.TestCase ):
 
         os.remove(f_path) 
 
+    def test_load_bytes(self):
+        f_path = example_path('data/alien1.png')
+        expected = pygame.image.load(f_path)
+        with open(f_path, 'rb') as f:
+            data = f.read()
+
+        for obj in (data, bytearray(data), memoryview(data)):
+            surf = pygame.image.load_bytes(obj, "alien1.png")
+            self.assertEqual(surf.get_size(), expected.get_size())
+            self.assertEqual(surf.get_at((10, 10)), expected.get_at((10, 10)))
+        # the format is detected without a name hint
+        surf = pygame.image.load_bytes(data)
+        self.assertEqual(surf.get_size(), expected.get_size())
+        # buffers are loaded from memory by load() too
+        surf = pygame.image.load(bytearray(data))
+        self.assertEqual(surf.get_size(), expected.get_size())
+        self.assertRaises(pygame.error, pygame.image.load_bytes,
+                          data[:20])
+
+    def test_load_pack_member(self):
+        from pygame.rwobject import PackFile, write_pack
+        names = ['alien1.png', 'alien1.jpg']
+        paths = [example_path(os.path.join('data', name)) for name in names]
+        directory = tempfile.mkdtemp()
+        try:
+            pack_path = os.path.join(directory, "images.pack")
+            write_pack(pack_path, [("sprites/" + name, f_path)
+                                   for name, f_path in zip(names, paths)] +
+                                  [("empty", b"")])
+            with PackFile(pack_path) as pack:
+                self.assertEqual(pack.namelist(),
+                                 ["sprites/alien1.png", "sprites/alien1.jpg",
+                                  "empty"])
+                self.assertTrue("empty" in pack)
+                self.assertEqual(pack.read("empty"), b"")
+                with open(paths[0], "rb") as f:
+                    self.assertEqual(pack.read("sprites/alien1.png"),
+                                     f.read())
+                for name, f_path in zip(names, paths):
+                    expected = pygame.image.load(f_path)
+                    surf = pygame.image.load(pack["sprites/" + name])
+                    self.assertEqual(surf.get_size(), expected.get_size())
+                    self.assertEqual(surf.get_at((10, 10)),
+                                     expected.get_at((10, 10)))
+                self.assertRaises(KeyError, pack.__getitem__, "missing")
+            self.assertRaises(ValueError, pack["empty"].read)
+            self.assertRaises(pygame.error, PackFile, paths[0])
+
+            # buffers keep the pack mapped once it is closed
+            pack = PackFile(pack_path)
+            view = pack["sprites/alien1.png"].getbuffer()
+            pack.close()
+            with open(paths[0], "rb") as f:
+                self.assertEqual(view.tobytes(), f.read())
+            self.assertTrue(pack._map is not None)
+            del view
+            gc.collect()
+            self.assertTrue(pack._map is None)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def test_load_file_object_buffered(self):
+        f_path = example_path('data/alien1.png')
+        expected = pygame.image.load(f_path)
+        with open(f_path, 'rb') as f:
+            data = f.read()
+
+        class ReadOnly(object):
+            def __init__(self, data):
+                self.f = BytesIO(data)
+                self.reads = 0
+
+            def read(self, size):
+                self.reads += 1
+                return self.f.read(size)
+
+            def seek(self, offset, whence=0):
+                return self.f.seek(offset, whence)
+
+            def tell(self):
+                return self.f.tell()
+
+        class ReadInto(BytesIO):
+            reads = 0
+
+            def read(self, size=-1):
+                raise AssertionError("readinto should be used")
+
+            def readinto(self, b):
+                self.reads += 1
+                return BytesIO.readinto(self, b)
+
+        for f in (ReadOnly(data), ReadInto(data)):
+            surf = pygame.image.load(f, "alien1.png")
+            self.assertEqual(surf.get_size(), expected.get_size())
+            self.assertEqual(surf.get_at((10, 10)), expected.get_at((10, 10)))
+            # the small reads of the decoder come from the read-ahead
+            # buffer, not from the file object
+            self.assert_(f.reads <= 4, f.reads)
+
+    def test_load_sheet(self):
+        # a 3x2 sheet of 4x5 frames, with a partial column to the right
+        sheet = pygame.Surface((14, 10), pygame.SRCALPHA, 32)
+        colors = [(i * 40, 255 - i * 40, 7, 255) for i in range(6)]
+        for i, color in enumerate(colors):
+            sheet.fill(color, ((i % 3) * 4, (i // 3) * 5, 4, 5))
+        directory = tempfile.mkdtemp()
+        try:
+            f_path = os.path.join(directory, "sheet.png")
+            pygame.image.save(sheet, f_path)
+
+            frames = pygame.image.load_sheet(f_path, (4, 5), convert=False)
+            self.assertEqual(len(frames), 6)
+            for frame, color in zip(frames, colors):
+                self.assertEqual(frame.get_size(), (4, 5))
+                self.assertEqual(frame.get_at((0, 0)), color)
+                self.assertEqual(frame.get_at((3, 4)), color)
+            self.assertEqual(frames[4].get_offset(), (4, 5))
+            parent = frames[0].get_parent()
+            self.assert_(all(frame.get_parent() is parent
+                             for frame in frames))
+            # the frames share the pixels of the sheet
+            frames[1].fill((1, 2, 3, 4))
+            self.assertEqual(parent.get_at((5, 0)), (1, 2, 3, 4))
+
+            frames = pygame.image.load_sheet(f_path, (4, 5), count=4,
+                                             convert=False, copy=True)
+            self.assertEqual(len(frames), 4)
+            self.assertEqual(frames[3].get_at((2, 2)), colors[3])
+            self.assertEqual(frames[3].get_parent(), None)
+            frames[0].fill((1, 2, 3, 4))
+            self.assertEqual(frames[1].get_at((0, 0)), colors[1])
+
+            self.assertRaises(ValueError, pygame.image.load_sheet, f_path,
+                              (4, 5), count=7, convert=False)
+            self.assertRaises(ValueError, pygame.image.load_sheet, f_path,
+                              (0, 5), convert=False)
+            self.assertEqual(pygame.image.load_sheet(f_path, (20, 5),
+                                                     convert=False), [])
+
+            pygame.init()
+            try:
+                pygame.display.set_mode((10, 10), headless=True)
+                frames = pygame.image.load_sheet(f_path, (4, 5))
+                self.assertEqual(frames[5].get_at((1, 1)), colors[5])
+                self.assert_(frames[5].get_flags() & pygame.SRCALPHA)
+            finally:
+                pygame.quit()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def test_load_many(self):
+        names = ['alien1.png', 'alien1.jpg', 'brick.png', 'city.png']
+        paths = [example_path(os.path.join('data', name)) for name in names]
+        with open(paths[2], 'rb') as f:
+            data = f.read()
+        files = paths + [(data, 'brick.png'), bytearray(data)]
+        expected = [pygame.image.load(f_path).get_size() for f_path in paths]
+        expected += [expected[2]] * 2
+        for workers in (1, 3, None):
+            surfs = pygame.image.load_many(files, workers=workers)
+            self.assertEqual([s.get_size() for s in surfs], expected)
+        self.assertEqual(pygame.image.load_many([]), [])
+        self.assertRaises(pygame.error, pygame.image.load_many,
+                          paths + [paths[0] + '.missing'], 2)
+
+    def test_surface_cache(self):
+        directory = tempfile.mkdtemp()
+        pygame.init()
+        try:
+            # the paletted images are cached in the display format
+            pygame.display.set_mode((10, 10), headless=True)
+            cache = pygame.image.SurfaceCache(directory)
+            f_path = example_path('data/alien1.png')
+            first = cache.load(f_path)
+            self.assertEqual(len(os.listdir(directory)), 1)
+            size = cache.get_size()
+            self.assert_(size > first.get_width() * first.get_height(), size)
+
+            cached = cache.load(f_path)
+            self.assert_(cached._pixel_buffer is not None)
+            self.assertEqual(pygame.image.tostring(cached, "RGBA"),
+                             pygame.image.tostring(first, "RGBA"))
+            # drawing on a cached surface doesn't change the cache
+            cached.fill((1, 2, 3))
+            again = cache.load(f_path)
+            self.assertEqual(again.get_at((0, 0)), first.get_at((0, 0)))
+
+            # the least recently used image is evicted
+            cache.max_size = size + 1
+            other = cache.load(example_path('data/alien2.png'))
+            self.assertEqual(len(os.listdir(directory)), 1)
+            self.assertEqual(cache.load(f_path).get_size(), first.get_size())
+            self.assertEqual(cache.get_size(), size)
+            # the sizes are kept in memory, the files are only listed once
+            cache._entries = None
+            cache.load(example_path('data/alien2.png'))
+            del cache._entries
+            cache.clear()
+            self.assertEqual(os.listdir(directory), [])
+            self.assertEqual(cache.get_size(), 0)
+        finally:
+            pygame.quit()
+            shutil.rmtree(directory, ignore_errors=True)
+
     def testLoadJPG(self):
         """ see if we can load a jpg.
         """
@@ -221,6 +428,90 @@ class ImageModuleTest( unittest.TestCase ):
         # check that the pixel and the colorkey is correct.
         self.assertEqual(colorkey1, colorkey2)
         self.assertEqual(p1, s2.get_at((0,0)))
+
+    def test_save_file_object(self):
+        s = pygame.Surface((12, 10), pygame.SRCALPHA, 32)
+        s.fill((10, 200, 30, 128))
+        s.set_at((3, 4), (255, 0, 0, 255))
+        directory = tempfile.mkdtemp()
+        try:
+            for fmt in ("png", "jpg", "bmp", "tga"):
+                f_path = os.path.join(directory, "tmpimg." + fmt)
+                pygame.image.save(s, f_path)
+                f = open(f_path, "rb")
+                try:
+                    on_disk = f.read()
+                finally:
+                    f.close()
+
+                data = pygame.image.save_bytes(s, fmt.upper())
+                self.assertEqual(data, on_disk)
+                f = BytesIO()
+                pygame.image.save(s, f, "x." + fmt)
+                self.assertEqual(f.getvalue(), on_disk)
+                # the file object is left open
+                self.assertFalse(f.closed)
+                if fmt == "png":
+                    s2 = pygame.image.load_bytes(data)
+                    self.assertEqual(s2.get_at((3, 4)), (255, 0, 0, 255))
+                    self.assertEqual(s2.get_at((0, 0)), (10, 200, 30, 128))
+
+            # the format comes from the name of a real file
+            f_path = os.path.join(directory, "named.png")
+            f = open(f_path, "wb")
+            try:
+                pygame.image.save(s, f)
+            finally:
+                f.close()
+            s2 = pygame.image.load(f_path)
+            self.assertEqual(s2.get_at((3, 4)), (255, 0, 0, 255))
+            self.assertRaises(TypeError, pygame.image.save, s, 3)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def test_frame_writer(self):
+        s = pygame.Surface((32, 24), pygame.SRCALPHA, 32)
+        s.fill((10, 200, 30, 128))
+        s.fill((250, 0, 0, 255), (0, 0, 16, 12))
+        directory = tempfile.mkdtemp()
+        try:
+            self.assertRaises(ValueError, pygame.image.FrameWriter,
+                              quality=101)
+            writer = pygame.image.FrameWriter(workers=2, max_pending=2,
+                                              quality=95, compression=9)
+            with writer:
+                for i in range(6):
+                    for fmt in ("png", "jpg", "bmp"):
+                        writer.save(s, os.path.join(directory,
+                                                    "%d.%s" % (i, fmt)))
+                    # later drawing doesn't change the queued frames
+                    s.fill((0, 0, 255, 255), (16, 12, 16, 12))
+                writer.flush()
+                self.assertEqual(len(os.listdir(directory)), 18)
+                s2 = pygame.image.load(os.path.join(directory, "0.png"))
+                self.assertEqual(s2.get_at((0, 0)), (250, 0, 0, 255))
+                self.assertEqual(s2.get_at((31, 23)), (10, 200, 30, 128))
+                s2 = pygame.image.load(os.path.join(directory, "5.png"))
+                self.assertEqual(s2.get_at((31, 23)), (0, 0, 255, 255))
+
+                writer.save(s, os.path.join(directory, "missing", "x.png"))
+                self.assertRaises(IOError, writer.flush)
+            self.assertRaises(ValueError, writer.save, s,
+                              os.path.join(directory, "closed.png"))
+
+            f_path = os.path.join(directory, "async.png")
+            pygame.image.save_async(s, f_path).flush()
+            self.assertEqual(pygame.image.load(f_path).get_at((0, 0)),
+                             (250, 0, 0, 255))
+
+            # a lower quality gives a smaller file
+            high = os.path.join(directory, "high.jpg")
+            low = os.path.join(directory, "low.jpg")
+            pygame.image.save(s, high, quality=100)
+            pygame.image.save(s, low, quality=5)
+            self.assert_(os.path.getsize(low) < os.path.getsize(high))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
         
         
         
@@ -347,7 +638,49 @@ class ImageModuleTest( unittest.TestCase ):
         self.assert_(AreSurfacesIdentical(test_surface, test_to_from_argb_string))
         #"ERROR: image.fromstring and image.tostring with ARGB are not symmetric"
 
-    def todo_test_frombuffer(self):
+    def test_tostring_into(self):
+        surf = pygame.Surface((3, 2), pygame.SRCALPHA, 32)
+        surf.fill((10, 20, 30, 40))
+        surf.set_at((0, 1), (1, 2, 3, 4))
+        buf = bytearray(30)
+        for format in ("RGB", "RGBA", "ARGB_PREMULT"):
+            for flipped in (False, True):
+                size = pygame.image.tostring_into(surf, format, buf, flipped)
+                self.assertEqual(bytes(buf[:size]),
+                                 pygame.image.tostring(surf, format, flipped))
+        self.assertEqual(bytes(buf[:4]), b'\x04\x00\x00\x00')
+        self.assertRaises(ValueError, pygame.image.tostring_into, surf,
+                          "RGBA", bytearray(23))
+        self.assertRaises(TypeError, pygame.image.tostring_into, surf,
+                          "RGBA", b'\x00' * 24)
+
+    def test_tostring_colorkey(self):
+        surf = pygame.Surface((2, 2), 0, 32)
+        surf.fill((255, 0, 0))
+        surf.set_at((1, 1), (0, 0, 255))
+        surf.set_colorkey((0, 0, 255))
+        rgba = pygame.image.tostring(surf, "RGBA", True)
+        self.assertEqual(rgba[:8], b'\xff\x00\x00\xff\x00\x00\xff\x00')
+        self.assertEqual(pygame.image.tostring(surf, "RGBX")[15:16], b'\xff')
+
+        palette = pygame.Surface((2, 2), 0, 8)
+        palette.set_at((0, 1), (255, 255, 255))
+        p = pygame.image.tostring(palette, "P", True)
+        self.assertEqual(len(p), 4)
+        self.assertNotEqual(p[0:1], p[1:2])
+        self.assertEqual(p[1:], p[3:4] * 3)
+
+    def test_fromstring_rgb(self):
+        rgb = bytes(bytearray(range(1, 13)))
+        surf = pygame.image.fromstring(rgb, (2, 2), "RGB")
+        self.assertEqual(surf.get_at((1, 0)), (4, 5, 6, 255))
+        self.assertEqual(pygame.image.tostring(surf, "RGB"), rgb)
+        flipped = pygame.image.fromstring(rgb, (2, 2), "RGB", True)
+        self.assertEqual(flipped.get_at((0, 0)), (7, 8, 9, 255))
+        self.assertRaises(ValueError, pygame.image.fromstring, rgb[:-1],
+                          (2, 2), "RGB")
+
+    def test_frombuffer(self):
 
         # __doc__ (as of 2008-08-02) for pygame.image.frombuffer:
 
@@ -362,7 +695,35 @@ class ImageModuleTest( unittest.TestCase ):
           # This will run much faster than pygame.image.fromstring, since no
           # pixel data must be allocated and copied.
 
-        self.fail() 
+        data = bytearray(range(16))
+        surf = pygame.image.frombuffer(data, (2, 2), "RGBA")
+        self.assertEqual(surf.get_at((1, 1)), (12, 13, 14, 15))
+        # the surface shares the buffer
+        data[0] = 255
+        self.assertEqual(surf.get_at((0, 0)), (255, 1, 2, 3))
+        surf.set_at((1, 0), (20, 21, 22, 23))
+        self.assertEqual(list(data[4:8]), [20, 21, 22, 23])
+
+        # rows with padding
+        data = bytearray(range(14))
+        surf = pygame.image.frombuffer(data, (2, 2), "RGB", pitch=8)
+        self.assertEqual(surf.get_pitch(), 8)
+        self.assertEqual(surf.get_at((1, 1)), (11, 12, 13, 255))
+        self.assertRaises(ValueError, pygame.image.frombuffer, data,
+                          (2, 2), "RGB", 5)
+        self.assertRaises(ValueError, pygame.image.frombuffer, data[:-1],
+                          (2, 2), "RGB", 8)
+
+        # the size is checked in bytes, not items
+        data = array.array('I', bytes(bytearray(range(16))))
+        surf = pygame.image.frombuffer(data, (2, 2), "RGBA")
+        self.assertEqual(surf.get_at((1, 1)), (12, 13, 14, 15))
+        self.assertRaises(ValueError, pygame.image.frombuffer, data,
+                          (2, 3), "RGBA")
+
+        # the buffer stays alive as long as the surface
+        surf = pygame.image.frombuffer(bytearray(b'\x07' * 4), (2, 2), "P")
+        self.assertEqual(surf.get_at_mapped((1, 1)), 7)
 
     def todo_test_get_extended(self):
 
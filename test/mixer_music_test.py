@@ -73,6 +73,29 @@ class MixerMusicModuleTest(unittest.TestCase):
 
         self.fail() 
 
+    def test_queue_pack_member(self):
+        import shutil
+        import tempfile
+        from pygame import mixer_music
+        from pygame.rwobject import PackFile, write_pack
+        path = os.path.join(example_path('data'), 'house_lo.ogg')
+        directory = tempfile.mkdtemp()
+        pygame.mixer.init()
+        try:
+            pack_path = os.path.join(directory, "music.pack")
+            write_pack(pack_path, [("house.ogg", path)])
+            with PackFile(pack_path) as pack:
+                pygame.mixer.music.load(pack["house.ogg"])
+                pygame.mixer.music.queue(pack["house.ogg"])
+                # queueing again frees the music queued before
+                pygame.mixer.music.queue(pack["house.ogg"])
+                self.assertEqual(len(mixer_music._music_buffers), 2)
+            pygame.mixer.quit()
+            self.assertEqual(len(mixer_music._music_buffers), 0)
+        finally:
+            pygame.mixer.quit()
+            shutil.rmtree(directory, ignore_errors=True)
+
     def todo_test_stop(self):
 
         # __doc__ (as of 2008-08-02) for pygame.mixer_music.stop:
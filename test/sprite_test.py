@@ -0,0 +1,343 @@
+#################################### IMPORTS ###################################
+
+if __name__ == '__main__':
+    import sys
+    import os
+    pkg_dir = os.path.split(os.path.abspath(__file__))[0]
+    parent_dir, pkg_name = os.path.split(pkg_dir)
+    is_pygame_pkg = (pkg_name == 'tests' and
+                     os.path.split(parent_dir)[1] == 'pygame')
+    if not is_pygame_pkg:
+        sys.path.insert(0, parent_dir)
+else:
+    is_pygame_pkg = __name__.startswith('pygame.tests.')
+
+if is_pygame_pkg:
+    from pygame.tests.test_utils import unittest
+else:
+    from test.test_utils import unittest
+import pygame
+from pygame import sprite
+
+################################################################################
+
+class GroupTypeTest(unittest.TestCase):
+
+    def test_add_nested(self):
+        sprites = [sprite.Sprite() for i in range(4)]
+        group = sprite.Group(sprites[0], [sprites[1], [sprites[2]]],
+                             sprite.Group(sprites[3]))
+        self.assertEqual(len(group), 4)
+        for spr in sprites:
+            self.assert_(spr in group)
+
+    def test_remove_many(self):
+        sprites = [sprite.Sprite() for i in range(5)]
+        group = sprite.OrderedUpdates(sprites)
+        other = sprite.Group(sprites)
+        group.remove_many(sprites[1:3] + sprites[1:3])
+        self.assertEqual(group.sprites(),
+                         [sprites[0], sprites[3], sprites[4]])
+        self.assertEqual(len(other), 5)
+        self.assert_(other in sprites[1].groups())
+        self.assert_(group not in sprites[1].groups())
+
+    def test_kill_many(self):
+        sprites = [sprite.Sprite() for i in range(5)]
+        group1 = sprite.Group(sprites)
+        group2 = sprite.OrderedUpdates(sprites[:3])
+        group1.kill_many(sprites[:2])
+        self.assertEqual(len(group1), 3)
+        self.assertEqual(group2.sprites(), [sprites[2]])
+        self.assertFalse(sprites[0].alive())
+        group2.kill_many()
+        self.assertEqual(len(group1), 2)
+        self.assertEqual(len(group2), 0)
+
+    def test_sprite_slots(self):
+        spr = sprite.DirtySprite()
+        # extra attributes can still be assigned
+        spr.rect = pygame.Rect(0, 0, 1, 1)
+        self.assertEqual(spr.dirty, 1)
+        self.assertEqual(spr.visible, 1)
+
+
+class LayeredUpdatesTypeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.LG = sprite.LayeredUpdates()
+
+    def test_get_layer_of_sprite(self):
+        spr = sprite.Sprite()
+        self.LG.add(spr, layer=666)
+        self.assertEqual(len(self.LG._spritelist), 1)
+        self.assertEqual(self.LG.get_layer_of_sprite(spr), 666)
+        self.assertEqual(self.LG.get_layer_of_sprite(spr),
+                         self.LG._spritelayers[spr])
+
+    def test_add_keeps_layer_order(self):
+        sprites = []
+        for layer in (3, 1, 2, 1, 3, 0):
+            spr = sprite.Sprite()
+            self.LG.add(spr, layer=layer)
+            sprites.append(spr)
+        self.assertEqual(self.LG.sprites(),
+                         [sprites[5], sprites[1], sprites[3], sprites[2],
+                          sprites[0], sprites[4]])
+        self.assertEqual(self.LG.layers(), [0, 1, 2, 3])
+        self.assertEqual(self.LG.get_bottom_layer(), 0)
+        self.assertEqual(self.LG.get_top_layer(), 3)
+        self.assertEqual(self.LG.get_top_sprite(), sprites[4])
+        self.assertEqual(self.LG.get_sprite(0), sprites[5])
+
+    def test_get_sprites_from_layer(self):
+        sprites = {}
+        for layer in (0, 1, 2, 1, 0, 1):
+            spr = sprite.Sprite()
+            self.LG.add(spr, layer=layer)
+            sprites.setdefault(layer, []).append(spr)
+        for layer, expected in sprites.items():
+            self.assertEqual(self.LG.get_sprites_from_layer(layer), expected)
+        self.assertEqual(self.LG.get_sprites_from_layer(5), [])
+
+    def test_change_layer(self):
+        spr1 = sprite.Sprite()
+        spr2 = sprite.Sprite()
+        self.LG.add(spr1, layer=1)
+        self.LG.add(spr2, layer=2)
+        self.LG.change_layer(spr1, 2)
+        self.assertEqual(self.LG.get_layer_of_sprite(spr1), 2)
+        self.assertEqual(self.LG.sprites(), [spr2, spr1])
+        self.assertEqual(self.LG.layers(), [2])
+        self.LG.change_layer(spr2, -1)
+        self.assertEqual(self.LG.sprites(), [spr2, spr1])
+        self.assertEqual(self.LG.layers(), [-1, 2])
+
+    def test_remove(self):
+        spr1 = sprite.Sprite()
+        spr2 = sprite.Sprite()
+        self.LG.add(spr1, layer=1)
+        self.LG.add(spr2, layer=2)
+        spr1.kill()
+        self.assertEqual(self.LG.sprites(), [spr2])
+        self.assertEqual(self.LG.layers(), [2])
+        self.assertEqual(self.LG.remove_sprites_of_layer(2), [spr2])
+        self.assertEqual(self.LG.sprites(), [])
+        self.assertEqual(self.LG.layers(), [])
+
+    def test_switch_layer(self):
+        sprites1 = [sprite.Sprite() for i in range(3)]
+        sprites2 = [sprite.Sprite() for i in range(2)]
+        self.LG.add(sprites1, layer=1)
+        self.LG.add(sprites2, layer=2)
+        self.LG.switch_layer(1, 2)
+        self.assertEqual(self.LG.get_sprites_from_layer(1), sprites2)
+        self.assertEqual(self.LG.get_sprites_from_layer(2), sprites1)
+
+class LayeredDirtyTypeTest(unittest.TestCase):
+
+    def _make_sprite(self, rect):
+        spr = sprite.DirtySprite()
+        spr.rect = pygame.Rect(rect)
+        spr.image = pygame.Surface(spr.rect.size)
+        return spr
+
+    def test_mode_switching(self):
+        screen = pygame.Surface((100, 100))
+        small = self._make_sprite((0, 0, 10, 10))
+        group = sprite.LayeredDirty(small)
+        group.set_timing_treshold(1000.)
+        group.draw(screen)
+        stats = group.get_stats()
+        self.assertEqual(stats['mode'], 'full')
+        self.assertEqual(stats['frames'], 1)
+        # a small dirty area switches to dirty rect mode
+        self.assertTrue(group._use_update)
+        self.assertEqual(stats['switches'], 1)
+
+        big = self._make_sprite((0, 0, 100, 60))
+        group.add(big)
+        group.draw(screen)
+        stats = group.get_stats()
+        self.assertEqual(stats['mode'], 'dirty')
+        self.assertFalse(group._use_update)
+        self.assertTrue(stats['dirty_fraction'] > 0.5)
+
+        # full screen mode just adds up the old and new area of the
+        # resized sprite, so it stays until the screen settles down
+        big.rect.h = 40
+        big.dirty = 1
+        group.draw(screen)
+        stats = group.get_stats()
+        self.assertEqual(stats['mode'], 'full')
+        self.assertAlmostEqual(stats['dirty_fraction'], 1.)
+        self.assertFalse(group._use_update)
+        group.draw(screen)
+        self.assertEqual(group.get_stats()['dirty_fraction'], 0.)
+        self.assertTrue(group._use_update)
+        self.assertEqual(group.get_stats()['switches'], 3)
+
+        # dirty rect mode merges the rects, here the two rects of the
+        # removed sprite
+        group.remove(big)
+        group.draw(screen)
+        stats = group.get_stats()
+        self.assertEqual(stats['mode'], 'dirty')
+        self.assertAlmostEqual(stats['dirty_fraction'], 0.4)
+        self.assertTrue(group._use_update)
+
+    def test_stats(self):
+        screen = pygame.Surface((100, 100))
+        group = sprite.LayeredDirty(self._make_sprite((0, 0, 10, 10)))
+        group.draw(screen)
+        stats = group.get_stats()
+        for key in ('detect_time', 'merge_time', 'blit_time', 'total_time'):
+            self.assertTrue(stats[key] >= 0)
+        self.assertAlmostEqual(stats['total_time'],
+                               stats['detect_time'] + stats['merge_time'] +
+                               stats['blit_time'])
+        self.assertRaises(ValueError, group.set_mode_thresholds, 0.6, 0.5)
+
+
+class DepthSortedGroupTypeTest(unittest.TestCase):
+
+    def _make_sprite(self, bottom):
+        spr = sprite.Sprite()
+        spr.image = pygame.Surface((10, 10))
+        spr.rect = spr.image.get_rect(bottom=bottom)
+        return spr
+
+    def test_add_in_key_order(self):
+        sprites = [self._make_sprite(bottom) for bottom in (30, 10, 20, 10)]
+        group = sprite.DepthSortedGroup(sprites)
+        self.assertEqual(group.sprites(),
+                         [sprites[1], sprites[3], sprites[2], sprites[0]])
+
+    def test_sort_after_move(self):
+        sprites = [self._make_sprite(bottom) for bottom in (10, 20, 30, 40)]
+        group = sprite.DepthSortedGroup(sprites)
+        sprites[3].rect.bottom = 5
+        sprites[0].rect.bottom = 35
+        group.sort()
+        self.assertEqual(group.sprites(),
+                         [sprites[3], sprites[1], sprites[2], sprites[0]])
+        group.remove(sprites[1])
+        self.assertEqual(group.sprites(),
+                         [sprites[3], sprites[2], sprites[0]])
+
+    def test_draw_order(self):
+        screen = pygame.Surface((20, 20))
+        back = self._make_sprite(15)
+        front = self._make_sprite(10)
+        back.image.fill((255, 0, 0))
+        front.image.fill((0, 255, 0))
+        group = sprite.DepthSortedGroup(front, back)
+        front.rect.bottom = 18
+        group.draw(screen)
+        self.assertEqual(group.sprites(), [back, front])
+        self.assertEqual(screen.get_at((5, 12)), (0, 255, 0, 255))
+
+    def test_custom_key(self):
+        sprites = [self._make_sprite(10) for i in range(3)]
+        for depth, spr in zip((2, 0, 1), sprites):
+            spr.depth = depth
+        group = sprite.DepthSortedGroup(sprites, key=lambda s: s.depth)
+        self.assertEqual(group.sprites(), [sprites[1], sprites[2], sprites[0]])
+        self.assertRaises(TypeError, sprite.DepthSortedGroup, sprites,
+                          kye=lambda s: s.depth)
+
+    def test_add_before_rect(self):
+        group = sprite.DepthSortedGroup()
+
+        class Thing(sprite.Sprite):
+            def __init__(self, bottom):
+                sprite.Sprite.__init__(self, group)
+                self.image = pygame.Surface((10, 10))
+                self.rect = self.image.get_rect(bottom=bottom)
+
+        things = [Thing(bottom) for bottom in (30, 10, 20)]
+        self.assertEqual(len(group), 3)
+        group.draw(pygame.Surface((40, 40)))
+        self.assertEqual(group.sprites(), [things[1], things[2], things[0]])
+        # sprites with a rect are put in order as they are added
+        group.add(self._make_sprite(15))
+        self.assertEqual([s.rect.bottom for s in group.sprites()],
+                         [10, 15, 20, 30])
+
+    def test_equal_keys_in_added_order(self):
+        first = self._make_sprite(30)
+        second = self._make_sprite(10)
+        group = sprite.DepthSortedGroup(first, second)
+        first.rect.bottom = 10
+        group.sort()
+        self.assertEqual(group.sprites(), [first, second])
+        third = self._make_sprite(10)
+        group.add(third)
+        self.assertEqual(group.sprites(), [first, second, third])
+
+
+class SpriteBatchTypeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.image = pygame.Surface((10, 10))
+        self.image.fill((255, 0, 0))
+        self.batch = sprite.SpriteBatch([self.image], capacity=2)
+
+    def test_spawn_and_kill(self):
+        indices = [self.batch.spawn((i * 20, 0)) for i in range(5)]
+        self.assertEqual(indices, [0, 1, 2, 3, 4])
+        self.assertEqual(len(self.batch), 5)
+        self.batch.kill(2)
+        self.assertEqual(len(self.batch), 4)
+        self.assertFalse(self.batch.is_alive(2))
+        # killed slots are reused
+        self.assertEqual(self.batch.spawn((0, 0)), 2)
+        self.batch.empty()
+        self.assertEqual(len(self.batch), 0)
+        self.assertEqual(self.batch.indices(), [])
+
+    def test_update(self):
+        index = self.batch.spawn((1, 2), (3, -4))
+        dead = self.batch.spawn((0, 0), (1, 1))
+        self.batch.kill(dead)
+        self.batch.update(0.5)
+        self.assertEqual(self.batch.get_pos(index), (2.5, 0.0))
+        self.assertEqual(self.batch.get_pos(dead), (0.0, 0.0))
+
+    def test_draw(self):
+        screen = pygame.Surface((50, 50))
+        self.batch.spawn((5, 5))
+        self.batch.spawn((30, 30))
+        self.batch.draw(screen)
+        self.assertEqual(screen.get_at((5, 5)), (255, 0, 0, 255))
+        self.assertEqual(screen.get_at((35, 35)), (255, 0, 0, 255))
+        self.assertEqual(screen.get_at((20, 20)), (0, 0, 0, 255))
+
+    def test_set_images(self):
+        blue = pygame.Surface((5, 5))
+        blue.fill((0, 0, 255))
+        self.batch.set_images([self.image, blue])
+        index = self.batch.spawn((0, 0), image=1)
+        self.assertEqual(self.batch.get_image(index), blue)
+        # the live sprite still uses the second image
+        self.assertRaises(IndexError, self.batch.set_images, [blue])
+        self.assertEqual(self.batch.get_image(index), blue)
+        self.batch.kill(index)
+        self.batch.set_images([blue])
+
+    def test_spritecollide(self):
+        player = sprite.Sprite()
+        player.rect = pygame.Rect(0, 0, 15, 15)
+        self.batch.spawn((5, 5))
+        self.batch.spawn((30, 30))
+        self.batch.spawn((-5, -5))
+        self.assertEqual(sorted(self.batch.collide_rect(player.rect)), [0, 2])
+        hits = sprite.spritecollide(player, self.batch, True)
+        self.assertEqual(sorted(s.index for s in hits), [0, 2])
+        self.assertEqual(self.batch.indices(), [1])
+        self.assertEqual(sprite.spritecollideany(player, self.batch), None)
+
+################################################################################
+
+if __name__ == '__main__':
+    unittest.main()
@@ -28,7 +28,41 @@ class ClockTypeTest(unittest.TestCase):
     def test_construction(self):
         c = Clock()
         self.assert_(c, "Clock can be constructed")
-    
+
+    def test_tick_async(self):
+        try:
+            import asyncio
+        except ImportError:
+            return
+        c = Clock()
+        ran = []
+        loop = asyncio.new_event_loop()
+        try:
+            loop.call_soon(ran.append, True)
+            loop.run_until_complete(c.tick_async(loop=loop))
+            passed = loop.run_until_complete(c.tick_async(20, loop=loop))
+        finally:
+            loop.close()
+        # the frame delay doesn't block other callbacks
+        self.assertEqual(ran, [True])
+        self.assert_(passed >= 40, passed)
+
+    def test_frame_stats(self):
+        c = Clock(history=4)
+        self.assertEqual(c.get_frame_stats()['frames'], 0)
+        for i in range(6):
+            c.tick(200)
+        times = c.get_frame_times()
+        self.assertEqual(len(times), 4)
+        # frames are paced to at least 5ms
+        self.assert_(min(times) >= 5, times)
+        stats = c.get_frame_stats()
+        self.assertEqual(stats['frames'], 4)
+        self.assertEqual(stats['max'], max(times))
+        self.assertEqual(stats['p50'], sorted(times)[1])
+        self.assertEqual(c.get_frame_stats(jank=0)['jank'], 4)
+        self.assertEqual(Clock().get_frame_times(), [])
+
     def todo_test_get_fps(self):
 
         # __doc__ (as of 2008-08-02) for pygame.time.Clock.get_fps:
@@ -152,6 +186,79 @@ class ClockTypeTest(unittest.TestCase):
 
         self.fail() 
 
+class TimerWheelTypeTest(unittest.TestCase):
+
+    def setUp(self):
+        pygame.time._set_virtual_ticks(1000)
+
+    def tearDown(self):
+        pygame.time._set_virtual_ticks(None)
+
+    def test_expire(self):
+        wheel = pygame.time.TimerWheel()
+        wheel.add(pygame.USEREVENT, 10)
+        wheel.add(pygame.event.Event(pygame.USEREVENT + 1, value=3), 300,
+                  repeat=True)
+        wheel.add(pygame.USEREVENT + 2, 100000)
+        removed = wheel.add(pygame.USEREVENT + 3, 20)
+        self.assertTrue(wheel.remove(removed))
+        self.assertFalse(wheel.remove(removed))
+        self.assertEqual(len(wheel), 3)
+
+        self.assertEqual(wheel.expire(1009), [])
+        self.assertEqual([e.type for e in wheel.expire(1010)],
+                         [pygame.USEREVENT])
+        self.assertEqual([e.value for e in wheel.expire(1950)], [3, 3, 3])
+        events = wheel.expire(101000)
+        self.assertEqual([e.type for e in events].count(pygame.USEREVENT + 2),
+                         1)
+        self.assertEqual(len(events), 331)
+        self.assertEqual(len(wheel), 1)
+        wheel.clear()
+        self.assertEqual(wheel.expire(200000), [])
+
+    def test_many_timers(self):
+        wheel = pygame.time.TimerWheel(resolution=10)
+        for i in range(2000):
+            wheel.add(pygame.event.Event(pygame.USEREVENT, index=i),
+                      (i * 7919) % 50000 + 1)
+        fired = []
+        for now in range(1000, 52000, 333):
+            for event in wheel.expire(now):
+                fired.append(event.index)
+                # each timer fires in the first call after its time,
+                # rounded up to the resolution
+                delay = (event.index * 7919) % 50000 + 1
+                self.assert_(1000 + delay <= now < 1000 + delay + 9 + 333,
+                             (event.index, now))
+        self.assertEqual(sorted(fired), list(range(2000)))
+
+    def test_long_pause(self):
+        wheel = pygame.time.TimerWheel()
+        wheel.add(pygame.USEREVENT, 5, repeat=True)
+        wheel.add(pygame.USEREVENT + 1, 40000000)
+        self.assertEqual(len(wheel.expire(1004)), 0)
+        self.assertEqual(len(wheel.expire(1010)), 2)
+        wheel.clear()
+        wheel.add(pygame.USEREVENT + 1, 40000000)
+        # the empty ticks in between are skipped, not stepped through
+        self.assertEqual(wheel.expire(40000999), [])
+        self.assertEqual([e.type for e in wheel.expire(40001000)],
+                         [pygame.USEREVENT + 1])
+        self.assertEqual(wheel.expire(80000000), [])
+
+    def test_update(self):
+        pygame.display.init()
+        try:
+            pygame.event.clear()
+            wheel = pygame.time.TimerWheel()
+            for i in range(5):
+                wheel.add(pygame.USEREVENT, 5)
+            self.assertEqual(wheel.update(1005), 5)
+            self.assertEqual(len(pygame.event.get(pygame.USEREVENT)), 5)
+        finally:
+            pygame.display.quit()
+
 class TimeModuleTest(unittest.TestCase):
     def todo_test_delay(self):
 